@@ -0,0 +1,233 @@
+# SPDX-License-Identifier: GPL-2.0
+# Copyright (C) 2014-2024 David Poole davep@mbuf.com david.poole@ericsson.com
+#
+# Run recipe lines and $(shell) with long-lived /bin/sh coprocesses.
+#
+# Enabled with --shell-coprocess (pymake only). Starting a new /bin/sh for
+# every recipe line is mostly fork/exec overhead when the commands are tiny.
+# Instead, each coprocess is a "/bin/sh -s" reading commands from a pipe on
+# its stdin. Every command runs in a subshell ( ... ) so shell state
+# (variables, options, cwd, traps, exit) can't leak from one command to the
+# next. Inside the subshell, the environment is changed to match the exports
+# and the cwd is set before the command is run. The exit status is written to
+# a second pipe.
+#
+# A command must look the same to the user as it would under "/bin/sh -c":
+#   - "sh -s" has the same $0 as "sh -c" (the shell's path)
+#   - the command is the body of a function rather than eval'd so the shell's
+#     error messages are "/bin/sh: 1: foo: not found" instead of
+#     "/bin/sh: 1: eval: foo: not found". Only the function definition is
+#     eval'd; a command that doesn't parse is given to a spawned shell.
+#   - a command that could tell it's in a function (return, local, LINENO, a
+#     '}' that could close the function early) is given to a spawned shell.
+#
+# The commands' stdin is our stdin, moved to a single digit file descriptor
+# when the coprocess starts (dash only understands single digit file
+# descriptors in redirections). The coprocess's stdout, stderr are our own,
+# same as a spawned shell. The command and status pipes are opened by path
+# (/dev/fd/N).
+#
+# shell.run() falls back to spawning a shell when the coprocess can't run the
+# command exactly like "/bin/sh -c" would (a different SHELL or .SHELLFLAGS,
+# environment names the shell can't export or unset, a sub-make, etc).
+
+import os
+import re
+import atexit
+import logging
+import tempfile
+import threading
+import subprocess
+
+logger = logging.getLogger("pymake.coshell")
+
+import pymake.constants as constants
+import pymake.trace as trace
+
+_trace = trace.get_tracer("shell")
+
+__all__ = [ "enable", "is_enabled", "can_run", "run" ]
+
+_enabled = False
+
+# idle coprocesses (a pool because -j N runs commands from several threads)
+_idle = []
+_lock = threading.Lock()
+
+# every coprocess ever started (for cleanup at exit)
+_all = []
+
+# names the shell can export/unset
+_name_re = re.compile(r"[A-Za-z_][A-Za-z0-9_]*\Z")
+
+# commands that behave differently as the body of a function
+_function_re = re.compile(r"(?:^|[\s;&|()])\}|\b(?:return|local|LINENO)\b")
+
+# status written when the command doesn't parse
+_parse_failed = -1
+
+def enable(flag=True):
+    global _enabled
+    _enabled = flag
+
+def is_enabled():
+    return _enabled
+
+def _quote(s):
+    # single quote a string for the shell
+    return "'" + s.replace("'", "'\\''") + "'"
+
+class Coprocess:
+    def __init__(self, env, pass_fds):
+        # a spawned shell would get our stdin
+        os.fstat(0)
+
+        cmd_r, self.cmd_fd = os.pipe()
+        self.status_fd, status_w = os.pipe()
+
+        # file descriptors (e.g., a jobserver pipe) our children inherit
+        self.pass_fds = tuple(pass_fds)
+
+        # the environment of the coprocess; commands change the difference
+        self.env = dict(env)
+
+        fd, self.capture_path = tempfile.mkstemp(prefix="pymake-coshell")
+        os.close(fd)
+
+        # where the commands' stdin goes (can't be a descriptor the children
+        # inherit; there are only a few of those)
+        child_fds = (cmd_r, status_w) + self.pass_fds
+        stdin_fd = next(fd for fd in range(9, 2, -1) if fd not in child_fds)
+        self.stdin_redirect = "<&%d %d<&-" % (stdin_fd, stdin_fd)
+
+        # "sh -c" moves our stdin out of the way and becomes "sh -s" reading
+        # the command pipe
+        startup = 'exec "$0" -s %d<&0 </dev/fd/%d' % (stdin_fd, cmd_r)
+        self.proc = subprocess.Popen([constants.DEFAULT_SHELL, "-c", startup, constants.DEFAULT_SHELL],
+                        env=self.env, pass_fds=child_fds)
+        os.close(cmd_r)
+        self.status_path = "/dev/fd/%d" % status_w
+        os.close(status_w)
+
+        self.dead = False
+
+        if _trace.on:
+            _trace("coprocess", pid=self.proc.pid)
+
+    def _env_script(self, env):
+        # shell statements to change the coprocess's env to env
+        # returns None if the shell can't do it
+        lines = []
+        unset = [k for k in self.env if k not in env]
+        if unset:
+            if not all(_name_re.match(k) for k in unset):
+                return None
+            lines.append("unset " + " ".join(unset))
+        for k, v in env.items():
+            if self.env.get(k) != v:
+                if not _name_re.match(k) or "\0" in v:
+                    return None
+                lines.append("export %s=%s" % (k, _quote(v)))
+        return lines
+
+    def run(self, cmd_str, env, capture):
+        # Returns (exit_code, stdout) or None if the command must be run some
+        # other way.
+        env_lines = self._env_script(env)
+        if env_lines is None:
+            return None
+
+        script = [ "if eval %s 2>/dev/null; then" % _quote("pymake_cmd() { " + cmd_str + "\n}"),
+                   "(", "cd %s || exit" % _quote(os.getcwd()) ]
+        script.extend(env_lines)
+        script.append("pymake_cmd")
+        script.append(") " + self.stdin_redirect + (" >%s" % _quote(self.capture_path) if capture else ""))
+        script.append("echo $? >%s" % self.status_path)
+        script.append("else")
+        script.append("echo %d >%s" % (_parse_failed, self.status_path))
+        script.append("fi\n")
+
+        os.write(self.cmd_fd, "\n".join(script).encode())
+
+        buf = b""
+        while not buf.endswith(b"\n"):
+            s = os.read(self.status_fd, 64)
+            if not s:
+                # something killed the shell
+                self.dead = True
+                logger.error("shell coprocess pid=%d died", self.proc.pid)
+                return 127, ""
+            buf += s
+
+        exit_code = int(buf)
+        if exit_code == _parse_failed:
+            # let a spawned shell report the syntax error
+            return None
+
+        stdout = None
+        if capture:
+            with open(self.capture_path, "r") as infile:
+                stdout = infile.read()
+
+        return exit_code, stdout
+
+    def close(self):
+        # shell exits at end of its input
+        try:
+            os.close(self.cmd_fd)
+        except OSError:
+            pass
+        self.proc.wait()
+        os.close(self.status_fd)
+        try:
+            os.unlink(self.capture_path)
+        except OSError:
+            pass
+
+def can_run(cmd, cmd_str):
+    # Can a coprocess run this argv from shell.build_command() ?
+    return _enabled and cmd == [constants.DEFAULT_SHELL, constants.DEFAULT_SHELLFLAGS, cmd_str] \
+            and not _function_re.search(cmd_str)
+
+def _acquire(env, pass_fds):
+    with _lock:
+        for i, co in enumerate(_idle):
+            if co.pass_fds == pass_fds:
+                return _idle.pop(i)
+
+    try:
+        co = Coprocess(env, pass_fds)
+    except OSError as err:
+        logger.debug("no shell coprocess: %s", err)
+        return None
+    with _lock:
+        _all.append(co)
+    return co
+
+def _release(co):
+    with _lock:
+        if co.dead:
+            _all.remove(co)
+        else:
+            _idle.append(co)
+
+    if co.dead:
+        co.close()
+
+def run(cmd_str, env, capture, pass_fds=()):
+    # Returns (exit_code, stdout) or None if the caller must spawn a shell.
+    co = _acquire(env, tuple(pass_fds))
+    if co is None:
+        return None
+    try:
+        return co.run(cmd_str, env, capture)
+    finally:
+        _release(co)
+
+@atexit.register
+def _close_all():
+    with _lock:
+        for co in _all:
+            co.close()
+        _all.clear()
+        _idle.clear()
@@ -14,6 +14,7 @@ __all__ = [ "ParseError",
             "InternalError",
             "MissingEndef",
             "RecursiveVariableError",
+            "NoRuleToMakeTarget",
 
             "warning_message",
             "error_message",
@@ -105,14 +106,35 @@ class MissingEndef(ParseError):
 class RecursiveVariableError(MakeError):
     default_msg = "Recursive variable <name> references itself eventually."
 
+class NoRuleToMakeTarget(MakeError):
+    default_msg = "No rule to make target"
+
 #class VersionError(MakeError):
 #    """Feature not in this version"""
 #    pass
 
+# When not None, warning_message() also saves its arguments here. Used by the
+# parse cache so warnings found while parsing a makefile can be repeated when
+# the makefile is later loaded from the cache.
+_warning_log = None
+
+def start_warning_log():
+    global _warning_log
+    _warning_log = []
+
+def stop_warning_log():
+    global _warning_log
+    log = _warning_log
+    _warning_log = None
+    return log
+
 def warning_message(pos, msg):
     # don't allow an empty message because it's super confusing
     assert msg
 
+    if _warning_log is not None:
+        _warning_log.append((pos, msg))
+
     if pos:
         print("%s %r warning: %s" % (pos[0], pos[1], msg), file=sys.stderr)
     else:
@@ -5,6 +5,7 @@
 
 import sys
 import logging
+import collections
 
 logger = logging.getLogger("pymake.functions")
 #logger.setLevel(level=logging.DEBUG)
@@ -12,7 +13,8 @@ logger = logging.getLogger("pymake.functions")
 from pymake.symbol import VarRef, Literal
 from pymake.vline import VCharString, whitespace
 from pymake.error import *
-from pymake.functions_base import Function, FunctionWithArguments
+import pymake.error as error
+from pymake.functions_base import Function, FunctionWithArguments, WordString, split_words, is_word_part
 from pymake.functions_fs import *
 from pymake.functions_cond import *
 from pymake.functions_str import *
@@ -23,6 +25,53 @@ from pymake.source import SourceString
 parse_makefile_from_src = None
 execute_statement_list = None
 
+# Cache of parsed $(eval) text. Makefiles often $(eval $(call template,...))
+# many times with the same text. The statements aren't changed by being
+# executed so the same statements can be executed again.
+# key: text given to $(eval)
+# value: (statement list, warnings from the parser)
+_eval_cache = collections.OrderedDict()
+# most entries kept (least recently used thrown away first)
+_eval_cache_max = 256
+# don't keep very big texts (probably only eval'd once)
+_eval_cache_max_len = 64*1024
+_eval_cache_hits = 0
+_eval_cache_misses = 0
+
+def eval_cache_stats():
+    return _eval_cache_hits, _eval_cache_misses
+
+def _eval_parse(s):
+    # Returns the statement list parsed from $(eval) text.
+    global _eval_cache_hits, _eval_cache_misses
+
+    try:
+        statement_list, warnings = _eval_cache[s]
+    except KeyError:
+        pass
+    else:
+        _eval_cache_hits += 1
+        _eval_cache.move_to_end(s)
+        # same warnings as parsing again
+        for pos, msg in warnings:
+            warning_message(pos, msg)
+        return statement_list
+
+    _eval_cache_misses += 1
+    if _eval_cache_max == 0 or len(s) > _eval_cache_max_len:
+        return parse_makefile_from_src(SourceString(s)).token_list
+
+    error.start_warning_log()
+    try:
+        makefile = parse_makefile_from_src(SourceString(s))
+    finally:
+        warnings = error.stop_warning_log()
+
+    _eval_cache[s] = (makefile.token_list, warnings)
+    if len(_eval_cache) > _eval_cache_max:
+        _eval_cache.popitem(last=False)
+    return makefile.token_list
+
 class PrintingFunction(Function):
     fmt = None
 
@@ -54,10 +103,12 @@ class PrintingFunction(Function):
             # no literal whitespace so quit now
             return
 
-        for vchar in first_token.string:
-            if not vchar.char in whitespace:
+        count = 0
+        for c in first_token.string.chars():
+            if not c in whitespace:
                 break
-            vchar.hide = True
+            count += 1
+        first_token.string[:count].hide()
 
     def _makestr(self, symbol_table):
         # If the called Symbol contains whitespace between symbols, don't add more.
@@ -79,6 +130,8 @@ class PrintingFunction(Function):
         return msg
 
     def eval(self, symbol_table):
+        # print every time (never memoize the variable using us)
+        symbol_table.memo_impure()
         msg = self._makestr(symbol_table)
 
         if self.fmt:
@@ -121,23 +174,14 @@ class Call(FunctionWithArguments):
     def eval(self, symbol_table):
         var = "".join([a.eval(symbol_table) for a in self.args[0]])
 
-        symbol_table.push_layer()
-
-        arg_stack = []
-        for idx, arg_list in enumerate(self.args[1:]):
-            arg = "".join([a.eval(symbol_table) for a in arg_list])
-            varname = "%d" % (idx+1)
-            symbol_table.add(varname, arg)
-            # save the arg name so we can pop it from the symbol table 
-            arg_stack.append(varname)
-
-        # all we need to do is fetch() from the symbol table and the expression
-        # will be eval'd
-        s = symbol_table.fetch(var)
+        # the args are expanded with the caller's $(1), $(2), etc
+        args = [var]
+        for arg_list in self.args[1:]:
+            args.append("".join([a.eval(symbol_table) for a in arg_list]))
 
-        symbol_table.pop_layer()
-
-        return s
+        # the variable's expression will be eval'd with the args as $(1),
+        # $(2), etc
+        return symbol_table.call(args)
 
 
 class Eval(Function):
@@ -145,11 +189,11 @@ class Eval(Function):
 
     def eval(self, symbol_table):
         # call responsible to re-interpret this result
+        symbol_table.memo_impure()
         s = "".join([a.eval(symbol_table) for a in self.token_list])
-        src = SourceString(s)
-        makefile = parse_makefile_from_src(src)
+        statement_list = _eval_parse(s)
 
-        exit_code = execute_statement_list(makefile.token_list, symbol_table.curr_rules, symbol_table.rulesdb, symbol_table)
+        exit_code = execute_statement_list(statement_list, symbol_table.curr_rules, symbol_table.rulesdb, symbol_table)
 
         # TODO what should I do about exit_code ?
         assert exit_code==0, exit_code
@@ -175,19 +219,64 @@ class Foreach(FunctionWithArguments):
         var = "".join([a.eval(symbol_table) for a in self.args[0]])
 
         # array of strings
-        list_  = "".join([a.eval(symbol_table) for a in self.args[1]]).split()
+        list_  = split_words(self.args[1], symbol_table)
+        if not list_:
+            return ""
+
+        parts = self._template(var)
+        if parts is not None:
+            # the text only uses the loop variable so no need to touch the
+            # symbol table at all
+            if parts == [None]:
+                return WordString(list_)
+            new_list = ["".join([item if p is None else p for p in parts]) for item in list_]
+            if None in parts and all(is_word_part(p) for p in parts if p is not None):
+                # each word is still one word
+                return WordString(new_list)
+            return " ".join(new_list)
 
         out_str_list = []
-        symbol_table.push_layer()
+        text_list = self.args[2]
+        entry = symbol_table.push_loop(var, self.args[0][0].get_pos())
+        try:
+            for item in list_:
+                entry = symbol_table.set_loop(entry, item)
+                out_str_list.append("".join([a.eval(symbol_table) for a in text_list]))
+        finally:
+            symbol_table.pop_loop()
 
-        for item in list_:
-            symbol_table.add(var, item, self.args[0][0].get_pos())
-            text = "".join([a.eval(symbol_table) for a in self.args[2]])
-            out_str_list.append(text)
+        return " ".join(out_str_list)
 
-        symbol_table.pop_layer()
+    def _template(self, var):
+        # If the text is only literals and references to the loop variable
+        # e.g., $(foreach f,$(SRC),obj/$f) returns a list of strings with
+        # None where the word goes. Otherwise returns None.
+        try:
+            template_var, parts = self._foreach_template
+            if template_var == var:
+                return parts
+        except AttributeError:
+            pass
+
+        parts = []
+        # $(0), $(1), etc could be a $(call) argument instead
+        if not var.isdigit():
+            for t in self.args[2]:
+                if isinstance(t, Literal):
+                    parts.append(t.literal)
+                elif type(t) is VarRef and t.static_lookup and t.static_name == var:
+                    parts.append(None)
+                else:
+                    parts = None
+                    break
+        else:
+            parts = None
+        if not parts:
+            # (an empty text is rare enough to not bother with)
+            parts = None
 
-        return " ".join(out_str_list)
+        self._foreach_template = (var, parts)
+        return parts
 
 
 class Origin(Function):
@@ -222,6 +311,7 @@ class Shell(Function):
     # $(shell /bin/ls)
     #
     def eval(self, symbol_table):
+        symbol_table.memo_impure()
         return shell.execute_tokens(self.token_list, symbol_table)
 
 class ValueClass(Function):
@@ -239,6 +329,7 @@ class Breakpoint(Function):
     num_args = -1
 
     def eval(self, symbol_table):
+        symbol_table.memo_impure()
         breakpoint()
         return ""
 
@@ -287,16 +378,13 @@ _classes = {
 
 def maybe_function_call(vcstr):
 
-    getchars = enumerate(vcstr)
-    idx, vchar = next(getchars)
-    if vchar.char in whitespace:
+    chars = vcstr.chars()
+    if chars[0] in whitespace:
         # GNU Make doesn't treat anything with leading whitespace as a function
         # call, e.g., $( info blah blah ) is treated as a weird var ref
         return (vcstr,)
 
-    for idx, vchar in getchars:
-        c = vchar.char
-        logger.debug("m c=%s idx=%d", c, idx)
+    for idx, c in enumerate(chars):
         if c in whitespace:
             # done!
             return ( VCharString(vcstr[0:idx]), VCharString(vcstr[idx+1:]) )
@@ -9,10 +9,40 @@ logger = logging.getLogger("pymake.functions")
 
 from pymake.symbol import VarRef, Literal
 from pymake.vline import VCharString, whitespace
+import pymake.trace as trace
+
+_trace = trace.get_tracer("functions")
+
+class WordString(str):
+    # A function's result that is a list of words joined by single spaces.
+    # The str remembers its list of words so a function given the result
+    # (e.g., $(words $(sort $(SRC)))) can use the words without split()'ing
+    # the string again. Everywhere else it's just a str.
+    #
+    # The words must be exactly what str.split() would return: no empty
+    # words, no whitespace in a word. The list must not be changed.
+    def __new__(cls, words):
+        self = super().__new__(cls, " ".join(words))
+        self.words = words
+        return self
+
+def split_words(token_list, symbol_table):
+    # eval a function argument (a list of Symbols) and split into words
+    if len(token_list) == 1:
+        s = token_list[0].eval(symbol_table)
+        if type(s) is WordString:
+            return s.words
+        return s.split()
+    return "".join([t.eval(symbol_table) for t in token_list]).split()
+
+def is_word_part(s):
+    # can s be added to a word and still leave one word?
+    return not s or s.split() == [s]
 
 class Function(VarRef):
     def __init__(self, args):
-        logger.debug("function=%s args=%s", self.name, args)
+        if _trace.on:
+            _trace("function", name=self.name, args=args)
         super().__init__(args)
 
     def makefile(self):
@@ -47,7 +77,8 @@ class FunctionWithArguments(Function):
 
     def _parse_args(self):
         """Parse the token list into an array of arguments separated by literal commas."""
-        logger.debug("parse_args \"%s\" at %r", self.name, self.get_pos())
+        if _trace.on:
+            _trace("parse_args", name=self.name, pos=self.get_pos())
 
         arg_idx = 0
         self.args = []
@@ -91,27 +122,31 @@ class FunctionWithArguments(Function):
             # to separately parse for commas to make a function argument list
             #
             # peek inside the literal for commas 
-            lit = []
-            vstr_iter = iter(t.string)
-            for vchar in vstr_iter:
+            vstr = t.string
+            chars = vstr.chars()
+            # index into vstr of the start of the arg being collected
+            lit = None
+            for idx, c in enumerate(chars):
 
-                if start and vchar.char in whitespace:
+                if start and c in whitespace:
                     continue
 
                 # FIXME yuk ; I hate one-time flags
                 start = False
 
                 # looking for commas separating the args
-                if vchar.char != ',':
-                    lit.append(vchar)
+                if c != ',':
+                    if lit is None:
+                        lit = idx
                     continue
 
-                logger.debug("found comma idx=%d pos=%r", arg_idx, vchar.pos)
+                if _trace.on:
+                    _trace("found comma", idx=arg_idx, pos=vstr[idx].pos)
                 # save whatever we've seen so far (if anything)
-                if lit:
-                    new_arg = Literal(VCharString(lit))
+                if lit is not None:
+                    new_arg = Literal(VCharString(vstr[lit:idx]))
                     _save_arg(new_arg)
-                    lit = []
+                    lit = None
                 else:
                     # empty argument
                     self.args.append([])
@@ -120,10 +155,8 @@ class FunctionWithArguments(Function):
                 if arg_idx+1 == self.num_args:
                     # Done. Have everything we need.
                     # consume the rest of this string
-                    # (this will break from the inner loop)
-                    remaining = list(vstr_iter)
-                    if remaining:
-                        new_arg = Literal(VCharString(remaining))
+                    if idx+1 < len(chars):
+                        new_arg = Literal(VCharString(vstr[idx+1:]))
                         _save_arg(new_arg)
 
                     # consume the rest of the token stream
@@ -133,10 +166,11 @@ class FunctionWithArguments(Function):
                         self.args[arg_idx].extend(new_arg)
                     except IndexError:
                         self.args.append(new_arg)
+                    break
 
             # verify we haven't left anything dangling
-            if lit:
-                new_arg = Literal(VCharString(lit))
+            if lit is not None:
+                new_arg = Literal(VCharString(vstr[lit:]))
                 _save_arg(new_arg)
 
         # sanity checks
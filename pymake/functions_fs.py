@@ -6,13 +6,13 @@
 # TODO lots of copy/paste code in here. Ugly.
 
 import sys
-import glob
 import os.path
 import itertools
 
-from pymake.functions_base import Function, FunctionWithArguments
+from pymake.functions_base import Function, FunctionWithArguments, WordString, split_words, is_word_part
 from pymake.todo import TODOMixIn
 from pymake.flatten import flatten
+import pymake.globcache as globcache
 
 __all__ = [ "AbsPath", 
             "AddPrefix",
@@ -36,9 +36,7 @@ class AbsPath(Function):
     name = "abspath"
 
     def eval(self, symbol_table):
-        # list of strings
-        str_list = [t.eval(symbol_table) for t in self.token_list]
-        filename_list = "".join(str_list).split()
+        filename_list = split_words(self.token_list, symbol_table)
 
         return " ".join([os.path.abspath(fname) for fname in filename_list])
 
@@ -48,10 +46,12 @@ class AddPrefix(FunctionWithArguments):
 
     def eval(self, symbol_table):
         prefix = "".join([a.eval(symbol_table) for a in self.args[0]])
-        str_list = [a.eval(symbol_table) for a in self.args[1]]
-        filename_list = "".join(str_list).split()
+        filename_list = split_words(self.args[1], symbol_table)
 
-        return " ".join([prefix+fname for fname in filename_list])
+        new_names = [prefix+fname for fname in filename_list]
+        if is_word_part(prefix):
+            return WordString(new_names)
+        return " ".join(new_names)
 
 class AddSuffix(FunctionWithArguments):
     name = "addsuffix"
@@ -59,10 +59,12 @@ class AddSuffix(FunctionWithArguments):
 
     def eval(self, symbol_table):
         suffix = "".join([a.eval(symbol_table) for a in self.args[0]])
-        str_list = [a.eval(symbol_table) for a in self.args[1]]
-        filename_list = "".join(str_list).split()
+        filename_list = split_words(self.args[1], symbol_table)
 
-        return " ".join([fname+suffix for fname in filename_list])
+        new_names = [fname+suffix for fname in filename_list]
+        if is_word_part(suffix):
+            return WordString(new_names)
+        return " ".join(new_names)
 
 
 class BasenameClass(Function):
@@ -74,9 +76,7 @@ class BasenameClass(Function):
     # basename is the entire file name." -- GNU Make manual  Version 4.3 Jan 2020 
     #
     def eval(self, symbol_table):
-        # list of strings
-        str_list = [t.eval(symbol_table) for t in self.token_list]
-        filename_list = "".join(str_list).split()
+        filename_list = split_words(self.token_list, symbol_table)
 
         def basename(fname):
             # handle case where there is a . before a /
@@ -105,8 +105,7 @@ class DirClass(Function):
     # part is the string ‘./’" -- GNU Make manual  Version 4.3 Jan 2020 
 
     def eval(self, symbol_table):
-        str_list = [t.eval(symbol_table) for t in self.token_list]
-        filename_list = "".join(str_list).split()
+        filename_list = split_words(self.token_list, symbol_table)
 
         def dirname(fname):
             # fiddle with the string to match the quirks in gnu make
@@ -122,7 +121,7 @@ class DirClass(Function):
                 # e.g. $(dir foo.txt) -> "./"
                 return "." + os.path.sep
 
-        return " ".join([ dirname(fname) for fname in filename_list])
+        return WordString([ dirname(fname) for fname in filename_list])
 
 class FileClass(TODOMixIn, FunctionWithArguments):
     name = "file"
@@ -147,8 +146,8 @@ class JoinClass(FunctionWithArguments):
     def eval(self, symbol_table):
 
         # array of strings
-        list1 = "".join([a.eval(symbol_table) for a in self.args[0]]).split()
-        list2 = "".join([a.eval(symbol_table) for a in self.args[1]]).split()
+        list1 = split_words(self.args[0], symbol_table)
+        list2 = split_words(self.args[1], symbol_table)
 
         # to use zip() need each list to be identical size because zip() will
         # stop at shortest list otherwise; gnu make continues 
@@ -172,8 +171,7 @@ class NotDirClass(Function):
     # other valid alternative."  -- GNU Make manual  Version 4.3 Jan 2020
 
     def eval(self, symbol_table):
-        str_list = [t.eval(symbol_table) for t in self.token_list]
-        filename_list = "".join(str_list).split()
+        filename_list = split_words(self.token_list, symbol_table)
 
         def notdir(fname):
             # no path components treated as current directory
@@ -195,8 +193,8 @@ class RealPath(Function):
     # is returned. Consult the realpath(3) documentation for a list of possible
     # failure causes."  -- GNU Make manual  Version 4.3 Jan 2020
     def eval(self, symbol_table):
-        str_list = [t.eval(symbol_table) for t in self.token_list]
-        filename_list = "".join(str_list).split()
+        symbol_table.memo_impure()
+        filename_list = split_words(self.token_list, symbol_table)
 
         def realpath(fname):
             # if the file doesn't exist, return empty string
@@ -227,8 +225,7 @@ class Suffix(Function):
     # fewer file names." -- GNU Make manual  Version 4.3 Jan 2020
     #
     def eval(self, symbol_table):
-        str_list = [t.eval(symbol_table) for t in self.token_list]
-        filename_list = "".join(str_list).split()
+        filename_list = split_words(self.token_list, symbol_table)
 
         def suffix(fname):
             # handle case where there is a . before a /
@@ -248,7 +245,7 @@ class Suffix(Function):
 
         # extra hoops to throw away empty strings
         new_names = filter( lambda s : bool(s), [suffix(fname) for fname in filename_list] )
-        return " ".join(new_names)
+        return WordString(list(new_names))
 
 class Wildcard(Function):
     name = "wildcard"
@@ -262,6 +259,8 @@ class Wildcard(Function):
     # guarantee my glob will match GNU make's
 
     def eval(self, symbol_table):
+        symbol_table.memo_impure()
+
         # TODO obviously need to condense this a bit
 
         # evaluate all the things; will have an array of strings
@@ -278,8 +277,8 @@ class Wildcard(Function):
 #        step4 = [s for s in step3.split() if len(s.strip())]
 #        print(f"wild step4={step4}")
 
-        # array of arrays of strings (glob.glob() returns array of strings)
-        step5 = [glob.glob(pattern) for pattern in step3]
+        # array of arrays of strings (glob() returns array of strings)
+        step5 = [globcache.glob(pattern) for pattern in step3]
 #        print(f"wild step5={step5}")
 
         return " ".join(flatten(step5))
@@ -16,15 +16,14 @@
 # Any function that needs to operate on whitespace separated words within that
 # string will need to split() (then " ".join() the results).
 
-import re
 import logging
 
 logger = logging.getLogger("pymake.functions")
 
 from pymake.error import *
-from pymake.functions_base import Function, FunctionWithArguments
+from pymake.functions_base import Function, FunctionWithArguments, WordString, split_words, is_word_part
 from pymake.flatten import flatten
-from pymake.wildcard import wildcard_replace, wildcard_match_list
+from pymake.wildcard import compile_pattern, wildcard_match_list
 from pymake.symbol import Literal
 from pymake.constants import whitespace
 
@@ -95,13 +94,10 @@ class FilterClass(FunctionWithArguments):
         # $(filter) destroys intermediate whitespace
 
         # array of strings
-        pattern_step1 = [t.eval(symbol_table) for t in self.args[0]]
-        pattern_step2 = "".join(pattern_step1).split()
+        pattern_list = split_words(self.args[0], symbol_table)
+        text_list = split_words(self.args[1], symbol_table)
 
-        text_step1 = [t.eval(symbol_table) for t in self.args[1]]
-        text_step2 = "".join(text_step1).split()
-
-        return " ".join(wildcard_match_list(pattern_step2, text_step2, self.name=="filter-out"))
+        return WordString(list(wildcard_match_list(pattern_list, text_list, self.name=="filter-out")))
 
 class FilterOutClass(FilterClass):
     name = "filter-out"
@@ -135,8 +131,7 @@ class FirstWord(Function):
 
     def eval(self, symbol_table):
         # array of strings
-        step1 = [t.eval(symbol_table) for t in self.token_list]
-        step2 = "".join(step1).split()
+        step2 = split_words(self.token_list, symbol_table)
 
         try:
             return step2[0]
@@ -148,8 +143,7 @@ class LastWord(Function):
 
     def eval(self, symbol_table):
         # array of strings
-        step1 = [t.eval(symbol_table) for t in self.token_list]
-        step2 = "".join(step1).split()
+        step2 = split_words(self.token_list, symbol_table)
 
         if len(step2) == 0:
             return ""
@@ -181,43 +175,7 @@ class Patsubst(FunctionWithArguments):
     # >>   bar    bar     baz    << 
     #
 
-    def _re_subst(self, from_s, to_s, target):
-        # any exact match of our from_s surrounded by whitespace or at beginning or end of line
-        rex = re.compile( r"(^|\s)" + re.escape(from_s) + r"(\s|$)" )
-
-        # tricky part is I need overlapping regex matches
-        #   <space1>a<space2>b<space3>
-        # needs to make matches:
-        #   <space1>a<space2>
-        #   <space2>b<space3>
-        # finditer() doesn't do overlapping
-        start = 0
-        new_s = ""
-        while 1 :
-            robj = rex.search(target, start)
-            if not robj:
-                new_s += target[start:]
-                break
-#            print(f"re_sub target={target} robj={robj}")
-
-            # g0 - char that matched before our substring
-            # g1 - char that matched after our substring
-            # g0,g1 will be empty at start, end of line respectively
-            # The len() allows us to capture the char before/after the match except
-            # for beginning/end of line
-            g0,g1 = robj.groups()
-
-            end = robj.start() + len(g0)
-            new_s += target[start:end] + to_s 
-
-            # search for next 
-            # The len(g1) pulls in char after substring except for end of line
-            start = robj.end() - len(g1)
-
-#        print(f"re_subst new_s={new_s}")
-        return new_s
-
-    def subst(self, from_s, to_s, symbol_table):
+    def subst(self, pattern, replacement, symbol_table):
         # Does $(patsubst) decay to $(subst) if pattern has no wildcards???
         # (runs off and reads make 4.3 source) Yes! Yes it does!
         #
@@ -230,25 +188,22 @@ class Patsubst(FunctionWithArguments):
         # whitespace (normal $(subst) does not preserve whitespace)
 
 #        breakpoint()
-#        print(f"patsubst-subst from_s=\"{from_s}\" to_s=\"{to_s}\"")
 
-        # array of strings where whitespace must be carefully preserved
-        text_list = [a.eval(symbol_table) for a in self.args[2] ]
-#        print(f"subst text={text_list}")
+        # whitespace must be carefully preserved
+        text = "".join([a.eval(symbol_table) for a in self.args[2]])
 
         # no "from" then we just return the text list
         # $(patsubst ,z,a c d e f g) -> a b c d e f g
         # $(subst ,z,a c d e f g) -> a b c d e f gz
         # $(patsubst a,,a c d e f g) ->  b c d e f g
-        if not from_s:
-            # I need to return a string
-            return "".join(text_list)
+        if not pattern.text:
+            return text
 
         # when patsubst decays to subst(ish), GNU make will only replace whole
         # whitespace delimited words (exact match required)
         # !!! whitespace must be preserved !!!
 
-        return "".join( [ self._re_subst(from_s, to_s, str_) for str_ in text_list] )
+        return pattern.subst_words(replacement.unquoted, text)
 
 
     def eval(self, symbol_table):
@@ -259,22 +214,23 @@ class Patsubst(FunctionWithArguments):
         # because the target is split on whitespace.
         # e.g., $(patsubst a b,q,a b a b a b) -> no change
 
-        pattern = "".join(flatten([a.eval(symbol_table) for a in self.args[0]]))
-        replacement = "".join(flatten([a.eval(symbol_table) for a in self.args[1]]))
+        pattern = compile_pattern("".join([a.eval(symbol_table) for a in self.args[0]]))
+        replacement = compile_pattern("".join([a.eval(symbol_table) for a in self.args[1]]))
 
-#        print(f"pattern={pattern} replace={replacement}")
-        if not '%' in pattern:
+        if not pattern.wild:
             # decays to strange sub-case of $(subst) substitution
             return self.subst(pattern, replacement, symbol_table)
 
         # NOW can whitespace can be destroyed
-        text = flatten([a.eval(symbol_table).split() for a in self.args[2]])
+        text = split_words(self.args[2], symbol_table)
 
-        new_ = wildcard_replace(pattern, replacement, text)
-#        print(f"new={new_}")
+        new_ = pattern.replace(text, replacement)
 
         # This class marked whitespace preserving so need to add new whitespace
         # between the strings where we destroyed the whitespace
+        if is_word_part(replacement.unquoted) and (replacement.prefix or replacement.suffix):
+            # every replaced word is still one (non-empty) word
+            return WordString(new_)
         return " ".join(new_)
 
 class SortClass(Function):
@@ -294,12 +250,10 @@ class SortClass(Function):
     def eval( self, symbol_table):
 
         # list of strings
-        str_list = [t.eval(symbol_table) for t in self.token_list]
-
-        s = "".join(str_list).split()
+        s = split_words(self.token_list, symbol_table)
 
         # set() remove duplicates
-        return " ".join(sorted(set(s)))
+        return WordString(sorted(set(s)))
         
 
 class StripClass(Function):
@@ -309,14 +263,7 @@ class StripClass(Function):
     # nal sequence of one or more whitespace characters with a single space."
     #
     def eval(self, symbol_table):
-        # TODO collapse this to fewer steps
-
-        # array of strings
-        step1 = [t.eval(symbol_table) for t in self.token_list]
-
-        step2 = [str_.split() for str_ in step1]
-
-        return " ".join(flatten(step2))
+        return WordString(split_words(self.token_list, symbol_table))
 
 
 class Subst(FunctionWithArguments):
@@ -371,7 +318,7 @@ class Word(FunctionWithArguments):
         # determining the 1st argument (the index) is correct?
         # (ie, is gnu make short circuiting the expression?)
         # Is important because the eval() might have side effects.
-        text = flatten([t.eval(symbol_table).split() for t in self.args[1]])
+        text = split_words(self.args[1], symbol_table)
 
         # TODO convert to int_parse()
         # squish together to make a single string
@@ -387,13 +334,10 @@ class Word(FunctionWithArguments):
             errmsg = "first argument to '{.name}' must be greater than 0.".format(self)
             raise InvalidFunctionArguments(pos=self.get_pos(), msg=errmsg)
 
-        # text is an iterable yielding strings
-        counter = 0
-        for word in text:
-            counter += 1
-            if counter == index_num:
-                return word
-        return ""
+        try:
+            return text[index_num-1]
+        except IndexError:
+            return ""
 
 
 class WordList(FunctionWithArguments, IntegerArgument):
@@ -418,7 +362,10 @@ class WordList(FunctionWithArguments, IntegerArgument):
         # $(wordlist 3,2,$(shell touch /tmp/tmp.txt))  <-- /tmp/tmp.txt will exist
 
         # array of strings into a single string
-        text = "".join([t.eval(symbol_table) for t in self.args[2]])
+        if len(self.args[2]) == 1:
+            text = self.args[2][0].eval(symbol_table)
+        else:
+            text = "".join([t.eval(symbol_table) for t in self.args[2]])
 
         # GNU make slicing is 1-based, python slicing is zero based.
         # Don't need to modify end_idx because python slicing is [) (end is not
@@ -426,9 +373,13 @@ class WordList(FunctionWithArguments, IntegerArgument):
         # index is already one larger than it needs to be.
 #        start_idx -= 1
 
-        if start_idx >= end_idx :
+        if start_idx > end_idx :
             return ""
 
+        if type(text) is WordString:
+            # only single spaces between the words
+            return WordString(text.words[start_idx-1:end_idx])
+
         # whitespace between symbols is preserved.
         # Leading/trailing whitespace discarded.
         text = text.strip()
@@ -467,7 +418,7 @@ class WordList(FunctionWithArguments, IntegerArgument):
                     word_counter += 1
                     if word_counter == start_idx:
                         slice_start = word_start_pos
-                    elif word_counter == end_idx:
+                    if word_counter == end_idx:
                         # yay! we're done
                         return text[slice_start:pos]
 
@@ -485,7 +436,7 @@ class WordList(FunctionWithArguments, IntegerArgument):
             word_counter += 1
             if word_counter == start_idx:
                 slice_start = word_start_pos
-            elif word_counter == end_idx:
+            if word_counter == end_idx:
                 # yay! we're done
                 return text[slice_start:pos]
 
@@ -511,11 +462,5 @@ class Words(Function):
     # "Returns the number of words in text." -- GNU make manual
 
     def eval(self, symbol_table):
-        # array of strings
-        step1 = [t.eval(symbol_table) for t in self.token_list]
-        # array of array of strings
-        step2 = [str_.split() for str_ in step1]
-        # TODO is there a better way to do this? w/o creating a list() 
-        # (iterate over the flatten()'d result with a counter?)
-        return str(len(list(flatten(step2))))
+        return str(len(split_words(self.token_list, symbol_table)))
 
@@ -0,0 +1,183 @@
+# SPDX-License-Identifier: GPL-2.0
+# Copyright (C) 2014-2024 David Poole davep@mbuf.com david.poole@ericsson.com
+#
+# A cache of directory listings for $(wildcard) and the file timestamp
+# cache.
+#
+# glob.glob() reads a directory every time it's called. A makefile doing
+# $(foreach d,$(DIRS),$(wildcard $d/*.c $d/*.h)) reads every directory over
+# and over. Instead, each directory is read once with os.scandir() and glob
+# patterns are matched against the names in memory (same as GNU Make's
+# directory cache in src/dir.c). The stat cache (statcache.py) uses the same
+# listings to answer "does this file exist?" without a stat() per file.
+#
+# The listings can go stale when something writes to the filesystem:
+#   - a $(shell) or != command: could write anywhere so the whole cache is
+#     thrown away once the command has run
+#   - a recipe: the listing of the target's directory (and of the target if
+#     it's a directory) is thrown away when the rule is done (see
+#     StatCache.invalidate())
+#   - a change of directory (sub-make -C): the whole cache is thrown away
+#
+# The cache is only used from the main thread. Recipe commands run by -j
+# worker threads never touch it; jobs.py invalidates a target once its Job
+# is finished.
+#
+# glob() returns the same names in the same order as glob.glob().
+
+import os
+import re
+import glob as _glob
+import fnmatch
+import logging
+
+logger = logging.getLogger("pymake.globcache")
+
+import pymake.trace as trace
+
+_trace = trace.get_tracer("globcache")
+
+__all__ = [ "enable", "glob", "listdir", "invalidate", "invalidate_all" ]
+
+# allow turning off (--no-wildcard-cache) to check if the cache is wrong
+# (glob() only; the stat cache always uses the listings)
+_enabled = True
+
+# key: directory (normalized path)
+# value: the names in the directory or None if the directory can't be read.
+# The names are the keys of a dict: os.scandir() order for glob() and fast
+# membership for the stat cache.
+_dirs = {}
+
+# the directory the cached paths are relative to
+_cwd = None
+
+_magic_re = re.compile(r"[*?[]")
+
+def _has_magic(s):
+    return _magic_re.search(s) is not None
+
+def _key(dirname):
+    # cache key for a directory
+    if ".." in dirname.split(os.sep):
+        # a/../b isn't always b when a is a symlink
+        return dirname
+    return os.path.normpath(dirname or os.curdir)
+
+def _scan(dirname):
+    try:
+        with os.scandir(dirname or os.curdir) as it:
+            return dict.fromkeys(entry.name for entry in it)
+    except OSError:
+        # doesn't exist, isn't a directory, no permission, etc
+        return None
+
+def _listdir(dirname):
+    # Returns the names in a directory or None if not a directory
+    key = _key(dirname)
+    try:
+        return _dirs[key]
+    except KeyError:
+        pass
+
+    names = _scan(dirname)
+    if _trace.on:
+        _trace("scan", dirname=dirname, count=len(names) if names is not None else None)
+    _dirs[key] = names
+    return names
+
+def _lexists(dirname, name):
+    # does dirname/name exist (without following a symlink)?
+    if name in (os.curdir, os.pardir):
+        return os.path.lexists(os.path.join(dirname, name))
+    names = _listdir(dirname)
+    if names is None:
+        return False
+    return name in names
+
+def _glob1(dirname, pattern):
+    # names in dirname matching a pattern
+    names = _listdir(dirname)
+    if not names:
+        return []
+    if pattern[0] != '.':
+        # hidden files only match a pattern starting with a '.'
+        names = [name for name in names if name[0] != '.']
+    return fnmatch.filter(names, pattern)
+
+def _glob0(dirname, basename):
+    # a name without wildcards in dirname
+    if not basename:
+        # pattern ended with a '/' so only a directory will do
+        if os.path.isdir(dirname):
+            return [basename]
+    elif _lexists(dirname, basename):
+        return [basename]
+    return []
+
+def _iglob(pattern):
+    # same steps as glob.glob()
+    dirname, basename = os.path.split(pattern)
+    if not _has_magic(pattern):
+        if basename:
+            if _lexists(dirname, basename):
+                yield pattern
+        elif os.path.isdir(dirname):
+            yield pattern
+        return
+
+    if not dirname:
+        yield from _glob1(dirname, basename)
+        return
+
+    if dirname != pattern and _has_magic(dirname):
+        dirs = _iglob(dirname)
+    else:
+        dirs = [dirname]
+
+    glob_in_dir = _glob1 if _has_magic(basename) else _glob0
+    for d in dirs:
+        for name in glob_in_dir(d, basename):
+            yield os.path.join(d, name)
+
+def _check_cwd():
+    # the cached relative paths are wrong after a chdir
+    global _cwd
+    cwd = os.getcwd()
+    if cwd != _cwd:
+        _dirs.clear()
+        _cwd = cwd
+
+def enable(flag=True):
+    global _enabled
+    _enabled = flag
+    _dirs.clear()
+
+def glob(pattern):
+    # glob.glob() using the cached directory listings
+    if not _enabled:
+        return _glob.glob(pattern)
+
+    _check_cwd()
+
+    if not pattern:
+        return []
+    return list(_iglob(pattern))
+
+def listdir(dirname):
+    # The names in a directory ("" for the current directory) or None if not
+    # a directory. The caller must not change the returned names.
+    _check_cwd()
+    return _listdir(dirname)
+
+def invalidate(path):
+    # path (a file or directory) has been written
+    for dirname in (os.path.dirname(path), path):
+        key = _key(dirname)
+        if key in _dirs:
+            del _dirs[key]
+            if _trace.on:
+                _trace("invalidate", dirname=dirname)
+
+def invalidate_all():
+    _dirs.clear()
@@ -0,0 +1,187 @@
+# SPDX-License-Identifier: GPL-2.0
+# Copyright (C) 2014-2024 David Poole davep@mbuf.com david.poole@ericsson.com
+#
+# Run trivial shell commands in this process instead of starting a shell.
+#
+# Lots of recipe lines are simple things like "@echo building foo" or
+# "mkdir -p obj" or "rm -f *.o" (okay, not that last one; there's a glob).
+# GNU Make has the same idea: it skips the shell when a command line has no
+# shell special characters (see sh_chars in src/job.c) though it still forks
+# and execs the command itself.
+#
+# The recognizer is deliberately conservative. A command is only run here if
+# it is one simple command (no shell metacharacters, quotes, redirection,
+# variables, globs) and is one of a small list of commands with options we
+# know. Anything else goes to the shell. If the Python version of a command
+# fails, the command is given to the shell so the error message and exit
+# status are exactly the shell's. (Every command here is safe to run twice.)
+#
+# echo, true, false, : are built into the shell so the shell never looks for
+# them in PATH. mkdir, touch, rm are only run here if the recipe's PATH finds
+# the usual program (a makefile can put its own mkdir ahead of the system's).
+#
+# Turned off with --no-inproc-commands.
+
+import os
+import sys
+import shutil
+import logging
+import threading
+
+logger = logging.getLogger("pymake.inproc")
+
+import pymake.constants as constants
+
+__all__ = [ "enable", "run", "forks_avoided" ]
+
+_enabled = True
+
+# characters that make a command line not simple
+# (backslash because dash's echo interprets backslash escapes and bash's doesn't)
+_special_chars = set("|&;<>()$`\\\"'*?[]#~{}=!%\n")
+
+# number of commands run without starting a process
+_count = 0
+_lock = threading.Lock()
+
+# commands the shell finds in PATH
+# key: (command, PATH)
+# value: True if PATH finds the same program as the default PATH
+_programs = {}
+
+def enable(flag=True):
+    global _enabled
+    _enabled = flag
+
+def forks_avoided():
+    return _count
+
+def _split(cmd_str):
+    # Split into words like the shell (no quotes or expansions to worry
+    # about). Only space and tab (the default IFS less newline) separate words;
+    # other whitespace is part of a word.
+    return [w for w in cmd_str.replace("\t", " ").split(" ") if w]
+
+def _usual_program(name, env):
+    path = env.get("PATH", os.defpath)
+    key = (name, path)
+    try:
+        return _programs[key]
+    except KeyError:
+        pass
+
+    if all(os.path.isabs(d) for d in path.split(os.pathsep)):
+        found = shutil.which(name, path=path)
+        usual = shutil.which(name, path=os.defpath)
+        ok = found is not None and usual is not None and \
+                os.path.realpath(found) == os.path.realpath(usual)
+    else:
+        # a relative directory depends on the cwd
+        ok = False
+
+    _programs[key] = ok
+    return ok
+
+def _echo(args, capture):
+    newline = True
+    if args and args[0] == "-n":
+        newline = False
+        args = args[1:]
+
+    # echo options differ between shells so let the shell do them
+    if any(a.startswith("-") for a in args):
+        return None
+
+    s = " ".join(args) + ("\n" if newline else "")
+    if capture:
+        return 0, s
+    sys.stdout.write(s)
+    sys.stdout.flush()
+    return 0, None
+
+def _true(args, capture):
+    return 0, "" if capture else None
+
+def _false(args, capture):
+    return 1, "" if capture else None
+
+def _mkdir(args, capture):
+    # only mkdir -p
+    if not args or args[0] != "-p" or any(a.startswith("-") for a in args[1:]):
+        return None
+    for d in args[1:]:
+        os.makedirs(d, exist_ok=True)
+    return 0, "" if capture else None
+
+def _touch(args, capture):
+    if not args or any(a.startswith("-") for a in args):
+        return None
+    for f in args:
+        try:
+            fd = os.open(f, os.O_WRONLY|os.O_CREAT|os.O_NONBLOCK|os.O_NOCTTY, 0o666)
+            os.close(fd)
+        except IsADirectoryError:
+            pass
+        os.utime(f)
+    return 0, "" if capture else None
+
+def _rm(args, capture):
+    # only rm -f
+    if not args or args[0] != "-f" or any(a.startswith("-") for a in args[1:]):
+        return None
+    for f in args[1:]:
+        try:
+            os.unlink(f)
+        except FileNotFoundError:
+            pass
+    return 0, "" if capture else None
+
+_builtins = {
+    ":" : _true,
+    "true" : _true,
+    "false" : _false,
+    "echo" : _echo,
+}
+
+_programs_run = {
+    "mkdir" : _mkdir,
+    "touch" : _touch,
+    "rm" : _rm,
+}
+
+def run(cmd, cmd_str, env, capture):
+    # cmd, env are the argv and environment from shell.build_command()
+    # Returns (exit_code, stdout) or None if a shell must run the command.
+    global _count
+
+    if not _enabled:
+        return None
+
+    # only if the shell would have been the default shell
+    if cmd != [constants.DEFAULT_SHELL, constants.DEFAULT_SHELLFLAGS, cmd_str]:
+        return None
+
+    if not _special_chars.isdisjoint(cmd_str):
+        return None
+
+    argv = _split(cmd_str)
+    if not argv:
+        return None
+
+    fn = _builtins.get(argv[0])
+    if fn is None:
+        fn = _programs_run.get(argv[0])
+        if fn is None or not _usual_program(argv[0], env):
+            return None
+
+    try:
+        ret = fn(argv[1:], capture)
+    except OSError as err:
+        # let the shell report the error
+        logger.debug("inproc \"%s\" failed: %s", cmd_str, err)
+        return None
+
+    if ret is not None:
+        with _lock:
+            _count += 1
+    return ret
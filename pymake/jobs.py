@@ -0,0 +1,308 @@
+# SPDX-License-Identifier: GPL-2.0
+# Copyright (C) 2014-2024 David Poole davep@mbuf.com david.poole@ericsson.com
+#
+# Run recipes in parallel (-j N)
+#
+# The rules needed to build the targets are gathered into a graph. A rule is
+# ready to run once all of its prerequisites have been built. Up to N ready
+# rules run at the same time.
+#
+# The symbol table is NOT thread safe. Everything that touches the symbol
+# table (expanding the recipes, building the shell's environment) happens in
+# the main thread before a Job is handed to a worker thread. Like GNU Make,
+# all the lines of a rule's recipe are expanded before the first line is run.
+# A worker thread only runs the shell commands.
+#
+# Sub-makes run in the main process (see submake.py) and can chdir(). A Job
+# that finds a sub-make stops and hands the sub-make back to the main thread.
+# The main thread waits for all other running Jobs to finish then runs the
+# sub-make then restarts the rest of the Job.
+#
+# With a jobserver (see jobserver.py), the first running Job uses our implicit
+# job slot. Every other running Job needs a token from the jobserver. The
+# token is returned when the Job finishes.
+#
+# Without -j the same Jobs are run one at a time by the main thread (see
+# _run_rules() in pymake.py).
+#
+# The commands' own output goes straight to our stdout/stderr (same as GNU
+# Make without --output-sync) but each line we print (the command echo, the
+# error message) is written whole under a lock so lines from different Jobs
+# can't be mixed together.
+
+import sys
+import logging
+import collections
+import heapq
+import threading
+import concurrent.futures
+
+logger = logging.getLogger("pymake.jobs")
+
+from pymake.error import *
+import pymake.shell as shell
+
+_output_lock = threading.Lock()
+
+def _output(line, file=None):
+    # write one whole line (see above)
+    if file is None:
+        file = sys.stdout
+    with _output_lock:
+        file.write(line + "\n")
+        file.flush()
+
+class Command:
+    # one line of a recipe, expanded and ready to give to the shell
+    def __init__(self, cmd_str, argv, env, ignore_failure, silent, recursive, pos):
+        self.cmd_str = cmd_str
+        self.argv = argv
+        self.env = env
+        self.ignore_failure = ignore_failure
+        self.silent = silent
+        # '+' prefix
+        self.recursive = recursive
+        # position of the Recipe (for error messages)
+        self.pos = pos
+
+class Job:
+    # all the Commands from a Rule's recipes
+    def __init__(self, rule, command_list):
+        self.rule = rule
+        self.command_list = command_list
+
+        # index of the next Command to run
+        self.idx = 0
+
+        # ShellReturn of a sub-make waiting to be run by the main thread
+        self.submake = None
+
+        # jobserver token (None when running in our implicit job slot)
+        self.token = None
+
+    def run(self, silent, dry_run=False):
+        # Runs in a worker thread (or the main thread without -j). Must not
+        # touch the symbol table.
+        # Returns the exit code of the Job.
+        self.submake = None
+        while self.idx < len(self.command_list):
+            cmd = self.command_list[self.idx]
+            self.idx += 1
+
+            if dry_run:
+                # -n prints every command (even the silent ones) but only runs
+                # the '+' commands
+                _output(cmd.cmd_str)
+                if not cmd.recursive:
+                    continue
+            elif not cmd.silent and not silent:
+                _output(cmd.cmd_str)
+
+            ret = shell.run(cmd.cmd_str, cmd.argv, cmd.env, capture=False, recursive=cmd.recursive)
+            if ret.is_submake:
+                if ret.exit_code != 0:
+                    raise InternalError(msg="running submake failed", pos=cmd.pos)
+                self.submake = ret
+                return exit_status["success"]
+
+            if ret.exit_code != 0:
+                self._failed(cmd, ret.exit_code)
+                if not cmd.ignore_failure:
+                    return exit_status["error"]
+
+        return exit_status["success"]
+
+    def submake_done(self, exit_code):
+        # The main thread ran the sub-make; returns the exit code of the
+        # Command that started it. Call run() again for the rest of the Job.
+        cmd = self.command_list[self.idx-1]
+        self.submake = None
+        if exit_code != 0:
+            self._failed(cmd, exit_code)
+            if not cmd.ignore_failure:
+                return exit_status["error"]
+        return exit_status["success"]
+
+    def _failed(self, cmd, exit_code):
+        _output("make: *** [%r: %s] Error %d %s" % (cmd.pos, self.rule.target,
+            exit_code, "(ignored)" if cmd.ignore_failure else ""), sys.stderr)
+
+def _build_graph(rulesdb, target_list):
+    # Find every out of date rule needed to build the targets.
+    #
+    # Returns a dict of target -> Rule and a dict of target -> [prereq targets
+    # being remade]. The dicts are in the order GNU Make would build the
+    # targets (prerequisites left to right, depth first).
+
+    nodes = {}
+    prereqs = {}
+
+    visited = {}
+    for target in target_list:
+        for rule in rulesdb.walk_tree(target, visited):
+            # walk_tree() yields prereqs first so a remade prereq is already
+            # in nodes (a dropped circular prereq is not)
+            nodes[rule.target] = rule
+            prereqs[rule.target] = [p for p in rule.prereq_list if p in nodes]
+
+    return nodes, prereqs
+
+# how long to wait (seconds) for a running Job before checking the jobserver
+# for a free token again
+_token_poll = 0.1
+
+def build(target_list, rulesdb, jobs, keep_going, silent, make_job, run_submake, jobserver=None):
+    # Build the targets running up to 'jobs' Jobs at the same time.
+    #
+    # make_job(rule) -> Job
+    #     expand a Rule's recipes (called in the main thread)
+    # run_submake(ShellReturn) -> exit code
+    #     run a sub-make in this process (called in the main thread with no
+    #     Jobs running)
+    # jobserver
+    #     Jobserver shared with other makes (see jobserver.py) or None
+
+    try:
+        nodes, prereqs = _build_graph(rulesdb, target_list)
+    except NoRuleToMakeTarget as err:
+        error_message(None, err.msg)
+        return exit_status["error"]
+
+    # key: target
+    # value: prereqs not yet built
+    waiting = { target:set(p_list) for target,p_list in prereqs.items() }
+
+    # key: target
+    # value: targets waiting on this target
+    dependents = collections.defaultdict(list)
+    for target,p_list in prereqs.items():
+        for p in p_list:
+            dependents[p].append(target)
+
+    # Ready targets are started in the order GNU Make would build them
+    # serially so -j1 is the same as no -j at all.
+    # key: target
+    # value: index in the serial build order
+    order = { target:idx for idx,target in enumerate(nodes.keys()) }
+    ready = [ order[target] for target,w in waiting.items() if not w ]
+    heapq.heapify(ready)
+    targets = list(nodes.keys())
+
+    built = set()
+    failed = set()
+
+    stop = False
+    exit_code = exit_status["success"]
+
+    # key: Future
+    # value: Job
+    running = {}
+
+    # is a running Job using our implicit job slot?
+    implicit_slot = False
+
+    def get_slot(job):
+        # Returns True if the Job may start
+        nonlocal implicit_slot
+        if jobserver is None:
+            return True
+        if not implicit_slot:
+            implicit_slot = True
+            return True
+        job.token = jobserver.try_acquire()
+        return job.token is not None
+
+    def release_slot(job):
+        nonlocal implicit_slot
+        if jobserver is None:
+            return
+        if job.token is None:
+            implicit_slot = False
+        else:
+            jobserver.release(job.token)
+            job.token = None
+
+    def finish(job, job_exit_code):
+        nonlocal stop, exit_code
+        target = job.rule.target
+        # (even a failed recipe might have written the target)
+        rulesdb.statcache.invalidate(target)
+        if job_exit_code != exit_status["success"]:
+            exit_code = job_exit_code
+            failed.add(target)
+            if not keep_going:
+                stop = True
+            return
+
+        built.add(target)
+        for d in dependents[target]:
+            waiting[d].discard(target)
+            if not waiting[d]:
+                heapq.heappush(ready, order[d])
+
+    def wait_for(futures, timeout=None):
+        done, _ = concurrent.futures.wait(futures, timeout=timeout,
+                        return_when=concurrent.futures.FIRST_COMPLETED)
+        for future in done:
+            job = running.pop(future)
+            job_exit_code = future.result()
+            if job.submake is None or stop:
+                release_slot(job)
+                finish(job, job_exit_code)
+            else:
+                # run the sub-make once nothing else is running then start the
+                # rest of the Job (the Job keeps its job slot for the sub-make)
+                submakes.append(job)
+
+    # Jobs stopped at a sub-make
+    submakes = []
+
+    # Job expanded but waiting on a job slot
+    blocked = None
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=jobs) as pool:
+        while not stop:
+            if submakes and not running:
+                job = submakes.pop(0)
+                submake_exit_code = job.submake_done(run_submake(job.submake))
+                if submake_exit_code != exit_status["success"]:
+                    release_slot(job)
+                    finish(job, submake_exit_code)
+                else:
+                    running[pool.submit(job.run, silent)] = job
+                continue
+
+            while (blocked is not None or ready) and not submakes and len(running) < jobs:
+                if blocked is not None:
+                    job, blocked = blocked, None
+                else:
+                    rule = nodes[targets[heapq.heappop(ready)]]
+                    job = make_job(rule)
+                    if not job.command_list:
+                        # nothing to run
+                        finish(job, exit_status["success"])
+                        continue
+                if not get_slot(job):
+                    # wait for a token
+                    blocked = job
+                    break
+                running[pool.submit(job.run, silent)] = job
+
+            if not running:
+                if submakes:
+                    continue
+                break
+
+            # if a Job is waiting on a token, wake up now and again to check
+            wait_for(list(running.keys()), _token_poll if blocked else None)
+
+        # something failed; let the running jobs finish
+        while running:
+            wait_for(list(running.keys()))
+
+    if failed and keep_going:
+        for target in target_list:
+            if target in nodes and target not in built:
+                error_message(None, "Target '%s' not remade because of errors." % target)
+
+    return exit_code
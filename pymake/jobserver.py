@@ -0,0 +1,229 @@
+# SPDX-License-Identifier: GPL-2.0
+# Copyright (C) 2014-2024 David Poole davep@mbuf.com david.poole@ericsson.com
+#
+# GNU Make jobserver
+#
+# "Jobserver protocol" -- GNU Make 4.4 section 13.1
+#
+# The jobserver is a pipe (or a named pipe aka fifo) holding one byte (a
+# "token") per job slot. A make always owns one implicit job slot. To run
+# another job at the same time, the make must first read a token from the
+# jobserver. When the job finishes, the token is written back.
+#
+# The top level make with -j N creates the jobserver holding N-1 tokens and
+# advertises it to its children in MAKEFLAGS:
+#   --jobserver-auth=fifo:PATH   (GNU Make 4.4 and later)
+#   --jobserver-auth=R,W         (file descriptors of an anonymous pipe)
+#   --jobserver-fds=R,W          (GNU Make before 4.2)
+#
+# A make started beneath another make (GNU Make or pymake) finds the jobserver
+# in MAKEFLAGS and uses it instead of its own -j. Sub-makes run inside this
+# process (see submake.py) share the same Jobserver instance.
+
+import os
+import stat
+import atexit
+import logging
+import tempfile
+
+logger = logging.getLogger("pymake.jobserver")
+
+from pymake.error import *
+
+__all__ = [ "Jobserver", "create", "from_makeflags", "get_jobserver",
+            "start", "makeflags" ]
+
+# the jobserver used by this process (None if not running in parallel)
+_jobserver = None
+
+class Jobserver:
+    def __init__(self, auth, read_fd, write_fd, fifo_path=None):
+        # the --jobserver-auth= string for MAKEFLAGS
+        self.auth = auth
+
+        # fds to pass to children (empty for a fifo)
+        self.fds = ()
+
+        self.read_fd = read_fd
+        self.write_fd = write_fd
+
+        # we created this fifo so must clean it up
+        self.fifo_path = fifo_path
+
+        # read tokens through our own non-blocking open file description.
+        # (Setting O_NONBLOCK on a shared pipe fd would change it for every
+        # other make using the same pipe.)
+        self._nb_read_fd = _open_nonblocking(read_fd)
+
+        # tokens currently held by this process
+        self.held = 0
+
+        # most jobs to run at the same time (-j N)
+        self.jobs = None
+
+    def try_acquire(self):
+        # Returns a token (a single byte) or None if no token available.
+        try:
+            token = os.read(self._nb_read_fd, 1)
+        except BlockingIOError:
+            return None
+        except InterruptedError:
+            return None
+        if not token:
+            return None
+        self.held += 1
+        return token
+
+    def release(self, token):
+        assert self.held > 0
+        os.write(self.write_fd, token)
+        self.held -= 1
+
+    def close(self):
+        for fd in set((self._nb_read_fd, self.read_fd, self.write_fd)):
+            try:
+                os.close(fd)
+            except OSError:
+                pass
+        if self.fifo_path:
+            try:
+                os.unlink(self.fifo_path)
+                os.rmdir(os.path.dirname(self.fifo_path))
+            except OSError:
+                pass
+
+def _open_nonblocking(fd):
+    # Open a new file description on an existing pipe so O_NONBLOCK can be
+    # set without changing the pipe for anyone else. Linux (and friends)
+    # allow re-opening a pipe through /proc.
+    try:
+        return os.open("/proc/self/fd/%d" % fd, os.O_RDONLY|os.O_NONBLOCK)
+    except OSError:
+        pass
+
+    # Fall back to the shared fd. Only safe if we own the pipe.
+    new_fd = os.dup(fd)
+    os.set_blocking(new_fd, False)
+    return new_fd
+
+def create(jobs, style="fifo"):
+    # create a new jobserver holding jobs-1 tokens
+    assert jobs > 1, jobs
+
+    if style == "fifo":
+        path = os.path.join(tempfile.mkdtemp(prefix="pymake"), "fifo")
+        os.mkfifo(path, 0o600)
+        # O_RDWR so opening won't block waiting for a writer
+        fd = os.open(path, os.O_RDWR)
+        server = Jobserver("fifo:" + path, fd, fd, fifo_path=path)
+    elif style == "pipe":
+        read_fd, write_fd = os.pipe()
+        server = Jobserver("%d,%d" % (read_fd, write_fd), read_fd, write_fd)
+        server.fds = (read_fd, write_fd)
+    else:
+        raise ValueError("unknown jobserver style \"%s\"" % style)
+
+    os.write(server.write_fd, b"+" * (jobs-1))
+    return server
+
+def _parse_makeflags(makeflags):
+    # Find the -j and jobserver auth in a MAKEFLAGS string
+    # e.g., MAKEFLAGS="ks -j4 --jobserver-auth=fifo:/tmp/GMfifo1234"
+    # Returns (jobs, auth). Either can be None.
+    jobs = None
+    auth = None
+    words = makeflags.split()
+    for w in words:
+        if w.startswith("--jobserver-auth="):
+            auth = w[len("--jobserver-auth="):]
+        elif w.startswith("--jobserver-fds="):
+            auth = w[len("--jobserver-fds="):]
+        elif w.startswith("-j") and w[2:].isdigit():
+            jobs = int(w[2:])
+    return jobs, auth
+
+def from_makeflags(makeflags):
+    # Connect to the jobserver advertised in MAKEFLAGS.
+    # Returns (Jobserver, jobs) or (None, jobs) if no (usable) jobserver.
+    jobs, auth = _parse_makeflags(makeflags)
+    if not auth:
+        return None, jobs
+
+    if auth.startswith("fifo:"):
+        path = auth[len("fifo:"):]
+        try:
+            fd = os.open(path, os.O_RDWR)
+        except OSError as err:
+            warning_message(None, "cannot open jobserver %s: %s" % (path, err.strerror))
+            return None, 1
+        return Jobserver(auth, fd, fd), jobs
+
+    try:
+        read_fd, write_fd = [int(s) for s in auth.split(",")]
+    except ValueError:
+        warning_message(None, "invalid --jobserver-auth string '%s'" % auth)
+        return None, 1
+
+    # The parent make only passes the pipe to children it thinks are a make
+    # ($(MAKE) or a '+' recipe).
+    try:
+        for fd in (read_fd, write_fd):
+            if not stat.S_ISFIFO(os.fstat(fd).st_mode):
+                raise OSError
+    except OSError:
+        warning_message(None, "jobserver unavailable: using -j1.  Add '+' to parent make rule.")
+        return None, 1
+
+    server = Jobserver(auth, read_fd, write_fd)
+    server.fds = (read_fd, write_fd)
+    return server, jobs
+
+def get_jobserver():
+    return _jobserver
+
+def _stop():
+    global _jobserver
+    if _jobserver is not None:
+        _jobserver.close()
+        _jobserver = None
+
+def start(args, makeflags):
+    # Set up the jobserver (if any) for a run of a makefile. Returns the
+    # number of jobs allowed to run at the same time.
+    global _jobserver
+
+    if _jobserver is not None:
+        # An in-process sub-make. Share the parent's jobserver (GNU Make
+        # passes the jobserver to the sub-make through MAKEFLAGS)
+        return max(args.jobs, _jobserver.jobs)
+
+    if args.jobs > 1:
+        # -j N on our command line: we're the jobserver
+        if makeflags and _parse_makeflags(makeflags)[1]:
+            warning_message(None, "-j%d forced in makefile: resetting jobserver mode." % args.jobs)
+        _jobserver = create(args.jobs, args.jobserver_style)
+        _jobserver.jobs = args.jobs
+        atexit.register(_stop)
+        return args.jobs
+
+    if makeflags:
+        # maybe we're running beneath another make
+        server, jobs = from_makeflags(makeflags)
+        if server is not None:
+            _jobserver = server
+            # no -j in MAKEFLAGS means no limit other than the tokens
+            _jobserver.jobs = jobs or os.cpu_count() or 1
+            atexit.register(_stop)
+            return _jobserver.jobs
+
+    return args.jobs
+
+def makeflags(makeflags):
+    # Build the MAKEFLAGS for children, replacing any jobserver flags we
+    # inherited with our own.
+    words = [w for w in makeflags.split() if not
+                (w.startswith("--jobserver-") or (w.startswith("-j") and w[2:].isdigit()))]
+    if _jobserver is not None:
+        words.append("-j%d" % _jobserver.jobs)
+        words.append("--jobserver-auth=%s" % _jobserver.auth)
+    return " ".join(words)
@@ -30,6 +30,14 @@ Options:
     -h
     --help
                 Print this help message and exit.
+    -j N
+    --jobs=N
+                Run up to N recipes at the same time.
+    --jobserver-style=STYLE
+                Jobserver to create with -j N: fifo (default) or pipe.
+    -k
+    --keep-going
+                Keep going when some targets can't be made.
     -n
     --just-print, --dry-run, --recon
                 Don't run any recipes, just print them.
@@ -50,17 +58,37 @@ Options not in GNU Make:
                 Write the Rules' dependency graph as a GraphViz dot file. (Work in progress.)
     --html FILE  
                 Write the Rules' dependency graph as an HTML file. (Work in progress.)
+    --no-bulk-scan
+                Look at every character of the makefile one at a time when
+                tokenizing. (Useful for debugging.)
+    --no-inproc-commands
+                Always start a shell for a recipe line. (By default, simple
+                echo, true, false, mkdir -p, touch, rm -f commands are run
+                without a shell.)
+    --no-wildcard-cache
+                Read the directories every time $(wildcard) is used instead
+                of caching directory listings. (Useful for debugging.)
     --output FILE
                 Rewrite the parsed makefile to FILE. Do not execute.
+    --parse-cache DIR
+                Cache parsed makefiles in DIR. Unchanged makefiles are loaded
+                from the cache instead of being parsed again.
     --print-rule 
                 Print the rule and recipes for the target. Do not execute.
+    --shell-cache
+                Run each $(shell) command once. Later uses with the same command,
+                environment, and directory reuse the first result.
+                $(shell) inside the variables listed in .SHELL_NOCACHE always runs.
+    --shell-coprocess
+                Run recipes with long-lived /bin/sh processes instead of
+                starting a new shell for every line.
     -S          Print the makefile as an S-Expression. (Useful for debugging pymake itself.) Do not execute.
 """)
 
 class Args:
     # names from logging.getLogger("pymake.NAME")
     valid_debug_flags = ( "functions", "parser", "rules", "scanner", "shell", 
-        "symbol", "symtable", "tokenize", "vline", "pymake")
+        "globcache", "statcache", "symbol", "symtable", "tokenize", "vline", "pymake")
 
     def __init__(self):
         # -d 
@@ -106,12 +134,41 @@ class Args:
         # -n
         self.dry_run = False
 
+        # -j
+        # number of recipes to run at the same time
+        self.jobs = 1
+
+        # --jobserver-style
+        self.jobserver_style = "fifo"
+
+        # -k
+        self.keep_going = False
+
         # -s
         self.silent = False
 
         # --print-rule
         self.print_rule = False
 
+        # --parse-cache
+        # directory to store parsed makefiles
+        self.parse_cache = None
+
+        # --shell-cache
+        self.shell_cache = False
+
+        # --shell-coprocess
+        self.shell_coprocess = False
+
+        # --no-wildcard-cache
+        self.wildcard_cache = True
+
+        # --no-inproc-commands
+        self.inproc_commands = True
+
+        # --no-bulk-scan
+        self.bulk_scan = True
+
         self.warn_undefined_variables = False
         self.detailed_error_explain = False
 
@@ -122,6 +179,8 @@ class Args:
             "-C %s" % self.directory if self.directory else "",
             "-d" if self.debug else "",
             "-f %s" % self.filename if self.filename else "",
+            "-j %d" % self.jobs if self.jobs > 1 else "",
+            "-k" if self.keep_going else "",
             "-n" if self.dry_run else "",
             "-s" if self.silent else "",
             *self.argslist
@@ -137,12 +196,26 @@ def _parse_debug_flags(s):
 
     return flags
 
+def _parse_jobs(s):
+    try:
+        jobs = int(s)
+    except ValueError:
+        jobs = 0
+    if jobs < 1:
+        raise ValueError("the '-j' option requires a positive integer argument")
+    return jobs
+
+def _parse_jobserver_style(s):
+    if s not in ("fifo", "pipe"):
+        raise ValueError("unknown jobserver auth style '%s'" % s)
+    return s
+
 def parse_args(argv):
     print_version ="""PY Make %s. Work in Progress.
 Copyright (C) 2014-2024 David Poole david.poole@ericsson.com, davep@mbuf.com, testcluster@gmail.com""" % (Version.vstring(),)
 
     args = Args()
-    optlist, arglist = getopt.gnu_getopt(argv, "Bhvo:drSf:C:ns", 
+    optlist, arglist = getopt.gnu_getopt(argv, "Bhvo:drSf:C:j:kns", 
                             [
                             "help",
                             "always-make",
@@ -152,10 +225,19 @@ Copyright (C) 2014-2024 David Poole david.poole@ericsson.com, davep@mbuf.com, te
                             "explain",
                             "file=", "makefile=", 
                             "html=",
+                            "jobs=",
+                            "jobserver-style=",
+                            "keep-going",
                             "just-print", "dry-run", "recon",
                             "no-builtin-rules",
+                            "no-bulk-scan",
+                            "no-inproc-commands",
+                            "no-wildcard-cache",
                             "output=", 
+                            "parse-cache=",
                             "print-rule",
+                            "shell-cache",
+                            "shell-coprocess",
                             "silent", "quiet"
                             "version", 
                             "warn-undefined-variables", 
@@ -197,10 +279,28 @@ Copyright (C) 2014-2024 David Poole david.poole@ericsson.com, davep@mbuf.com, te
             args.dry_run = True
         elif opt[0] in ('-s', '--silent', '--quiet'):
             args.silent = True
+        elif opt[0] in ('-j', '--jobs'):
+            args.jobs = _parse_jobs(opt[1])
+        elif opt[0] == '--jobserver-style':
+            args.jobserver_style = _parse_jobserver_style(opt[1])
+        elif opt[0] in ('-k', '--keep-going'):
+            args.keep_going = True
         elif opt[0] == '--debug':
             args.debug_flags = _parse_debug_flags(opt[1])
         elif opt[0] == '--print-rule':
             args.print_rule = True
+        elif opt[0] == '--parse-cache':
+            args.parse_cache = opt[1]
+        elif opt[0] == '--shell-cache':
+            args.shell_cache = True
+        elif opt[0] == '--shell-coprocess':
+            args.shell_coprocess = True
+        elif opt[0] == '--no-wildcard-cache':
+            args.wildcard_cache = False
+        elif opt[0] == '--no-inproc-commands':
+            args.inproc_commands = False
+        elif opt[0] == '--no-bulk-scan':
+            args.bulk_scan = False
         else:
             # wtf?
             assert 0, opt
@@ -0,0 +1,133 @@
+# SPDX-License-Identifier: GPL-2.0
+# Copyright (C) 2014-2024 David Poole davep@mbuf.com david.poole@ericsson.com
+
+# Persistent on-disk cache of parsed makefiles.
+#
+# Turning a makefile into a statement list (vline, tokenize, parse) is the
+# slowest part of reading a large tree and the results are identical on every
+# run as long as the source doesn't change. With --parse-cache DIR, the
+# statement list parsed from each source file is pickled into DIR. The cache
+# key is a hash of the file's name and contents plus the version of pymake so
+# a changed file (or a new pymake) is simply a cache miss.
+#
+# The cache is strictly an optimization. Any problem reading or writing the
+# cache is logged and the file is parsed the usual way.
+#
+# Warnings found by the parser are saved with the statement list and repeated
+# when the file is loaded from the cache.
+
+import os
+import os.path
+import hashlib
+import pickle
+import tempfile
+import logging
+
+logger = logging.getLogger("pymake.parsecache")
+
+from pymake.version import Version
+import pymake.source as source
+import pymake.error as error
+
+__all__ = [ "set_cache_dir", "get_cache_dir", "load", "start", "save" ]
+
+# Bump this whenever the Symbol class hierarchy (or anything else that ends up
+# in the pickle) changes so old cache entries are ignored.
+CACHE_FORMAT = 5
+
+# where to store the cache files; None means the cache is disabled
+_cache_dir = None
+
+def set_cache_dir(dirname):
+    global _cache_dir
+
+    if dirname is None:
+        _cache_dir = None
+        return
+
+    # sub-makes run in this same process and can change directory (-C) so
+    # always remember the absolute path
+    _cache_dir = os.path.abspath(dirname)
+    os.makedirs(_cache_dir, exist_ok=True)
+    logger.debug("parse cache dir=%s", _cache_dir)
+
+def get_cache_dir():
+    return _cache_dir
+
+def _cacheable(src):
+    # only cache real files; $(eval) strings and such are not worth it
+    return _cache_dir is not None and isinstance(src, source.SourceFile) and src.name
+
+def cache_key(src):
+    # the filename is part of the key because every parsed symbol carries its
+    # filename (for error messages)
+    h = hashlib.sha256()
+    h.update(("pymake-%s-%d\n" % (Version.vstring(), CACHE_FORMAT)).encode("utf8"))
+    h.update(src.name.encode("utf8"))
+    h.update(b"\0")
+    for line in src.file_lines:
+        h.update(line.encode("utf8", "surrogateescape"))
+    return h.hexdigest()
+
+def _cache_filename(src):
+    return os.path.join(_cache_dir, cache_key(src) + ".pickle")
+
+def load(src):
+    # Return the cached statement list for this (already loaded) source or
+    # None if not in the cache.
+    if not _cacheable(src):
+        return None
+
+    cache_filename = _cache_filename(src)
+    try:
+        with open(cache_filename, "rb") as infile:
+            statement_list, warnings = pickle.load(infile)
+    except FileNotFoundError:
+        logger.debug("parse cache miss filename=%s", src.name)
+        return None
+    except Exception as err:
+        # corrupt or stale cache file; ignore it and let it be rewritten
+        logger.warning("ignoring unreadable parse cache file %s: %s", cache_filename, err)
+        return None
+
+    logger.debug("parse cache hit filename=%s", src.name)
+    for pos, msg in warnings:
+        error.warning_message(pos, msg)
+    return statement_list
+
+def start(src):
+    # Called before parsing a source that missed the cache.
+    if _cacheable(src):
+        error.start_warning_log()
+
+def stop(src):
+    # Called after parsing a source (even if the parse failed). Returns the
+    # warnings found while parsing.
+    if _cacheable(src):
+        return error.stop_warning_log()
+    return None
+
+def save(src, statement_list, warnings):
+    if not _cacheable(src):
+        return
+
+    cache_filename = _cache_filename(src)
+
+    try:
+        data = pickle.dumps((statement_list, warnings), protocol=pickle.HIGHEST_PROTOCOL)
+    except (pickle.PicklingError, TypeError, RecursionError) as err:
+        logger.warning("cannot cache parse of %s: %s", src.name, err)
+        return
+
+    # write to a temp file then rename so a concurrent pymake never sees a
+    # partial cache file
+    try:
+        fd, tmpname = tempfile.mkstemp(dir=_cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as outfile:
+            outfile.write(data)
+        os.replace(tmpname, cache_filename)
+    except OSError as err:
+        logger.warning("cannot write parse cache file %s: %s", cache_filename, err)
+        return
+
+    logger.debug("parse cache save filename=%s", src.name)
@@ -775,3 +775,9 @@ def parse_rule(vchar_scanner):
     # don't look for recipe(s) yet
     return RuleExpression(statement) 
 
+
+# FIXME ugly hack dependency injection to solve problems with circular imports
+# (nested conditional directives are parsed when they're eval'd)
+import pymake.symbol as symbol
+symbol.read_expression = read_expression
+symbol.parse_ifeq_conditionals = parse_ifeq_conditionals
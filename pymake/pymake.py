@@ -25,6 +25,7 @@ from pymake.error import *
 import pymake.tokenizer as tokenizer
 import pymake.parser as parser
 import pymake.source as source
+import pymake.parsecache as parsecache
 from pymake.symtable import SymbolTable
 import pymake.makedb as makedb
 import pymake.rules as rules
@@ -34,6 +35,12 @@ import pymake.submake as submake
 from pymake.debug import *
 import pymake.constants as constants
 import pymake.functions as functions
+import pymake.trace as trace
+import pymake.jobs as jobs
+import pymake.jobserver as jobserver
+import pymake.coshell as coshell
+import pymake.globcache as globcache
+import pymake.inproc as inproc
 
 _debug = False
 
@@ -237,20 +244,30 @@ def parse_makefile_from_src(src):
     # trigger getting an array of python strings from the source
     src.load()
 
-    # ScannerIterator across the file_lines array (to support pushback of an
-    # entire line). 
-    line_scanner = ScannerIterator(src.file_lines, src.name)
+    # --parse-cache
+    statement_list = parsecache.load(src)
+    if statement_list is not None:
+        return Makefile(statement_list)
+    parsecache.start(src)
+    try:
+        # ScannerIterator across the file_lines array (to support pushback of an
+        # entire line). 
+        line_scanner = ScannerIterator(src.file_lines, src.name)
 
-    # get_vline() returns a Python <generator> that walks across makefile
-    # lines, joining backslashed lines into VirtualLine instances.
-    vline_iter = vline.get_vline(src.name, line_scanner)
+        # get_vline() returns a Python <generator> that walks across makefile
+        # lines, joining backslashed lines into VirtualLine instances.
+        vline_iter = vline.get_vline(src.name, line_scanner)
 
-    statement_list = [v for v in parse_vline(vline_iter)] 
+        statement_list = [v for v in parse_vline(vline_iter)] 
+    finally:
+        warnings = parsecache.stop(src)
 
     # good time for some sanity checks
     for t in statement_list:
         assert t and isinstance(t,Symbol), t
 
+    parsecache.save(src, statement_list, warnings)
+
     return Makefile(statement_list)
 
 def parse_makefile(infilename) : 
@@ -373,9 +390,14 @@ def execute_statement_list(stmt_list, curr_rules, rulesdb, symtable):
                 # the Rule and eval'd when the Rule is used.
                 assert not prereq_list
 
+            # The Recipes that follow are added to this RecipeList. Don't add
+            # them to the RuleExpression's own list; the same statements can
+            # be executed again (see LineBlock.eval())
+            recipe_list = RecipeList(list(rule_expr.recipe_list))
+
             if target_list:
                 for t in target_list:
-                    rule = rulesdb.add(t, prereq_list, rule_expr.recipe_list, 
+                    rule = rulesdb.add(t, prereq_list, recipe_list, 
                             rule_expr.assignment, rule_expr.get_pos())
                     curr_rules.append(rule)
                     # we're in a big confusing loop so get rid of a name I re-use
@@ -387,7 +409,7 @@ def execute_statement_list(stmt_list, curr_rules, rulesdb, symtable):
                 # We need to have a Rule in curr_rules to correctly parse
                 # ambiguous statements with have a leading Recipe Prefix 
                 # (aka <tab>)
-                rule = rules.Rule(None, prereq_list, rule_expr.recipe_list, rule_expr.assignment, rule_expr.get_pos())
+                rule = rules.Rule(None, prereq_list, recipe_list, rule_expr.assignment, rule_expr.get_pos())
                 # don't add this Rule to the DB but do let the world know we are in a Rule
                 curr_rules.append(rule)
 
@@ -443,139 +465,155 @@ def execute_statement_list(stmt_list, curr_rules, rulesdb, symtable):
     # bottom of loop
     return exit_code
 
-def execute_recipe(rule, recipe, symtable, args):
-    def remove_duplicates(s_list):
-        # the $^ variable removes duplicates but must must must preserve order
-        seen_list = []
-        for s in s_list:
-            if s not in seen_list:
-                seen_list.append(s)
-        return seen_list
-
-    def resolve_backslashes(s):
-        str_list = cmd_s.split("\n")
-        cmd_list = []
-
-        for s in str_list:
-            cmd_list.append(s)
-            if s.endswith(backslash):
-                continue
-
-            yield "\n".join(cmd_list)
-            cmd_list.clear()
-
-    def check_prefixes(s):
-        # "To ignore errors in a recipe line, write a ‘-’ at the beginning of the line’s text (after the
-        # initial tab). The ‘-’ is discarded before the line is passed to the shell for execution"
-        # GNU Make 4.2 Jan 2020
-        ignore_failure = False
-
-        # "When a line starts with ‘@’, the echoing of that line is suppressed. The ‘@’ is discarded
-        # before the line is passed to the shell."
-        # GNU Make 4.3 Jan 2020
-        silent = False
-
-        # GNU make will eat any/all leading - + @ and whitespace
-        # src/job.c start_job_command()
-        while 1:
-            if s[0] == '@':
-                # silent command
-                s = s[1:]
-                silent = True
-
-            elif s[0] == '-':
-                # ignore failure
-                s = s[1:]
-                ignore_failure = True
-
-            elif s[0] in whitespace:
-                s = s[1:]
-
-            elif s[0] == '+':
-                raise NotImplementedError()
+def _remove_duplicates(s_list):
+    # the $^ variable removes duplicates but must must must preserve order
+    seen_list = []
+    for s in s_list:
+        if s not in seen_list:
+            seen_list.append(s)
+    return seen_list
+
+def _resolve_backslashes(cmd_s):
+    str_list = cmd_s.split("\n")
+    cmd_list = []
+
+    for s in str_list:
+        cmd_list.append(s)
+        if s.endswith(backslash):
+            continue
 
-            else:
-                break
+        yield "\n".join(cmd_list)
+        cmd_list.clear()
+
+def _check_prefixes(s):
+    # "To ignore errors in a recipe line, write a ‘-’ at the beginning of the line’s text (after the
+    # initial tab). The ‘-’ is discarded before the line is passed to the shell for execution"
+    # GNU Make 4.2 Jan 2020
+    ignore_failure = False
+
+    # "When a line starts with ‘@’, the echoing of that line is suppressed. The ‘@’ is discarded
+    # before the line is passed to the shell."
+    # GNU Make 4.3 Jan 2020
+    silent = False
+
+    # "A ‘+’ [...] causes the recipe line to be executed even when make is run
+    # with -n" and marks it as a recursive make (only recursive commands are
+    # given a pipe style jobserver; see shell.run())
+    force = False
+
+    # GNU make will eat any/all leading - + @ and whitespace
+    # src/job.c start_job_command()
+    while 1:
+        if s[0] == '@':
+            # silent command
+            s = s[1:]
+            silent = True
+
+        elif s[0] == '-':
+            # ignore failure
+            s = s[1:]
+            ignore_failure = True
+
+        elif s[0] in whitespace:
+            s = s[1:]
+
+        elif s[0] == '+':
+            # run even with -n; recursive make
+            s = s[1:]
+            force = True
 
-        return s, ignore_failure, silent
+        else:
+            break
+
+    return s, ignore_failure, silent, force
 
+def _add_automatics(rule, recipe, symtable):
     # TODO many more automatic variables
-    symtable.push_layer()
     symtable.add_automatic("@", rule.target, recipe.get_pos())
-    symtable.add_automatic("^", " ".join(remove_duplicates(rule.prereq_list)), rule.get_pos())
+    symtable.add_automatic("^", " ".join(_remove_duplicates(rule.prereq_list)), rule.get_pos())
     symtable.add_automatic("+", " ".join(rule.prereq_list), rule.get_pos())
     symtable.add_automatic("<", rule.prereq_list[0] if len(rule.prereq_list) else "", rule.get_pos())
+    if rule.stem is not None:
+        symtable.add_automatic("*", rule.stem, rule.get_pos())
+
+def make_job(rule, symtable):
+    # Expand all of a Rule's recipes into a Job for jobs.build() or
+    # _run_rules(). Like GNU Make, every line is expanded before the first one
+    # runs. (target specific variables are handled here, too)
+    assignment_list = symtable.rulesdb.get_assignments(rule)
+    if assignment_list:
+        symtable.push_rule_layer()
+        for asn in assignment_list:
+            asn.eval(symtable)
+
+    command_list = []
+    for recipe in rule.recipe_list:
+        symtable.push_layer()
+        _add_automatics(rule, recipe, symtable)
+
+        cmd_s = recipe.eval(symtable)
+
+        # Defining Multi-Line Variables.
+        # "However, note that using two separate lines means make will invoke the shell twice, running
+        # an independent sub-shell for each line. See Section 5.3 [Recipe Execution], page 46."
+        # GNU Make 4.2 2020 
+        #
+        # The recipe.eval() returns a single string.  However, multi-line variables
+        # are treated as multiple lines given to the shell individually.
+        # DefineBlock.eval() will eval its individual lines then return a \n joined
+        # string.
+        #
+        # But can't just blindly split on \n because the recipe could actually be a
+        # shell line with continuations.  
+        for s in _resolve_backslashes(cmd_s):
+            s, ignore_failure, silent, force = _check_prefixes(s)
+            argv, env = shell.build_command(s, symtable)
+            command_list.append(jobs.Command(s, argv, env, ignore_failure, silent, force, recipe.get_pos()))
 
-    cmd_s = recipe.eval(symtable)
-#    print("execute_recipe \"%r\"" % cmd_s)
-
-    # Defining Multi-Line Variables.
-    # "However, note that using two separate lines means make will invoke the shell twice, running
-    # an independent sub-shell for each line. See Section 5.3 [Recipe Execution], page 46."
-    # GNU Make 4.2 2020 
-    #
-    # The recipe.eval() returns a single string.  However, multi-line variables
-    # are treated as multiple lines given to the shell individually.
-    # DefineBlock.eval() will eval its individual lines then return a \n joined
-    # string.
-    #
-    # But can't just blindly split on \n because the recipe could actually be a
-    # shell line with continuations.  
-    #
-    cmd_list = resolve_backslashes(cmd_s)
-
-    exit_code = 0
-
-    for s in cmd_list:
-#        print("shell execute \"%s\"" % s)
-
-        s, ignore_failure, silent = check_prefixes(s)
-
-        if not silent and not args.silent:
-            print(s,flush=True)
+        symtable.pop_layer()
 
-        if args.dry_run:
-            print(s, flush=True)
-            continue
+    if assignment_list:
+        symtable.pop_rule_layer()
 
-        exit_code = 0
-        ret = shell.execute(s, symtable, capture=False)
+    return jobs.Job(rule, command_list)
 
-        # 
-        # !!! Run a Sub-Make !!!
-        #
-        # The shell.execute() determined that we ran the sub-make helper. The
-        # return value of the submake is the args as interpretted by the
-        # shell (whichever shell). We now take those args tokenzparse+run that
-        # makefile in our same process context.
-        if ret.is_submake:
-            # the submake is very simple and should not fail
-            if ret.exit_code != 0:
-                raise InternalError(msg="running submake failed",
-                        moremsg=ret.stderr,                        
-                        pos=recipe.get_pos() ) 
-
-            submake_argv = ret.stdout.strip().split("\n")
-            args = pargs.parse_args(submake_argv[1:])
-
-            currwd = os.getcwd()
-            exit_code = _run_it(args)
-            os.chdir(currwd)
-            # clean up the output from the submake helper
-            ret.stdout = ""
-
-        exit_code = ret.exit_code
-        if exit_code != 0:
-            print("make: *** [%r: %s] Error %d %s" % (recipe.get_pos(), rule.target, 
-                exit_code, "(ignored)" if ignore_failure else ""), file=sys.stderr)
+def run_submake(ret):
+    # !!! Run a Sub-Make !!!
+    #
+    # Job.run() determined that we ran the sub-make helper. The return value
+    # of the submake is the args as interpretted by the shell (whichever
+    # shell). We now take those args tokenzparse+run that makefile in our
+    # same process context.
+    submake_argv = ret.stdout.strip().split("\n")
+    args = pargs.parse_args(submake_argv[1:])
+
+    currwd = os.getcwd()
+    exit_code = _run_it(args)
+    os.chdir(currwd)
+    return exit_code
 
-            if not ignore_failure:
+def _run_rules(rule_iter, symtable, args):
+    # Run the recipes of each Rule from RuleDB.walk_tree(), one at a time in
+    # this thread. (-j N uses jobs.build() instead.)
+    exit_code = 0
+    for rule in rule_iter:
+#        if not rule.recipe_list:
+#            # this warning catches where I fail to find an implicit rule
+#            logger.warning("I didn't find a recipe to build target=\"%s\"", target)
+
+        job = make_job(rule, symtable)
+        while True:
+            exit_code = job.run(args.silent, args.dry_run)
+            if job.submake is None or exit_code != 0:
+                break
+            # the rest of the Job runs after the sub-make
+            exit_code = job.submake_done(run_submake(job.submake))
+            if exit_code != 0:
                 break
-            exit_code = 0
+        if exit_code != 0:
+            break
 
-    symtable.pop_layer()
-        
-    return exit_status["error"] if exit_code else exit_status["success"] 
+    return exit_status["error"] if exit_code else exit_status["success"]
 
 def execute(makefile, args):
     # ha ha type checking
@@ -685,6 +723,24 @@ def execute(makefile, args):
     #
     logger.info("Starting run of %s", makefile.get_pos()[0])
 
+    # -j N creates a jobserver. Without -j, we might be running beneath
+    # another make's jobserver (GNU Make or pymake).
+    num_jobs = jobserver.start(args, os.environ.get("MAKEFLAGS", ""))
+    if jobserver.get_jobserver() is not None:
+        # tell sub-makes about the jobserver
+        symtable.update_builtin("MAKEFLAGS", jobserver.makeflags(os.environ.get("MAKEFLAGS", "")))
+        symtable.export("MAKEFLAGS")
+
+    if (num_jobs > 1 or args.keep_going) and not args.dry_run:
+        # -j N or -k
+        # Run the rules with the scheduler in jobs.py
+        return jobs.build(target_list, rulesdb, num_jobs, args.keep_going, args.silent,
+                    lambda rule: make_job(rule, symtable), run_submake,
+                    jobserver.get_jobserver())
+
+    # build each target once even if needed by several goals
+    visited = {}
+
     for target in target_list:
         exit_code = 0
 
@@ -705,30 +761,47 @@ def execute(makefile, args):
             print("prereqs=",rule.prereq_list)
 
         # walk a dependency tree
-        for rule in rulesdb.walk_tree(target):
-#            if not rule.recipe_list:
-#                # this warning catches where I fail to find an implicit rule
-#                logger.warning("I didn't find a recipe to build target=\"%s\"", target)
-
-            # target specific variables
-            if rule.assignment_list:
-                symtable.push_layer()
-                for asn in rule.assignment_list:
-                    asn.eval(symtable)
-
-            for recipe in rule.recipe_list:
-                exit_code = execute_recipe(rule, recipe, symtable, args)
-                if exit_code != 0:
-                    break
-            if rule.assignment_list:
-                symtable.pop_layer()
-            if exit_code != 0:
-                break
+        try:
+            exit_code = _run_rules(rulesdb.walk_tree(target, visited), symtable, args)
+        except NoRuleToMakeTarget as err:
+            error_message(None, err.msg)
+            exit_code = exit_status["error"]
+        if exit_code != 0:
+            break
 
     return exit_status["error"] if exit_code else exit_status["success"] 
-    
+
 def _run_it(args):
     logger.debug("run_it args=\"%s\"", args)
+    # --parse-cache
+    # (before -C so a relative cache dir is relative to where we started)
+    if args.parse_cache:
+        parsecache.set_cache_dir(args.parse_cache)
+
+    # --shell-coprocess
+    # (sub-makes inherit the setting)
+    if args.shell_coprocess:
+        coshell.enable()
+
+    # --shell-cache
+    if args.shell_cache:
+        shell.enable_memo()
+
+    # --no-wildcard-cache
+    # (sub-makes inherit the setting)
+    if not args.wildcard_cache:
+        globcache.enable(False)
+
+    # --no-inproc-commands
+    # (sub-makes inherit the setting)
+    if not args.inproc_commands:
+        inproc.enable(False)
+
+    # --no-bulk-scan
+    # (sub-makes inherit the setting)
+    if not args.bulk_scan:
+        tokenizer.enable_bulk_scan(False)
+
     # -C option
     if args.directory:
         os.chdir(os.path.join(*args.directory))
@@ -766,6 +839,7 @@ def _run_it(args):
 parser.parse_vline = parse_vline 
 symbol.parse_vline = parse_vline 
 symbol.tokenize_line = tokenizer.tokenize_line
+symbol.parse_makefile_from_src = parse_makefile_from_src
 functions.parse_makefile_from_src = parse_makefile_from_src
 functions.execute_statement_list = execute_statement_list
 
@@ -778,16 +852,18 @@ def main():
         logging.basicConfig(level=logging.INFO)
 
     for f in args.debug_flags:
-        log_s = "pymake." + f
-        logr = logging.getLogger(log_s)
-        if logr:
-            logr.setLevel(level=logging.DEBUG)
+        trace.enable(f)
 
 #    if len(sys.argv) < 2 : 
 #        usage()
 #        sys.exit(1)
 
-    sys.exit(_run_it(args))
+    exit_code = _run_it(args)
+    logger.debug("commands run without a shell (forks avoided): %d", inproc.forks_avoided())
+    if args.shell_cache:
+        logger.debug("$(shell) cache hits=%d misses=%d", *shell.memo_stats())
+    logger.debug("$(eval) parse cache hits=%d misses=%d", *functions.eval_cache_stats())
+    sys.exit(exit_code)
 
 if __name__=='__main__':
     main()
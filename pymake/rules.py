@@ -10,6 +10,8 @@ logger = logging.getLogger("pymake.rules")
 from pymake.error import *
 from pymake.html import save_rules
 import pymake.constants as constants
+from pymake.statcache import StatCache
+import pymake.wildcard as wildcard
 
 _debug = True
 
@@ -48,6 +50,9 @@ class Rule:
         # Symbol.
         self.pos = pos
 
+        # the stem ($*) when the Rule comes from a pattern rule
+        self.stem = None
+
     def __str__(self):
         target = "" if self.target is None else self.target
         return "%s : %s" % (target, " ".join(self.prereq_list))
@@ -87,6 +92,100 @@ class Rule:
 
             outfile.write("}\n")
 
+class _PatternRuleIndex:
+    # Find the pattern rules whose target could match a file without trying
+    # every pattern rule on every file (same idea as wildcard.PatternIndex).
+    #
+    # The rules are grouped by the length of their target's suffix then by the
+    # suffix itself so "foo/bar.o" only looks at the rules for "%.o" (or
+    # "%r.o", etc). Targets with no suffix (e.g., "lib%") are grouped by
+    # prefix the same way. A "%" target matches anything.
+    #
+    # "If the target pattern does not contain a slash (and it usually does
+    # not), directory names in the file names are removed from the file name
+    # before it is compared with the target prefix and suffix. After the
+    # comparison of the file name to the target pattern, the directory names,
+    # along with the slash that ends them, are added on to the prerequisite
+    # file names generated from the pattern rule's prerequisite patterns and
+    # the file name."
+    # -- GNU Make 4.3 section 10.5.4
+    def __init__(self, rule_list):
+        # key: length of suffix
+        # value: dict of suffix -> list of (order, Rule, Pattern)
+        self.by_suffix = {}
+        # targets with no suffix and a slash are compared with the whole file
+        # name; without a slash, with the file name minus the directory
+        # key: length of prefix
+        # value: dict of prefix -> list of (order, Rule, Pattern)
+        self.by_prefix = {}
+        self.by_file_prefix = {}
+        # "%"
+        self.anything = []
+
+        for order, rule in enumerate(rule_list):
+            p = wildcard.compile_pattern(rule.target)
+            entry = (order, rule, p)
+            if p.suffix:
+                d = self.by_suffix
+                key = p.suffix
+            elif p.prefix:
+                d = self.by_prefix if '/' in p.prefix else self.by_file_prefix
+                key = p.prefix
+            else:
+                self.anything.append(entry)
+                continue
+            d.setdefault(len(key), {}).setdefault(key, []).append(entry)
+
+        self.by_suffix = list(self.by_suffix.items())
+        self.by_prefix = list(self.by_prefix.items())
+        self.by_file_prefix = list(self.by_file_prefix.items())
+
+    def candidates(self, target):
+        # Returns a list of (Rule, stem, prereq_list) of the pattern rules
+        # matching the target, in the order to try them: shortest stem first
+        # then makefile order (GNU Make 4.3 section 10.5.4 "How Patterns
+        # Match").
+        idx = target.rfind('/') + 1
+        dirname, filename = target[:idx], target[idx:]
+        tlen = len(target)
+        flen = len(filename)
+
+        entries = list(self.anything)
+        for n, patterns in self.by_suffix:
+            if n <= tlen:
+                entries.extend(patterns.get(target[tlen-n:], ()))
+        for n, patterns in self.by_prefix:
+            if n <= tlen:
+                entries.extend(patterns.get(target[:n], ()))
+        for n, patterns in self.by_file_prefix:
+            if n <= flen:
+                entries.extend(patterns.get(filename[:n], ()))
+
+        found = []
+        for order, rule, p in entries:
+            if '/' in rule.target:
+                stem = p.stem(target)
+                d = ""
+            else:
+                stem = p.stem(filename)
+                d = dirname
+            if not stem:
+                # no match or an empty stem (which GNU Make won't use)
+                continue
+
+            prereq_list = []
+            for s in rule.prereq_list:
+                prereq = wildcard.compile_pattern(s)
+                if prereq.wild:
+                    prereq_list.append(d + prereq.prefix + stem + prereq.suffix)
+                else:
+                    prereq_list.append(prereq.text)
+
+            found.append((len(stem), order, rule, d + stem, prereq_list))
+
+        found.sort(key=lambda f: f[:2])
+        return [f[2:] for f in found]
+
 class RuleDB:
     def __init__(self):
         # key: target (python string)
@@ -96,6 +195,34 @@ class RuleDB:
         # first rule added becomes the default
         self.default = None
 
+        # file timestamps for the out-of-date checks (shared with jobs.py)
+        self.statcache = StatCache()
+
+        # Rules with a '%' in the target, in makefile order
+        self.pattern_rules = []
+
+        # pattern specific variables (%.o: CFLAGS+=-g) in makefile order
+        # list of (Pattern, AssignmentExpression)
+        self.pattern_assignments = []
+
+        # _PatternRuleIndex of the pattern rules; built by the first search
+        # (after the makefile has been read)
+        self._pattern_index = None
+
+        # key: target
+        # value: list of (Rule, stem, prereq_list) of the pattern rules
+        # matching the target. Most files (e.g., headers) match no pattern rule
+        # so the empty list (negative lookup) is cached, too.
+        self._pattern_lookup = {}
+
+        # key: target
+        # value: Rule made from a pattern rule for the target
+        self._implicit = {}
+
+        # (target, prereq) of the circular dependencies walk_tree() dropped.
+        # is_out_of_date() ignores them, too.
+        self._dropped = set()
+
     def add(self, target, prereq_list, recipe_list, assignment, pos):
 
         # ha ha type checking
@@ -104,9 +231,9 @@ class RuleDB:
         logger.debug("add rule target=%r at %r", target, pos)
 
         if not target:
-            # TODO
-            breakpoint()
-            assert rule.target
+            # rules without a target are never added (see
+            # execute_statement_list())
+            raise InternalError(msg="rule without a target", pos=pos)
 
         if target == ".PHONY":
             raise NotImplementedError(target)
@@ -115,6 +242,15 @@ class RuleDB:
 
         _rule_sanity(pos, prereq_list, assignment)
 
+        pattern = wildcard.compile_pattern(target)
+        if pattern.wild:
+            if assignment:
+                return self._add_pattern_assignment(pattern, target, recipe_list, assignment, pos)
+            return self._add_pattern_rule(target, prereq_list, recipe_list, pos)
+
+        # an implicit rule search depends on the explicit rules
+        self._implicit.clear()
+
         # do we currently have a rule already with this target?
         rule = self.rules.get(target,None)
         if not rule:
@@ -144,12 +280,122 @@ class RuleDB:
             self.default = rule.target
 
         return rule
-    
-        
+
+    def _add_pattern_rule(self, target, prereq_list, recipe_list, pos):
+        # A pattern rule is only used by the implicit rule search; it is never
+        # a target itself (and never the default target).
+        rule = Rule(target, prereq_list, recipe_list, None, pos)
+        self.pattern_rules.append(rule)
+
+        self._pattern_index = None
+        self._pattern_lookup.clear()
+        self._implicit.clear()
+        return rule
+
+    def _add_pattern_assignment(self, pattern, target, recipe_list, assignment, pos):
+        # "In addition to target-specific variable values, GNU make supports
+        # pattern-specific variable values. In this form, the variable is
+        # defined for any target that matches the pattern specified."
+        # -- GNU Make 4.3 section 6.12
+        self.pattern_assignments.append((pattern, assignment))
+
+        # (not in the DB; the caller only needs a Rule to track)
+        return Rule(target, [], recipe_list, assignment, pos)
+
+    def get_assignments(self, rule):
+        # The target and pattern specific variables of a Rule, in the order
+        # to eval them.
+        #
+        # "If a target matches more than one pattern, the matching
+        # pattern-specific variables with longer stems are interpreted first.
+        # This results in more specific variables taking precedence over the
+        # more generic ones"
+        # -- GNU Make 4.3 section 6.12
+        # The target specific variables come last.
+        if not self.pattern_assignments:
+            return rule.assignment_list
+
+        found = []
+        for order, (pattern, assignment) in enumerate(self.pattern_assignments):
+            stem = pattern.stem(rule.target)
+            if stem is not None:
+                found.append((-len(stem), order, assignment))
+        found.sort(key=lambda f: f[:2])
+        return [f[2] for f in found] + rule.assignment_list
+
+    def _build_pattern_index(self):
+        # "You can override a built-in implicit rule (or one you have defined
+        # yourself) by defining a new pattern rule with the same target and
+        # prerequisites, but a different recipe."
+        # "You can cancel a built-in implicit rule by defining a pattern rule
+        # with the same target and prerequisites, but no recipe."
+        # -- GNU Make 4.3 section 10.7
+        #
+        # Done here rather than in add() because more recipe lines can be
+        # added to a Rule after add().
+        rules = {}
+        for rule in self.pattern_rules:
+            key = (rule.target, tuple(rule.prereq_list))
+            rules.pop(key, None)
+            if len(rule.recipe_list):
+                rules[key] = rule
+        return _PatternRuleIndex(list(rules.values()))
+
+    def _find_pattern_rule(self, target, rule):
+        # Implicit rule search (GNU Make 4.3 section 10.8) without chaining: a
+        # pattern rule is used when every prereq exists or "ought to exist"
+        # (is a target or an explicit prereq of this target).
+        #
+        # rule is the target's explicit Rule (without a recipe) or None. Its
+        # prereqs are added after the pattern rule's prereqs.
+        try:
+            return self._implicit[target]
+        except KeyError:
+            pass
+
+        if self._pattern_index is None:
+            self._pattern_index = self._build_pattern_index()
+
+        try:
+            candidates = self._pattern_lookup[target]
+        except KeyError:
+            candidates = self._pattern_index.candidates(target)
+            self._pattern_lookup[target] = candidates
+
+        explicit = rule.prereq_list if rule else []
+
+        for pattern_rule, stem, prereq_list in candidates:
+            if all(p in self.rules or p in explicit or self.statcache.exists(p)
+                        for p in prereq_list):
+                logger.debug("target=\"%s\" uses pattern rule \"%s\" at %r",
+                        target, pattern_rule.target, pattern_rule.get_pos())
+                new_rule = Rule(target, prereq_list + explicit, pattern_rule.recipe_list,
+                            None, pattern_rule.get_pos())
+                new_rule.stem = stem
+                if rule:
+                    new_rule.assignment_list = list(rule.assignment_list)
+                self._implicit[target] = new_rule
+                return new_rule
+
+        # not cached; a recipe could still create a missing prereq
+        return None
+
+    def _find_rule(self, target):
+        # Returns the Rule to build the target or None.
+        rule = self.rules.get(target)
+        if not self.pattern_rules or (rule is not None and len(rule.recipe_list)):
+            return rule
+
+        # no recipe so look for an implicit rule
+        return self._find_pattern_rule(target, rule) or rule
+
     def get(self, target):
         # allow KeyError to propagate
         logger.debug("look up rule for target=\"%s\"", target)
-        return self.rules[target]
+        rule = self._find_rule(target)
+        if rule is None:
+            raise KeyError(target)
+        return rule
 
     def get_default_target(self):
         if not self.default:
@@ -157,22 +403,102 @@ class RuleDB:
 
         return self.default
 
-    def walk_tree(self, target):
+    def walk_tree(self, target, visited=None):
         # generator of rules to build a target, starting at ye bottom.
         # GNU Make handles prerequisites left to right. So basically in array
         # order.  TL;DR. Depth-Breadth first tree traversal.
-        # TODO: how do I want to handle parallel builds someday?
-        # TODO: loops in the digraph are possible?
-
-        logger.debug("find target=\"%s\"", target)
-        if os.path.exists(target):
-            logger.debug("target=\"%s\" exists", target)
+        #
+        # Only out of date rules are yielded, each rule at most once. The
+        # caller runs the rule's recipes before asking for the next rule.
+        #
+        # visited
+        #     share between calls to build each target once across several
+        #     goals (e.g., make foo bar)
+        #
+        # Iterative rather than recursive so a long chain of prerequisites
+        # can't hit Python's recursion limit.
+
+        # key: target already walked
+        # value: True if the target was remade
+        if visited is None:
+            visited = {}
+
+        # targets on the current path (for catching loops)
+        in_progress = set()
+
+        # each entry is [rule, index of next prereq, any prereq remade]
+        stack = []
+
+        def push(target, parent):
+            logger.debug("find target=\"%s\"", target)
+            rule = self._find_rule(target)
+            if rule is None:
+                if self.statcache.exists(target):
+                    logger.debug("target=\"%s\" exists", target)
+                    visited[target] = False
+                    return
+                if parent is None:
+                    msg = "No rule to make target '%s'" % target
+                else:
+                    msg = "No rule to make target '%s', needed by '%s'" % (target, parent)
+                raise NoRuleToMakeTarget(msg=msg)
+            in_progress.add(target)
+            stack.append([rule, 0, False])
+
+        if target in visited:
             return
+        push(target, None)
+
+        while stack:
+            frame = stack[-1]
+            rule = frame[0]
+
+            if frame[1] < len(rule.prereq_list):
+                p = rule.prereq_list[frame[1]]
+                frame[1] += 1
+                if p in visited:
+                    frame[2] = frame[2] or visited[p]
+                elif p in in_progress:
+                    warning_message(rule.get_pos(),
+                        "Circular %s <- %s dependency dropped." % (rule.target, p))
+                    self._dropped.add((rule.target, p))
+                else:
+                    push(p, rule.target)
+                continue
+
+            # all the prereqs are done
+            stack.pop()
+            in_progress.discard(rule.target)
+
+            remade = frame[2] or self.is_out_of_date(rule)
+            if remade:
+                yield rule
+                # recipes have (probably) changed the target
+                self.statcache.invalidate(rule.target)
+            else:
+                logger.debug("target=\"%s\" is up to date", rule.target)
+
+            visited[rule.target] = remade
+            if stack:
+                stack[-1][2] = stack[-1][2] or remade
+
+    def is_out_of_date(self, rule):
+        # "the target is out of date if it does not exist or if it is older
+        # than any of the prerequisites (by comparison of last-modification
+        # times)"
+        # -- GNU Make 4.3 section 2.3
+        target_mtime = self.statcache.mtime(rule.target)
+        if target_mtime is None:
+            return True
 
-        rule = self.get(target)
         for p in rule.prereq_list:
-            yield from self.walk_tree(p)
-        yield rule
+            if (rule.target, p) in self._dropped:
+                # circular; dropped by walk_tree()
+                continue
+            p_mtime = self.statcache.mtime(p)
+            if p_mtime is None or p_mtime > target_mtime:
+                return True
+        return False
 
     def __str__(self):
         return ",".join(self.rules.keys())
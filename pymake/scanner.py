@@ -20,6 +20,8 @@ class ScannerIterator(object):
         self.idx = 0
         self.max_idx = len(self.data)
         self.state_stack = []
+        # data as a single string (see text())
+        self._text = None
 
     def __iter__(self):
         return self
@@ -38,6 +40,34 @@ class ScannerIterator(object):
             return None
         return self.data[self.idx]
 
+    # Iterating a VCharString creates a VChar view for each char. The
+    # tokenizer only needs the plain char most of the time so these methods
+    # work on text() and the index instead. A VChar is only made when asked
+    # for (e.g., for a position in an error message).
+
+    def chars(self):
+        # Iterate the data as plain chars. Shares the position with the
+        # scanner so next(), pushback(), etc still work in the loop.
+        text = self.text()
+        while self.idx < self.max_idx:
+            self.idx += 1
+            yield text[self.idx-1]
+
+    def lookahead_char(self):
+        if self.idx >= self.max_idx:
+            return None
+        return self.text()[self.idx]
+
+    def vchar(self, back=1):
+        # The element 'back' before the current position; vchar() is the one
+        # just returned by next() (or chars()).
+        return self.data[self.idx-back]
+
+    def take(self, token, back=1):
+        # Add the element 'back' before the current position to token (a
+        # VCharString) without making a VChar.
+        token.append_from(self.data, self.idx-back)
+
     def pushback(self):
         if self.idx <= 0 :
             raise StopIteration
@@ -67,3 +97,17 @@ class ScannerIterator(object):
     def get_pos(self):
         return self.data[self.idx].get_pos()
 
+    def text(self):
+        # Return the data as one Python string so a caller can search the
+        # data in bulk (e.g., with a regex). self.idx is also an index into
+        # this string.
+        if self._text is None:
+            if isinstance(self.data, str):
+                self._text = self.data
+            elif hasattr(self.data, "chars"):
+                # VCharString
+                self._text = self.data.chars()
+            else:
+                self._text = "".join([str(c) for c in self.data])
+        return self._text
+
@@ -2,8 +2,7 @@
 # execute shell commands for the != and $(shell) functions
 #
 import logging
-#import os
-import os.path
+import os
 import errno
 import subprocess
 import time
@@ -11,9 +10,16 @@ import time
 from pymake.error import *
 import pymake.constants as constants
 import pymake.submake as submake
+import pymake.jobserver as jobserver
+import pymake.coshell as coshell
+import pymake.inproc as inproc
+import pymake.globcache as globcache
+import pymake.trace as trace
 
 logger = logging.getLogger("pymake.shell")
 
+_trace = trace.get_tracer("shell")
+
 _debug = False
 
 # TODO comment in GNU make src/main.c
@@ -30,18 +36,8 @@ class ShellReturn:
         self.is_submake = False
 
 
-def execute(cmd_str, symbol_table, use_default_shell=True, capture=True):
-    """execute a string with the shell, returning a bunch of useful info"""
-
-    # capture a timestamp so we can match shell debug messages
-    ts = time.monotonic()
-    logger.debug("execute \"%r\" ts=%f", cmd_str, ts)
-
-    return_status = ShellReturn()
-
-    if _debug:
-        with open("shell.log","a") as outfile:
-            outfile.write("%s\n" % cmd_str)
+def build_command(cmd_str, symbol_table, use_default_shell=True):
+    """build the argv and environment to run a string with the shell"""
 
     # "If this variable is not set in your makefile, the program /bin/sh is
     # used as the shell." -- 5.3.2 Choosing the Shell
@@ -115,6 +111,24 @@ def execute(cmd_str, symbol_table, use_default_shell=True, capture=True):
 #        outfile.write(" ".join(cmd))
 #        outfile.write("\n\n\n")
 
+    return cmd, env
+
+def run(cmd_str, cmd, env, capture=True, recursive=False):
+    """run a command from build_command(), returning a bunch of useful info"""
+
+    # The symbol table and the directory cache are not used here so this
+    # function is safe to call from a worker thread (see jobs.py)
+
+    # capture a timestamp so we can match shell debug messages
+    ts = time.monotonic()
+    logger.debug("execute \"%r\" ts=%f", cmd_str, ts)
+
+    return_status = ShellReturn()
+
+    if _debug:
+        with open("shell.log","a") as outfile:
+            outfile.write("%s\n" % cmd_str)
+
     # definitely need to capture stdout when we're running a sub-make because
     # that's how we determine the shell arguments to the actual sub-make
     if cmd_str.startswith(submake.getname()):
@@ -131,6 +145,28 @@ def execute(cmd_str, symbol_table, use_default_shell=True, capture=True):
     if capture:
         kwargs["stdout"] = subprocess.PIPE
 
+    # a pipe style jobserver is inherited by recursive makes: recipe lines
+    # with a '+' (same as GNU Make; a fifo style jobserver needs no fds)
+    server = jobserver.get_jobserver()
+    if recursive and server is not None and server.fds:
+        kwargs["pass_fds"] = server.fds
+
+    # trivial commands (echo, mkdir -p, etc) don't need a shell
+    ret = inproc.run(cmd, cmd_str, env, capture)
+    if ret is not None:
+        return_status.exit_code, return_status.stdout = ret
+        logger.debug("inproc ts=%f exit status=%r", ts, return_status.exit_code)
+        return return_status
+
+    # --shell-coprocess
+    # (sub-makes are run by the submake helper which must be spawned)
+    if coshell.can_run(cmd, cmd_str) and not cmd_str.startswith(submake.getname()):
+        ret = coshell.run(cmd_str, env, capture, kwargs.get("pass_fds", ()))
+        if ret is not None:
+            return_status.exit_code, return_status.stdout = ret
+            logger.debug("coshell ts=%f exit status=%r", ts, return_status.exit_code)
+            return return_status
+
     try:
         p = subprocess.run(cmd, **kwargs)
 #
@@ -150,8 +186,84 @@ def execute(cmd_str, symbol_table, use_default_shell=True, capture=True):
 
     return return_status
 
+def execute(cmd_str, symbol_table, use_default_shell=True, capture=True, recursive=False):
+    """execute a string with the shell, returning a bunch of useful info"""
+    cmd, env = build_command(cmd_str, symbol_table, use_default_shell)
+    return run(cmd_str, cmd, env, capture, recursive)
+
 
 
+# --shell-cache
+# Remember the results of $(shell) so a recursive variable like
+#   VERSION = $(shell git describe)
+# runs git once instead of every time $(VERSION) is used.
+#
+# key: (argv, environment, cwd)
+# value: (exit_code, stdout, errmsg)
+_memo = None
+_memo_hits = 0
+_memo_misses = 0
+
+# $(shell) inside these variables (or in the value of an immediate assignment
+# to them, e.g., TIMESTAMP := $(shell date) or TIMESTAMP != date) is never
+# cached
+# e.g., .SHELL_NOCACHE := TIMESTAMP
+NOCACHE_VAR = ".SHELL_NOCACHE"
+
+def enable_memo():
+    global _memo
+    if _memo is None:
+        _memo = {}
+
+def memo_stats():
+    return _memo_hits, _memo_misses
+
+def _nocache(symbol_table):
+    if not symbol_table.is_defined(NOCACHE_VAR):
+        return False
+    names = symbol_table.fetch(NOCACHE_VAR).split()
+    return any(symbol_table.is_expanding(name) or symbol_table.is_assigning(name)
+                for name in names)
+
+def _run_function(cmd_str, cmd, env):
+    # run() for $(shell) and !=
+    try:
+        return run(cmd_str, cmd, env)
+    finally:
+        # The command could have written anywhere. (A recipe only drops the
+        # listings of its target; see StatCache.invalidate())
+        globcache.invalidate_all()
+
+def _execute_memo(cmd_str, symbol_table):
+    # execute() for $(shell) using the memo table
+    global _memo_hits, _memo_misses
+
+    cmd, env = build_command(cmd_str, symbol_table, use_default_shell=False)
+
+    if _nocache(symbol_table):
+        return _run_function(cmd_str, cmd, env)
+
+    key = (tuple(cmd), frozenset(env.items()), os.getcwd())
+    try:
+        exit_code, stdout, errmsg = _memo[key]
+    except KeyError:
+        pass
+    else:
+        _memo_hits += 1
+        if _trace.on:
+            _trace("shell memo hit", cmd_str=cmd_str)
+        return_status = ShellReturn()
+        return_status.exit_code = exit_code
+        return_status.stdout = stdout
+        return_status.errmsg = errmsg
+        return return_status
+
+    _memo_misses += 1
+    return_status = _run_function(cmd_str, cmd, env)
+    if not return_status.is_submake:
+        _memo[key] = (return_status.exit_code, return_status.stdout, return_status.errmsg)
+    return return_status
+
 def execute_tokens(token_list, symbol_table):
     """Runner for $(shell) and != """
     assert len(token_list)
@@ -168,7 +280,12 @@ def execute_tokens(token_list, symbol_table):
     symbol_table.ignore_recursion()
 
     # see comments in execute() about use_default_shell
-    exe_result = execute(step2, symbol_table, use_default_shell=False)
+    if _memo is not None:
+        # (a memo hit runs nothing so leaves the $(wildcard) cache alone)
+        exe_result = _execute_memo(step2, symbol_table)
+    else:
+        cmd, env = build_command(step2, symbol_table, use_default_shell=False)
+        exe_result = _run_function(step2, cmd, env)
 
     symbol_table.allow_recursion()
 
@@ -0,0 +1,74 @@
+# SPDX-License-Identifier: GPL-2.0
+# Copyright (C) 2014-2024 David Poole davep@mbuf.com david.poole@ericsson.com
+#
+# Cache of file modification times for deciding which targets are out of date.
+#
+# Every file is stat'd at most once per run. A path is only stat'd again after
+# invalidate() (called when the path's recipe has run).
+#
+# Like GNU Make's directory cache (src/dir.c), the (very common) question
+# "does this file exist?" is answered from a listing of the file's directory
+# without a stat() per file. The listings are shared with $(wildcard) (see
+# globcache.py). A directory is read once and read again only after a recipe
+# with a target in it has run (or a $(shell) has run) so a file made as a side
+# effect of a recipe next to its target is seen. Only files that exist are
+# stat'd for their timestamp.
+
+import os
+import logging
+
+logger = logging.getLogger("pymake.statcache")
+
+import pymake.trace as trace
+import pymake.globcache as globcache
+
+_trace = trace.get_tracer("statcache")
+
+# read whole directories with os.scandir() rather than stat() every path
+_batch = True
+
+class StatCache:
+    def __init__(self):
+        # key: path
+        # value: mtime (float) of a file that exists
+        # A missing file isn't cached here: it can be created by any command.
+        # The directory listing says it's missing until then.
+        self.mtimes = {}
+
+    def _stat(self, path):
+        try:
+            return os.stat(path).st_mtime
+        except OSError:
+            # also catches a dangling symlink (same as os.path.exists())
+            return None
+
+    def mtime(self, path):
+        # Returns the modification time of path or None if path doesn't exist
+        try:
+            return self.mtimes[path]
+        except KeyError:
+            pass
+
+        if _batch:
+            dirname, name = os.path.split(path)
+            if name and name not in (os.curdir, os.pardir):
+                names = globcache.listdir(dirname)
+                if names is not None and name not in names:
+                    # definitely doesn't exist
+                    return None
+
+        mtime = self._stat(path)
+        if _trace.on:
+            _trace("stat", path=path, mtime=mtime)
+        if mtime is not None:
+            self.mtimes[path] = mtime
+        return mtime
+
+    def exists(self, path):
+        return self.mtime(path) is not None
+
+    def invalidate(self, path):
+        # path's recipe has run so the path may have been created, updated, or
+        # even removed
+        self.mtimes.pop(path, None)
+        globcache.invalidate(path)
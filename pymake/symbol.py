@@ -15,11 +15,18 @@ import pymake.shell as shell
 from pymake.scanner import ScannerIterator
 import pymake.source as source
 from pymake.debug import *
+import pymake.trace as trace
+
+_trace = trace.get_tracer("symbol")
 
 _testing = False
 
 _debug = False
 
+# Evaluate Expression and VarRef through closures built from the tree (see
+# Symbol.compile()) instead of walking the tree every time.
+_compile = True
+
 __all__ = [ "Symbol",
             "Literal",
             "Operator",
@@ -59,6 +66,9 @@ __all__ = [ "Symbol",
 # hack dependency injection
 tokenize_line = None
 parse_vline = None
+parse_makefile_from_src = None
+read_expression = None
+parse_ifeq_conditionals = None
 
 # test/debug fn for debugger
 def _view(token_list):
@@ -69,21 +79,26 @@ def _view(token_list):
 #
 class Symbol(object):
     # base class of everything we find in the makefile
+
+    # closure from compile(), built by the first eval()
+    _fn = None
+
     def __init__(self, vstring=None):
         # using array of vchar for the symbol now 
         if vstring:
             # do you quack like a VCharString? everything must be VChar so know filename/pos
             try:
-                vstring.vchars, vstring[0].pos, vstring[0].filename
+                vstring.hide, vstring.chars
             except AttributeError:
                 # if seeing an AttributeError then trying to pass in a non-VCharString
                 if _testing:
                     # if we're running test code, allow array of VChars to sneak in
-                    vstring = VCharString([VChar(c,(0,0),"...testing") for c in vstring])
+                    vstring = VCharString.from_string("".join(vstring), "...testing")
                 else:
                     logger.error(type(vstring))
                     raise
-            logger.debug("new Symbol vstring=\"%s\" at %r", printable_string(str(vstring)), vstring.get_pos())
+            if _trace.on:
+                _trace("new Symbol", vstring=printable_string(str(vstring)), pos=vstring.get_pos())
             vstring.validate()
 
         # by default, save the token's VChars
@@ -129,6 +144,19 @@ class Symbol(object):
         # children should override
         raise NotImplementedError(self.name)
 
+    def compile(self):
+        # Returns a function fn(symbol_table) that returns the same string as
+        # this class's eval(symbol_table). A child class that overrides eval()
+        # but calls super().eval() still gets the parent's closure.
+        return self.eval
+
+    def __getstate__(self):
+        # the compiled closure can't be pickled (see parsecache.py); it will
+        # be rebuilt when needed
+        state = self.__dict__.copy()
+        state.pop("_fn", None)
+        return state
+
     def get_pos(self):
         return self.string.get_pos()
 
@@ -149,18 +177,30 @@ class Literal(Symbol):
         # cache the literal string
         self._str = str(vstring)
 
+        # Set once the string has been copied somewhere that won't see a
+        # change (a folded Expression, a compiled closure)
+        self._frozen = False
+
         super().__init__(vstring)
     
     def eval(self, symbol_table):
         # everything returns a single string
         return self._str
 
+    def compile(self):
+        self._frozen = True
+        s = self._str
+        return lambda symbol_table: s
+
     @property
     def literal(self):
         # convenience method for the tokenzparser
+        self._frozen = True
         return self._str
 
     def hide(self):
+        if self._frozen:
+            raise InternalError("Literal \"%s\" changed after it was folded" % self._str)
         self.string.hide()
         self._str = str(self.string)
 
@@ -214,10 +254,31 @@ class Expression(Symbol):
     def __init__(self, token_list ):
         # expect a list/array/tuple (test by calling len())
         assert len(token_list) >= 0
-        logger.debug("new Expression with %d tokens", len(token_list))
+        if _trace.on:
+            _trace("new Expression", tokens=len(token_list))
         self.token_list = token_list
         Symbol.validate(token_list)
         super().__init__()
+        self._is_folded = False
+
+    def fold(self):
+        # Constant folding: an Expression of only Literals always evaluates to
+        # the same string so join the string once. (None if not all Literals.)
+        # Done on first use, not in __init__, because the parser can still
+        # change a Literal (see AssignmentExpression). Reading Literal.literal
+        # freezes the Literal so a later change is an error instead of a stale
+        # string.
+        if self.token_list and all(isinstance(t, Literal) for t in self.token_list):
+            self._folded = "".join([t.literal for t in self.token_list])
+        else:
+            self._folded = None
+        self._is_folded = True
+
+    @property
+    def folded(self):
+        if not self._is_folded:
+            self.fold()
+        return self._folded
 
     def __str__(self):
         # return a ()'d list of our tokens
@@ -237,12 +298,31 @@ class Expression(Symbol):
         return len(self.token_list)
 
     def eval(self, symbol_table):
-        for e in self.token_list:
-            logger.debug("expression eval e=%s", e)
+        if _trace.on:
+            _trace("expression eval", expression=str(self))
+        elif self.folded is not None:
+            return self._folded
+        elif _compile:
+            fn = self._fn
+            if fn is None:
+                fn = self._fn = self.compile()
+            return fn(symbol_table)
 
         step1 = [e.eval(symbol_table) for e in self.token_list]
         return "".join(step1)
 
+    def compile(self):
+        if self.folded is not None:
+            s = self.folded
+            return lambda symbol_table: s
+
+        fn_list = _compile_token_list(self.token_list)
+        if isinstance(fn_list, str):
+            return lambda symbol_table: fn_list
+        if len(fn_list) == 1:
+            return fn_list[0]
+        return lambda symbol_table: "".join([fn(symbol_table) for fn in fn_list])
+
     def get_pos(self):
         # Find the position (filename,(row,col)) of this Expression.
         # An Expression contains a token_list.  That token_list also contains
@@ -255,6 +335,38 @@ class Expression(Symbol):
         vchar = tok.string[0]
         return vchar.get_pos()
 
+def _compile_token_list(token_list):
+    # Compile a list of Symbols to be eval'd and joined. Neighboring Literals
+    # are joined once, here. Returns a string if the whole list is Literals
+    # otherwise a list of functions fn(symbol_table).
+    fn_list = []
+    literals = []
+    for t in token_list:
+        if isinstance(t, Literal):
+            literals.append(t.literal)
+            continue
+        if type(t).eval is Expression.eval and t.folded is not None:
+            literals.append(t.folded)
+            continue
+        if literals:
+            s = "".join(literals)
+            fn_list.append(lambda symbol_table, s=s: s)
+            literals = []
+
+        if type(t).eval in _compiled_evals:
+            fn_list.append(t.compile())
+        else:
+            # call the Symbol's own eval() directly (e.g., a Function)
+            fn_list.append(t.eval)
+
+    if not fn_list:
+        return "".join(literals)
+
+    if literals:
+        s = "".join(literals)
+        fn_list.append(lambda symbol_table, s=s: s)
+    return fn_list
+
 class VarRef(Expression):
     # A variable reference found in the token stream. Save as a nested set of
     # tuples representing a tree. 
@@ -266,15 +378,58 @@ class VarRef(Expression):
     # $(abc$(def)xyz)           ->  VarRef(abc,VarRef(def),Literal(xyz),)
     # $(info this is a varref)  ->  VarRef(info this is a varref)
 
+    @property
+    def static_name(self):
+        # A static name e.g., $(CC) or $(obj-y) is always the same variable.
+        return self.folded
+
+    @property
+    def static_lookup(self):
+        # Only a name with a ':' can be an abbreviated patsubst $(SRC:.c=.o)
+        # so any other static name can go straight to the variable.
+        name = self.folded
+        return name is not None and ':' not in name
+
     def makefile(self):
         return "$(" + "".join([t.makefile() for t in self.token_list]) + ")"
 
     def eval(self, symbol_table):
 #        logger.debug("varref=%r eval start", self)
+        if _compile and not _trace.on:
+            fn = self._fn
+            if fn is None:
+                fn = self._fn = self.compile()
+            return fn(symbol_table)
+
+        if self.static_lookup:
+            if _trace.on:
+                _trace("varref eval", varref=self, key=self.static_name)
+            return symbol_table.fetch_name(self.static_name, self.get_pos())
+
         key = [t.eval(symbol_table) for t in self.token_list]
-        logger.debug("varref=%r eval key=%r", self, key)
+        if _trace.on:
+            _trace("varref eval", varref=self, key=key)
         return symbol_table.fetch("".join(key), self.get_pos())
 
+    def compile(self):
+        pos = self.get_pos()
+        if self.static_lookup:
+            name = self.static_name
+            return lambda symbol_table: symbol_table.fetch_name(name, pos)
+
+        fn_list = _compile_token_list(self.token_list)
+        if isinstance(fn_list, str):
+            # a static abbreviated patsubst e.g., $(SRC:.c=.o)
+            key = fn_list
+            return lambda symbol_table: symbol_table.fetch(key, pos)
+        if len(fn_list) == 1:
+            key_fn = fn_list[0]
+            return lambda symbol_table: symbol_table.fetch(key_fn(symbol_table), pos)
+        return lambda symbol_table: symbol_table.fetch("".join([fn(symbol_table) for fn in fn_list]), pos)
+
+# eval() methods with a matching compile()
+_compiled_evals = (Expression.eval, VarRef.eval)
+
 class AssignmentExpression(Expression):
     # assignment statement modifier flags
     FLAG_NONE = 1<<0
@@ -312,6 +467,14 @@ class AssignmentExpression(Expression):
         logger.debug("assignment lhs=%s op='%s'", lhs, op)
         key = lhs.eval(symbol_table).strip()
 
+        symbol_table.push_assign(key)
+        try:
+            return AssignmentExpression._assign(key, lhs, op, rhs, symbol_table, flags)
+        finally:
+            symbol_table.pop_assign()
+
+    @staticmethod
+    def _assign(key, lhs, op, rhs, symbol_table, flags):
         # handle different styles of assignment
         op_str = op.makefile()
 
@@ -799,11 +962,9 @@ class IncludeDirective(Directive):
             symbol_table.append("MAKEFILE_LIST", include_filename, self.expression.get_pos())
 
             src = source.SourceFile(include_filename)
-            src.load()
-            line_scanner = ScannerIterator(src.file_lines, src.name)
-            vline_iter = get_vline(src.name, line_scanner)
+            makefile = parse_makefile_from_src(src)
 
-            statement_list.extend([s for s in parse_vline(vline_iter)])
+            statement_list.extend(makefile.token_list)
 
         return statement_list
 
@@ -891,6 +1052,10 @@ class LineBlock(Symbol):
         self.vline_list = vline_list
         super().__init__()
 
+        # eval() will parse the contents of this block. We'll cache the parsed
+        # statements here.
+        self.statement_list = None
+
     def get_pos(self):
         vline = self.vline_list[0]
         return vline.get_pos()
@@ -909,10 +1074,14 @@ class LineBlock(Symbol):
         return "{0}([{1}])".format( self.__class__.__name__, s)
 
     def eval(self, symbol_table):
-        vline_iter = iter(self.vline_list)
-
-        statement_list = [s for s in parse_vline(vline_iter)]
-        return statement_list
+        # Parsing a block always starts from a clean context (parse_vline()
+        # hasn't seen a Rule) and the text never changes so the statements are
+        # the same every time. The caller must not modify the statements.
+        # (see execute_statement_list())
+        if self.statement_list is None:
+            vline_iter = iter(self.vline_list)
+            self.statement_list = [s for s in parse_vline(vline_iter)]
+        return self.statement_list
 
 
 class ConditionalBlock(Symbol):
@@ -1095,10 +1264,7 @@ class IfdefDirective(ConditionalDirective):
         return symbol_table.ifdef(name)
 
     def _parse(self):
-        # FIXME this ugly and slow and ugly and I'd like to fix it
-        # (circular imports are circular)
-        from pymake.parser import read_expression, parse_ifeq_conditionals
-        self.expression = read_expression(ScannerIterator(self.vcstring.vchars, self.get_pos()[0] ))
+        self.expression = read_expression(ScannerIterator(self.vcstring, self.get_pos()[0] ))
         
     def _eval(self, symbol_table):
         logger.debug("eval %s", self.name)
@@ -1150,11 +1316,7 @@ class IfeqDirective(ConditionalDirective):
     def _parse(self):
         # We are now parsing a previously read directive nested inside another
         # directive. 
-        #
-        # FIXME this ugly and slow and ugly and I'd like to fix it
-        # (circular imports are circular)
-        from pymake.parser import read_expression, parse_ifeq_conditionals
-        expr = read_expression(ScannerIterator(self.vcstring.vchars, self.get_pos()[0] ))
+        expr = read_expression(ScannerIterator(self.vcstring, self.get_pos()[0] ))
         self.expr1, self.expr2 = parse_ifeq_conditionals(expr, self.name)
 
     def _exprs_eval(self, symbol_table):
@@ -1189,16 +1351,8 @@ class DefineBlock(LineBlock):
     # In a LineBlock the contents are Make statements that will be executed.
     # In a DefineBlock the contents are strings that will only have varref
     # substitutions.
-    def __init__(self, vline_list):
-        super().__init__(vline_list)
-
-        # eval() will tokenize the contents of this block. We'll cache the
-        # tokenized values here.
-        self.statement_list = None
-
     def eval(self, symbol_table):
         if self.statement_list is None:
-            from pymake.pymake import parse_vline
             vline_iter = iter(self.vline_list)
             self.statement_list = [s for s in parse_vline(vline_iter)]
 
@@ -11,14 +11,28 @@ from enum import Enum
 import pymake.version as version
 import pymake.constants as constants
 from pymake.error import *
+import pymake.trace as trace
+import pymake.wildcard as wildcard
 
 logger = logging.getLogger("pymake.symtable")
+_trace = trace.get_tracer("symtable")
 
 #logger.setLevel(level=logging.INFO)
 
 #_fail_on_undefined = True
 _fail_on_undefined = False
 
+# Remember the value of a recursively expanded variable until a variable it
+# read is changed.
+_memoize = True
+
+# Parsed substitution references; the same $(SRC:.c=.o) is used over and over.
+# key: the variable reference e.g., "SRC:.c=.o"
+# value: (variable name, Pattern, replacement Pattern) or None if not a
+# substitution reference
+_abbrev_cache = {}
+_abbrev_cache_max = 4096
+
 def _value_is_recursive(v):
     # test if a value is something with its own eval method which would
     # indicate it's a recursive variable 
@@ -51,7 +65,8 @@ class Entry:
     never_export = False
 
     def __init__(self, name, value=None, pos=None):
-        logger.debug("create var name=%s origin=%s pos=%r", name, self.origin, pos)
+        if _trace.on:
+            _trace("create var", name=name, origin=self.origin, pos=pos)
         self.name = name
         self._value = value
         self.pos = pos
@@ -69,6 +84,10 @@ class Entry:
 
         self._export_stack = []
 
+        # last expansion of a recursive variable: (value, names read) or None
+        # (see SymbolTable.memo_start())
+        self._memo = None
+
     @property
     def export(self):
         return (not self.never_export) and (self._export != Export.NOEXPORT.value)
@@ -92,9 +111,11 @@ class Entry:
 
     def set_value(self, value, pos):
         # TODO add a stack where the values get changed
-        logger.debug("overwrite value name=%s at pos=%r", self.name, pos)
+        if _trace.on:
+            _trace("overwrite value", name=self.name, pos=pos)
         self.pos = pos
         self._value = value
+        self._memo = None
 
     def sanity(self):
         # TODO
@@ -110,25 +131,40 @@ class Entry:
         # vs   a:=10  (evaluated immediately and "10" stored in symtable)
         #
         if _value_is_recursive(self._value):
-            logger.debug("recursive eval %r loop=%d name=%s at pos=%r", self, self.loop, self.name, self.get_pos())
+            memo = self._memo
+            if memo is not None:
+                if _trace.on:
+                    _trace("memo hit", name=self.name)
+                symbol_table.memo_hit(memo[1])
+                return memo[0]
+
+            if _trace.on:
+                _trace("recursive eval", entry=self, loop=self.loop, name=self.name, pos=self.get_pos())
             if self.loop > 0:
                 msg = "Recursive variable %r references itself (eventually)." % self.name
                 logger.debug("%s", msg)
                 if symbol_table.env_recursion > 0:
                     # if we're expanding a recursive variable for a shell
                     # command, just return an empty string
+                    symbol_table.memo_impure()
                     return ""
                 
                 raise RecursiveVariableError(msg=msg, pos=self.get_pos())
 
-            logger.debug("recursive eval %r %s loop+=1", self, self.name)
+            symbol_table.memo_start()
             self.loop += 1
-            step1 = [ self._value.eval(symbol_table) ]
-            step1.extend( [t.eval(symbol_table) for t in self._appends] )
-            self.loop -= 1
-            logger.debug("recursive eval %r %s loop-=1", self, self.name)
+            try:
+                step1 = [ self._value.eval(symbol_table) ]
+                step1.extend( [t.eval(symbol_table) for t in self._appends] )
+            finally:
+                self.loop -= 1
+                names, pure = symbol_table.memo_stop()
             assert self.loop >= 0, self.loop
-            return " ".join(step1)
+            # (a single value is kept as-is; it might be a WordString)
+            value = step1[0] if len(step1) == 1 else " ".join(step1)
+            if pure and _memoize:
+                symbol_table.memo_save(self, value, names)
+            return value
 
         return self._value
 
@@ -136,6 +172,7 @@ class Entry:
         # ha ha type checking; require a Symbol-ish thing
         assert _value_is_recursive(value), type(value)
 
+        self._memo = None
         return self._appends.append(value)
 
     def append(self, value, pos):
@@ -188,6 +225,8 @@ class CallbackEntry(ImmutablemixIn, DefaultEntry):
         self._value = callback_fn
 
     def eval(self, symbol_table):
+        # e.g., .VARIABLES changes without any variable changing
+        symbol_table.memo_impure()
         return self._value(symbol_table)
 
 
@@ -243,8 +282,9 @@ class SymbolTable(object):
         # example, foreach loop variables and target specific variables must
         # not change existing definitions
         #
-        # The topmost layer will be [0]
-        # New layers are added using .insert(0) and removed using [1:]
+        # The topmost layer will be [-1]
+        # New layers are added using .append() and removed using .pop() so
+        # $(call) recursion, $(foreach), recipes, etc don't copy the list.
         #
         # In some places, I skip search layers if the len()==1
         #
@@ -252,6 +292,12 @@ class SymbolTable(object):
         # value: Entry instance
         self.layers = [{},]
 
+        # Every layer's Entry for a name, bottom to top, so find() is one dict
+        # lookup no matter how many layers.
+        # key: variable name
+        # value: list of Entry instances (last is visible)
+        self.index = {}
+
         # push/pop a name/value so $(foreach) (and other functions) can re-use
         # the var name (and we don't have to make a complete new copy of a
         # symbol table just to save/restore a single var)
@@ -266,6 +312,56 @@ class SymbolTable(object):
 
         self.warn_undefined = kwargs.get("warn_undefined_variables", False)
 
+        # get_exports() is called before every shell launch so keep the
+        # exported variables instead of searching the whole table each time.
+        # False means rebuild from scratch.
+        self._exports_valid = False
+        # values of the exported simply expanded variables (no need to eval)
+        # key: name
+        # value: string
+        self._export_values = {}
+        # exported recursively expanded variables (eval'd every time)
+        # key: name
+        # value: Entry
+        self._export_entries = {}
+        # names changed since the last get_exports()
+        self._exports_dirty = set()
+
+        # Memoized recursive variables (see Entry.eval). While a recursive
+        # variable is expanded, a frame records every variable name read and
+        # whether anything with a side effect ($(shell), $(info), $(eval),
+        # etc) ran. The value is only kept if nothing impure ran and is thrown
+        # away when any name it read is changed.
+        #
+        # A $(call) argument isn't a variable. An expansion that started in
+        # the same $(call) as an argument it read depends on that $(call)'s
+        # arguments; recorded as the $(call) depth (an int, so never the same
+        # as a variable name).
+        # list of [set of names, pure flag, $(call) depth, read call args flag]
+        self._memo_frames = []
+        # key: variable name (or $(call) depth)
+        # value: set of Entry with a memo that read the name
+        self._memo_dependents = {}
+
+        # $(call) arguments, a frame for each $(call) in progress (innermost
+        # last). The arguments aren't stored as variables. Like GNU Make's
+        # variable set for a $(call), $(0), $(1), etc hide the variables in
+        # the layers below the $(call) but a layer pushed during the $(call)
+        # (e.g., $(foreach 1,...)) hides the arguments.
+        # Each frame is (number of layers when the $(call) started, dict)
+        # key: "0" (the variable name), "1", "2", etc
+        # value: argument
+        # An outer $(call)'s arguments past our own are empty (same as GNU
+        # Make).
+        self._call_frames = []
+
+        # Number of layers when each push_rule_layer() was called
+        self._rule_layers = []
+
+        # Names of the variables whose value is being expanded right now by
+        # an assignment (e.g., X := $(shell date)), innermost last.
+        self._assigning = []
+
         self._init_builtins()
         self._init_envvars()
 
@@ -322,31 +418,121 @@ class SymbolTable(object):
 
     def push_layer(self):
         # push top, pop top
-        self.layers.insert(0, {})
+        self.layers.append({})
+
+    def push_rule_layer(self):
+        # A layer for target and pattern specific variables. A '+=' of a
+        # variable from a lower layer appends to a copy in this layer so the
+        # global value is left alone.
+        self.push_layer()
+        self._rule_layers.append(len(self.layers))
+
+    def pop_rule_layer(self):
+        assert self._rule_layers[-1] == len(self.layers)
+        self._rule_layers.pop()
+        self.pop_layer()
 
     def pop_layer(self):
         # push top, pop top
         if len(self.layers)==1:
             # don't allow pop of last layer
             raise IndexError(1)
-        self.layers = self.layers[1:]
+        for name in self.layers.pop():
+            self._index_pop(name)
+            self._value_changed(name)
+
+    def _index_pop(self, name):
+        # the name's topmost entry is gone
+        entries = self.index[name]
+        entries.pop()
+        if not entries:
+            del self.index[name]
+
+    def push_call(self, args):
+        # start a $(call); args[0] is the name of the variable being called
+        if self._call_frames:
+            frame = dict.fromkeys(self._call_frames[-1][1], "")
+        else:
+            frame = {}
+        for idx, arg in enumerate(args):
+            frame[str(idx)] = arg
+
+        # memoized values that read the old top frame's args
+        self._memo_invalidate(len(self._call_frames))
+        self._call_frames.append((len(self.layers), frame))
+
+    def pop_call(self):
+        self._memo_invalidate(len(self._call_frames))
+        self._call_frames.pop()
+
+    def call(self, args):
+        # $(call) support: expand the variable named args[0] with $(1), $(2),
+        # etc set to args[1:]
+        name = args[0]
+        self.push_call(args)
+        try:
+            try:
+                entry = self.find(name)
+            except KeyError:
+                return self.fetch(name)
+
+            # Unlike a plain reference, a variable can $(call) itself (GNU
+            # Make uses exp_count to the same effect)
+            self._memo_read(name)
+            loop, entry.loop = entry.loop, 0
+            try:
+                return entry.eval(self)
+            finally:
+                entry.loop = loop
+        finally:
+            self.pop_call()
+
+    def push_loop(self, name, pos=None):
+        # $(foreach) support: a new layer holding only the loop variable.
+        # Returns the Entry; change its value with set_loop().
+        self.push_layer()
+        self.add(name, "", pos)
+        return self.layers[-1][name]
+
+    def set_loop(self, entry, value):
+        # next word of a $(foreach)
+        name = entry.name
+        if self.layers[-1].get(name) is not entry:
+            # the body did something like $(eval undefine var)
+            self.add(name, value, entry.pos)
+            return self.layers[-1][name]
+        entry._value = value
+        self._value_changed(name)
+        return entry
+
+    def pop_loop(self):
+        self.pop_layer()
+
+    def _call_arg(self, name):
+        # Returns the value of a $(call) argument or None if name isn't one
+        if not self._call_frames:
+            return None
+        depth, args = self._call_frames[-1]
+        value = args.get(name)
+        if value is None:
+            return None
+        for layer in self.layers[depth:]:
+            if name in layer:
+                # a variable defined inside the $(call)
+                return None
+        if self._memo_frames:
+            frame = self._memo_frames[-1]
+            if frame[2] == len(self._call_frames):
+                frame[3] = True
+        return value
 
     def find(self, name, layer_idx=None):
         # search the layers for a variable; throw KeyError on failure 
-        if len(self.layers)==1:
-            return self.layers[0][name]
-
         if layer_idx is not None:
-            # only search a specific layer
-            return self.layers[layer_idx][name]
+            # only search a specific layer (0 is the top)
+            return self.layers[-1-layer_idx][name]
 
-        # search layers from top to bottom (forward iterator)
-        for symbols in self.layers:
-            try:
-                return symbols[name]
-            except KeyError:
-                pass
-        raise KeyError(name)
+        return self.index[name][-1]
 
     def _get_entries(self, filter_fn=None):
         # Build a dict name:entry of entire symbol table contents taking layers
@@ -355,12 +541,11 @@ class SymbolTable(object):
         entries = {}
 
         # walk layers bottom to top so higher entries replace lower
-        # (reverse iterator)
         if filter_fn:
-            for symbols in self.layers[::-1]:
+            for symbols in self.layers:
                 entries.update({ name:entry for name,entry in symbols.items() if filter_fn(entry) })
         else:
-            for symbols in self.layers[::-1]:
+            for symbols in self.layers:
                 entries.update({ name:entry for name,entry in symbols.items() })
 
         return entries        
@@ -371,10 +556,92 @@ class SymbolTable(object):
         entry.sanity()
 
         # always add to the top layer
-        self.layers[0][entry.name] = entry
+        name = entry.name
+        top = self.layers[-1]
+        if name in top:
+            # replace
+            self.index[name][-1] = entry
+        else:
+            self.index.setdefault(name, []).append(entry)
+        top[name] = entry
+        self._value_changed(name)
+
+    def _value_changed(self, name):
+        # the variable visible as name has changed (redefined, appended,
+        # hidden, unhidden, undefined)
+        self._memo_invalidate(name)
+        self._exports_changed(name)
+
+    def _memo_invalidate(self, name):
+        dependents = self._memo_dependents.pop(name, None)
+        if dependents:
+            if _trace.on:
+                _trace("memo invalidate", name=name, count=len(dependents))
+            for entry in dependents:
+                entry._memo = None
+
+    def memo_start(self):
+        # starting to expand a recursive variable
+        self._memo_frames.append([set(), True, len(self._call_frames), False])
+
+    def memo_stop(self):
+        # Finished expanding a recursive variable. Returns (names read, pure).
+        # The enclosing expansion (if any) read everything this one did.
+        names, pure, depth, call_args = self._memo_frames.pop()
+        if self._memo_frames:
+            frame = self._memo_frames[-1]
+            frame[0].update(names)
+            if not pure:
+                frame[1] = False
+            if call_args and frame[2] == depth:
+                frame[3] = True
+        if call_args:
+            names.add(depth)
+        return names, pure
+
+    def memo_hit(self, names):
+        # a memoized value was used; the enclosing expansion depends on the
+        # same names
+        if self._memo_frames:
+            self._memo_frames[-1][0].update(names)
+
+    def memo_impure(self):
+        # Something ran that must run every time (a side effect or a value
+        # that can change without a variable changing, e.g., the filesystem
+        # read by $(wildcard) and $(realpath)). The expansion(s) in progress
+        # must not be memoized.
+        if self._memo_frames:
+            self._memo_frames[-1][1] = False
+
+    def _memo_read(self, name):
+        if self._memo_frames:
+            self._memo_frames[-1][0].add(name)
+
+    def memo_save(self, entry, value, names):
+        # a recursive variable is also out of date when it is redefined
+        names.add(entry.name)
+        entry._memo = (value, names)
+        for name in names:
+            self._memo_dependents.setdefault(name, set()).add(entry)
+
+    def _exports_changed(self, name=None):
+        # A variable's value or export flag changed (name=None for all of them)
+        if name is None:
+            self._exports_valid = False
+        elif self._exports_valid:
+            self._exports_dirty.add(name)
+
+    def _find_export(self, name):
+        # the exported Entry for a name (the topmost exported entry, same as
+        # _get_entries() would find) or None
+        for entry in reversed(self.index.get(name, ())):
+            if entry.export:
+                return entry
+        return None
 
     def add(self, name, value, pos=None):
-        logger.debug("store \"%s\"=\"%s\"", name, value)
+        if _trace.on:
+            _trace("store", name=name, value=value)
 
         assert isinstance(name,str), type(name)
 
@@ -424,6 +691,7 @@ class SymbolTable(object):
             overwrite = False
             try:
                 entry.set_value(value, pos)
+                self._value_changed(name)
             except ValueError:
                 overwrite = True
 
@@ -478,31 +746,58 @@ class SymbolTable(object):
 
     def _eval_abbrev_patsubst(self, key):
         # allow exception(s) to propagate
-        varname, pat1, pat2 = self._parse_abbrev_patsubst(key)
-#        logger.debug("abbrev varname=%r pat1=%r pat2=%4", varname, pat1, pat2)
+        try:
+            abbrev = _abbrev_cache[key]
+        except KeyError:
+            try:
+                abbrev = self._compile_abbrev_patsubst(key)
+            except ValueError:
+                abbrev = None
+            if len(_abbrev_cache) >= _abbrev_cache_max:
+                _abbrev_cache.clear()
+            _abbrev_cache[key] = abbrev
 
-        pat1_len = len(pat1)
-        value = self.fetch(varname)
-        if pat1_len == 0:
-            # pat1 empty so it's a simple append operation
-            return " ".join([s+pat2 for s in value.split()])
+        if abbrev is None:
+            raise ValueError(key)
 
-        new_value = " ".join([s[:-pat1_len] + pat2 if s.endswith(pat1) else s for s in value.split()])
-        return new_value
+        varname, pattern, replacement = abbrev
+        return " ".join(pattern.replace(self.fetch(varname).split(), replacement))
+
+    def _compile_abbrev_patsubst(self, key):
+        # "A substitution reference substitutes the value of a variable with
+        # alterations that you specify. It has the form ‘$(var:a=b)’ [...]
+        # ‘$(var:a=b)’ is equivalent to ‘$(patsubst %a,%b,var)’"
+        #
+        # "For example, ‘$(foo:%.o=%.c)’ is equivalent to the patsubst
+        # function"
+        #
+        # GNU Make 4.3 January 2020  6.3.1 Substitution References
+        varname, pat1, pat2 = self._parse_abbrev_patsubst(key)
+        pattern = wildcard.compile_pattern(pat1)
+        if pattern.wild:
+            return varname, pattern, wildcard.compile_pattern(pat2)
+        return varname, wildcard.compile_pattern("%" + pat1), wildcard.compile_pattern("%" + pat2)
 
     def fetch(self, key, pos=None):
         # now try a var lookup 
         # Will always return an empty string on any sort of failure. 
-        logger.debug("fetch key=%r", key)
         assert isinstance(key,str), type(key)
         assert len(key)  # empty key bad
 
-        try:
-            # check for a "magic" variable name (an abbreviated patsubst)
-            # e.g., $(SRC:.c=.o)
-            return self._eval_abbrev_patsubst(key)
-        except ValueError:
-            pass
+        if ':' in key:
+            try:
+                # check for a "magic" variable name (an abbreviated patsubst)
+                # e.g., $(SRC:.c=.o)
+                return self._eval_abbrev_patsubst(key)
+            except ValueError:
+                pass
+
+        return self.fetch_name(key, pos)
+
+    def fetch_name(self, key, pos=None):
+        # fetch() a variable by name (never an abbreviated patsubst)
+        if _trace.on:
+            _trace("fetch", key=key)
 
         # built-in variable ?
 #        try:
@@ -510,15 +805,26 @@ class SymbolTable(object):
 #        except KeyError:
 #            pass
 
+        # (a $(foreach) inside the $(call) can hide an argument so a memo
+        # also depends on the name)
+        self._memo_read(key)
+        if self._call_frames:
+            value = self._call_arg(key)
+            if value is not None:
+                return value
+
         try:
             return self.find(key).eval(self)
         except KeyError:
             if self.warn_undefined:
+                # warn every time
+                self.memo_impure()
                 warning_message(pos, "undefined variable '%s'" % key)
             if _fail_on_undefined:
                 raise
 
-        logger.debug("sym=%s not in symbol table", key)
+        if _trace.on:
+            _trace("not in symbol table", key=key)
         return ""
 
     def append(self, name, value, pos=None):
@@ -534,7 +840,14 @@ class SymbolTable(object):
         if entry is None:
             assert _value_is_recursive(value), type(value)
             return self.add(name, value, pos)
-        
+
+        if self._rule_layers and self._rule_layers[-1] == len(self.layers) \
+                and name not in self.layers[-1]:
+            # e.g., foo.o: CFLAGS+=-g
+            return self._append_copy(entry, value, pos)
+
+        self._value_changed(name)
+
         if _value_is_recursive(entry.value):
             return entry.append_recursive(value)
 
@@ -544,6 +857,23 @@ class SymbolTable(object):
         except AttributeError:
             entry.append(value, pos)
 
+    def _append_copy(self, entry, value, pos):
+        # append to a copy of a lower layer's entry in the top layer
+        name = entry.name
+        if _value_is_recursive(entry.value):
+            self.add(name, entry.value, pos)
+            copy = self.layers[-1][name]
+            copy._appends = list(entry._appends)
+            copy.append_recursive(value)
+        else:
+            try:
+                value = value.eval(self)
+            except AttributeError:
+                pass
+            self.add(name, entry.value + " " + value, pos)
+            copy = self.layers[-1][name]
+        copy._export = entry._export
+
     def flavor(self, name):
         # Support for the $(flavor) function
         #
@@ -553,6 +883,10 @@ class SymbolTable(object):
 
         # don't use self.fetch() because will eval the var which could lead to
         # side effects
+        self._memo_read(name)
+        if self._call_arg(name) is not None:
+            return "simple"
+
         try :
             value = self.find(name)
         except KeyError:
@@ -582,6 +916,10 @@ class SymbolTable(object):
         # override -- override directive TODO
         # automatic -- defined in a rule e.g., $@ TODO
 
+        self._memo_read(name)
+        if self._call_arg(name) is not None:
+            return AutomaticEntry.origin
+
         try :
             entry = self.find(name)
             assert entry.origin is not None, name
@@ -595,6 +933,11 @@ class SymbolTable(object):
         # don't use self.fetch() because will eval the var which could lead to
         # side effects
 
+        self._memo_read(name)
+        value = self._call_arg(name)
+        if value is not None:
+            return value
+
         try :
             entry = self.find(name)
             value = entry.value
@@ -616,13 +959,36 @@ class SymbolTable(object):
 
     def is_defined(self, name):
         # is this varname in our symbol table (or other mechanisms)
+        if self._call_arg(name) is not None:
+            return True
         try:
             _ = self.find(name)
             return True
         except KeyError:
             return False
         
+    def is_expanding(self, name):
+        # is this (recursive) variable in the middle of being expanded?
+        try:
+            return self.find(name).loop > 0
+        except KeyError:
+            return False
+
+    def push_assign(self, name):
+        self._assigning.append(name)
+
+    def pop_assign(self):
+        self._assigning.pop()
+
+    def is_assigning(self, name):
+        # is an assignment to this variable expanding its value?
+        return name in self._assigning
+
     def ifdef(self, name):
+        value = self._call_arg(name)
+        if value is not None:
+            return bool(value)
+
         entry = None
         try:
             entry = self.find(name)
@@ -650,6 +1016,7 @@ class SymbolTable(object):
             pass
 
         self.exported_names.update((name,))
+        self._exports_changed(name)
 
     def unexport(self, name=None):
         if name is None:
@@ -662,6 +1029,7 @@ class SymbolTable(object):
         except KeyError:
             # no such entry
             pass
+        self._exports_changed(name)
 
         try:
             self.exported_names.remove(name)
@@ -671,27 +1039,25 @@ class SymbolTable(object):
 
     def undefine(self, name):
         # support the undefine directive
-        if len(self.layers)==1:
-            try:
-                del self.layers[0][name]
-            except KeyError:
-                # does not exist. no harm, no foul.
-                return
+        self._value_changed(name)
 
         # TODO any variables that GNU Make considers an error to undefine?
 
         # Try in layer order. If we don't find it in a layer, we're done (leave
         # lower layers intact)
-        for symbols in self.layers:
+        for symbols in reversed(self.layers):
             try:
                 del symbols[name]
             except KeyError:
+                # does not exist. no harm, no foul.
                 return
+            self._index_pop(name)
 
     def _export_all(self):
         entries = self._get_entries()
         for k,v in entries.items():
             v.set_export( Export.IMPLICIT )
+        self._exports_changed()
         # new vars from this point on will be marked as export
         self.export_start()
 
@@ -699,6 +1065,7 @@ class SymbolTable(object):
         entries = self._get_entries()
         for k,v in entries.items():
             v.set_unexport(Export.IMPLICIT)
+        self._exports_changed()
         # turn off global export flag
         self.export_stop()
 
@@ -716,9 +1083,28 @@ class SymbolTable(object):
         #
         # The .eval() during iteration will throw a "dictionary changed during
         # iteration" error.
-        entries = self._get_entries(lambda e:e.export)
+        if not self._exports_valid:
+            self._export_values.clear()
+            self._export_entries.clear()
+            self._exports_dirty = set(self._get_entries(lambda e:e.export).keys())
+            self._exports_valid = True
+
+        for name in self._exports_dirty:
+            self._export_values.pop(name, None)
+            self._export_entries.pop(name, None)
+            entry = self._find_export(name)
+            if entry is None:
+                pass
+            elif isinstance(entry.value, str):
+                self._export_values[name] = entry.value
+            else:
+                self._export_entries[name] = entry
+        self._exports_dirty.clear()
 
-        exports = { name:entry.eval(self) for name,entry in entries.items() }
+        # only the recursively expanded variables need an eval()
+        exports = dict(self._export_values)
+        for name,entry in list(self._export_entries.items()):
+            exports[name] = entry.eval(self)
 
         assert self.env_recursion >= 0
         return exports
@@ -760,9 +1146,14 @@ class SymbolTable(object):
         assert name in constants.builtin_variables, name
 
         try:
-            return self.find(name).set_value(value, pos)
+            self.find(name).set_value(value, pos)
+            self._value_changed(name)
+            return
         except KeyError:
             pass
+        except ValueError:
+            # read-only entry e.g., MAKEFLAGS from the environment
+            pass
 
         new_entry = BuiltInEntry(name, value, pos)
         self._add_entry(new_entry)
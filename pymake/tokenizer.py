@@ -5,6 +5,7 @@
 import logging
 import string
 import functools
+import re
 
 _debug = True
 
@@ -18,19 +19,60 @@ import pymake.vline as vline
 from pymake.symbol import *
 import pymake.functions as functions
 from pymake.version import Version
+import pymake.trace as trace
+
+_trace = trace.get_tracer("tokenize")
 
 # XXX temp for interactive debugger
 def _view(token_list):
     return "".join([str(t) for t in token_list])
 
+# Bulk scanning fast path.
+#
+# The state machines below look at every single character. Most characters in
+# a makefile are boring: they're just added to the word currently being built.
+# With _bulk_scan enabled, once a boring char is added to a token, the rest of
+# the run of boring chars is found with one regex match against the line's
+# text and added to the token in one step. Token boundaries are still decided
+# by the state machines so the Symbol tree is identical either way.
+# (tests/test_bulk_scan.py compares both against the tests/*.mk files)
+# Turned off with --no-bulk-scan.
+_bulk_scan = True
+
+def enable_bulk_scan(flag=True):
+    global _bulk_scan
+    _bulk_scan = flag
+
+def _run_re(stop_chars):
+    # match a run of chars not in stop_chars
+    return re.compile("[^%s]+" % re.escape("".join(sorted(stop_chars))))
+
+_line_word_run = _run_re(whitespace | eol | {backslash, '$', '#'})
+_rule_word_run = _run_re(whitespace | eol | {backslash, '$', '#', ':', '&'})
+_rhs_word_run = _run_re(whitespace | eol | {backslash, '$', '#', ':', '|', ';'})
+_assign_word_run = _run_re(whitespace | eol | {backslash, '$', '#', ':', '?', '+', '!', '='})
+_recipe_run = _run_re(eol | {backslash, '$'})
+_var_ref_run = { '(' : _run_re({'(', ')', '$'}),
+                 '{' : _run_re({'{', '}', '$'}) }
+
+def _scan_run(vchar_scanner, token, run_re):
+    # Add the chars matching run_re at the scanner's current position to
+    # token. Leave the scanner positioned after them.
+    m = run_re.match(vchar_scanner.text(), vchar_scanner.idx)
+    if m:
+        token.extend(vchar_scanner.data[vchar_scanner.idx:m.end()])
+        vchar_scanner.idx = m.end()
+
 def comment(vchar_scanner):
     # Seems weird to character by character consume a line comment until the
     # end of line. This function is used to keep the char scanner in sync with
     # expected results. There are some places where I'm making sure I've
     # consumed the entire line.
-    vchar = next(vchar_scanner)
-    assert vchar.char == '#', vchar.get_pos()
-    for vchar in vchar_scanner:
+    assert vchar_scanner.lookahead_char() == '#', vchar_scanner.get_pos()
+    if _bulk_scan:
+        vchar_scanner.idx = vchar_scanner.max_idx
+        return
+    for c in vchar_scanner.chars():
         pass
 
 def _pushtoken(token_list, t):
@@ -48,7 +90,8 @@ def tokenize_line(vchar_scanner):
     if not vchar_scanner.remain():
         return []
 
-    logger.debug("tokenize_line at %r", vchar_scanner.get_pos())
+    if _trace.on:
+        _trace("tokenize_line", pos=vchar_scanner.get_pos())
 
     state_start = 1
     state_in_word = 2
@@ -64,15 +107,15 @@ def tokenize_line(vchar_scanner):
 
     state = state_start
 
-    for vchar in vchar_scanner : 
-        c = vchar.char
-        logger.debug("e c={} state={} idx={} token=\"{}\" pos={} src={}".format(
-            printable_char(c), state, vchar_scanner.idx, str(token), vchar.pos, vchar.filename))
+    for c in vchar_scanner.chars():
+        if _trace.on:
+            _trace("line", c=printable_char(c), state=state, idx=vchar_scanner.idx,
+                    token=str(token), pos=vchar_scanner.vchar().pos, src=vchar_scanner.filename)
 
         if state==state_start:
             if c in whitespace: 
                 # save whitespace as its own Literal
-                token += vchar
+                vchar_scanner.take(token)
             else :
                 # whatever it is, push it back so can tokenize it
                 vchar_scanner.pushback()
@@ -84,7 +127,7 @@ def tokenize_line(vchar_scanner):
         elif state==state_in_word:
             if c==backslash:
                 state = state_backslash
-                token += vchar
+                vchar_scanner.take(token)
 
             elif c in whitespace:
                 # end of word
@@ -116,13 +159,14 @@ def tokenize_line(vchar_scanner):
 
             else :
                 assert isinstance(token, vline.VCharString), type(token)
-                assert isinstance(vchar, vline.VChar), type(vchar)
-                token += vchar
+                vchar_scanner.take(token)
+                if _bulk_scan:
+                    _scan_run(vchar_scanner, token, _line_word_run)
 
         elif state==state_dollar :
             if c=='$':
                 # literal $
-                token += vchar 
+                vchar_scanner.take(token)
             else:
                 # save token so far (if any)
                 # also starts new token
@@ -140,7 +184,7 @@ def tokenize_line(vchar_scanner):
 
         elif state==state_backslash :
             # literal '\' + somechar
-            token += vchar
+            vchar_scanner.take(token)
             state = state_in_word
 
         else:
@@ -179,32 +223,25 @@ def tokenize_rule(vchar_scanner):
 
     pushtoken = functools.partial(_pushtoken, token_list)
 
-    # get the starting position of this scanner (for error reporting)
-    starting_pos = vchar_scanner.get_pos()
-    logger.debug("LHS starting_pos=%s", starting_pos)
-
     state = state_start
     start_count = 0
 
-    for vchar in vchar_scanner : 
-        # ha ha type checking
-        assert vchar.filename 
-
-        c = vchar.char
-        logger.debug("s c={} state={} idx={} token=\"{}\" pos={} src={}".format(
-            printable_char(c), state, vchar_scanner.idx, str(token), vchar.pos, vchar.filename))
+    for c in vchar_scanner.chars():
+        if _trace.on:
+            _trace("rule", c=printable_char(c), state=state, idx=vchar_scanner.idx,
+                    token=str(token), pos=vchar_scanner.vchar().pos, src=vchar_scanner.filename)
 
         if state==state_start:
             # eat whitespace while in the starting state
             # NOTE: we will NEVER call this function for a Recipe so always ignore RECIPEPREFIX
             if c in whitespace: 
                 # save whitespace as its own Literal
-                token += vchar
+                vchar_scanner.take(token)
             elif c==':':
                 state = state_colon
                 # save the whitespace string we've seen so far
                 token = pushtoken(token)
-                token += vchar
+                vchar_scanner.take(token)
             else :
                 # whatever it is, push it back so can tokenize it
                 vchar_scanner.pushback()
@@ -216,7 +253,7 @@ def tokenize_rule(vchar_scanner):
         elif state==state_in_word:
             if c==backslash:
                 state = state_backslash
-                token += vchar
+                vchar_scanner.take(token)
 
             elif c in whitespace:
                 # end of word
@@ -245,16 +282,16 @@ def tokenize_rule(vchar_scanner):
                 # start new token
                 token = pushtoken(token)
                 # keep scanning until we know what colon token we've seen
-                token += vchar
+                vchar_scanner.take(token)
                 state = state_colon
 
             elif c=='&':
                 # maybe grouped targets
                 # cheat and peekahead
-                if vchar_scanner.lookahead().char == ':':
+                if vchar_scanner.lookahead_char() == ':':
                     raise NotImplementedError("&:")
                 else:
-                    token += vchar
+                    vchar_scanner.take(token)
 
             elif c in eol : 
                 # capture any leftover when the line ended
@@ -264,13 +301,14 @@ def tokenize_rule(vchar_scanner):
                 
             else :
                 assert isinstance(token, vline.VCharString), type(token)
-                assert isinstance(vchar, vline.VChar), type(vchar)
-                token += vchar
+                vchar_scanner.take(token)
+                if _bulk_scan:
+                    _scan_run(vchar_scanner, token, _rule_word_run)
 
         elif state==state_dollar :
             if c=='$':
                 # literal $
-                token += vchar 
+                vchar_scanner.take(token)
             else:
                 # save token so far (if any)
                 # also starts new token
@@ -289,14 +327,14 @@ def tokenize_rule(vchar_scanner):
         elif state==state_backslash :
             # literal '\' + somechar
             # FIXME I'm doing backslashes wrong
-            token += vchar
+            vchar_scanner.take(token)
             state = state_in_word
 
         elif state==state_colon :
             # rule's end of target(s) is either a single ':' or double colon '::'
             if c==':':
                 # double colon rule
-                token += vchar
+                vchar_scanner.take(token)
                 return [token_list, RuleOp(token)]
 
             else:
@@ -342,7 +380,8 @@ def tokenize_rule_RHS(vchar_scanner):
     # GNU Make checks for assignment first and thus so shall we.
     a = tokenize_assignment_statement(vchar_scanner, target_var=True)
     if a :
-        logger.debug("tokenize_rule_RHS found an assignment at pos=%r", a.get_pos())
+        if _trace.on:
+            _trace("tokenize_rule_RHS assignment", pos=a.get_pos())
         return a
     # this is a big function and I worry about polluting my namespace
     del a
@@ -373,9 +412,9 @@ def tokenize_rule_RHS(vchar_scanner):
             prereq_list.append( Expression(token_list) )
         return []
     
-    for vchar in vchar_scanner :
-        c = vchar.char
-        logger.debug("p state={1} c={0} pos={2}".format(printable_char(c), state, vchar.pos))
+    for c in vchar_scanner.chars():
+        if _trace.on:
+            _trace("rule_RHS", c=printable_char(c), state=state, pos=vchar_scanner.vchar().pos)
 
         if state==state_start :
             if c==';':
@@ -454,12 +493,14 @@ def tokenize_rule_RHS(vchar_scanner):
                 return PrerequisiteList(prereq_list)
 
             else:
-                token += vchar
+                vchar_scanner.take(token)
+                if _bulk_scan:
+                    _scan_run(vchar_scanner, token, _rhs_word_run)
             
         elif state==state_dollar :
             if c=='$':
                 # literal $
-                token += vchar
+                vchar_scanner.take(token)
             else:
                 # save token(s) so far but do NOT push to prereq_list (only
                 # push to prereq_list on whitespace)
@@ -482,13 +523,13 @@ def tokenize_rule_RHS(vchar_scanner):
             # found a : on the Rule's right hand side
             # static pattern rule, e.g.
             # $(objects): %.o: %.c
-            raise NotImplementedError("static pattern rule at pos=%r" % (vchar.get_pos(),))
+            raise NotImplementedError("static pattern rule at pos=%r" % (vchar_scanner.vchar().get_pos(),))
 
         elif state==state_backslash : 
             if not c in eol : 
                 # literal backslash + some char
-                token += prev_vchar # capture the literal backslash
-                token += vchar
+                vchar_scanner.take(token, 2) # capture the literal backslash
+                vchar_scanner.take(token)
                 state = state_word
             else:
                 # The prerequisites (or whatever) are continued on the next
@@ -502,9 +543,6 @@ def tokenize_rule_RHS(vchar_scanner):
             # should not get here
             assert 0, state
 
-        # save the vchar in case we need it in the next go round
-        prev_vchar = vchar
-
     # bottom of loop
 
     # davep 07-Dec-2014 ; do we ever get here? 
@@ -524,9 +562,9 @@ def tokenize_variable_ref(vchar_scanner):
 
     # open char .e.g. ( or {
     # (so we can match open/close chars)
-    open_vchar = None
-    # stack of open/close chars so we can report very accurate error positions
-    open_vchar_stack = []
+    open_char = None
+    # number of open chars not yet closed
+    open_count = 0
 
     state = state_start
     token = vline.VCharString()
@@ -536,35 +574,34 @@ def tokenize_variable_ref(vchar_scanner):
 
     # TODO optimization opportunity.  Move state==state_start outside the loop
     # since we're only hitting it once
-    for vchar in vchar_scanner : 
-        c = vchar.char
+    for c in vchar_scanner.chars():
 #        print("v c={0} state={1} idx={2}".format(printable_char(c), state, vchar_scanner.idx))
         if state==state_start:
             if c=='$':
                 state=state_dollar
             else :
-                raise ParseError(pos=vchar.pos)
+                raise ParseError(pos=vchar_scanner.vchar().pos)
 
         elif state==state_dollar:
             # looking for '(' or '$' or some char
             if c=='(' or c=='{':
-                open_vchar = vchar
-                open_vchar_stack.append(vchar)
+                open_char = c
+                open_count += 1
                 close_char = ')' if c=='(' else '}'
                 state = state_in_var_ref
             elif c=='$':
                 # literal "$$"
-                token += vchar
+                vchar_scanner.take(token)
             elif not c in whitespace :
                 # single letter variable, e.g., $@ $x $_ etc.
-                token += vchar
+                vchar_scanner.take(token)
                 token_list.append(Literal(token))
                 return VarRef(token_list)
                 # done tokenizing the var ref
             else:
                 # Can I hit a case of $<whitespace> ?
                 # Yes. GNU Make 4.3 is ignoring it, depending on the context.
-                raise ParseError(msg="unclosed variable ref", pos=vchar.get_pos())
+                raise ParseError(msg="unclosed variable ref", pos=vchar_scanner.vchar().get_pos())
 
         elif state==state_in_var_ref:
             assert close_char is not None
@@ -573,20 +610,16 @@ def tokenize_variable_ref(vchar_scanner):
                 # () {} good
                 # (} {) bad 
 
-#                print("v found close_char={} at pos={} len(stack)={}".format(
-#                    vchar.char, vchar.get_pos(), len(open_vchar_stack)))
-
-                try:
-                    previous_vchar = open_vchar_stack.pop()
-                except IndexError:
+                if open_count == 0:
                     # Unbalanced expression.
                     # TODO nice error message
                     raise ParseError(msg="unbalanced expression")
+                open_count -= 1
 
-                # if the stack is empty, we have a balanced expression so we
+                # if nothing is left open, we have a balanced expression so we
                 # _should_ be done.
 
-                if len(open_vchar_stack) == 0:
+                if open_count == 0:
                     # save what we've read so far
                     if len(token):
                         token_list.append( Literal(token) )
@@ -600,16 +633,16 @@ def tokenize_variable_ref(vchar_scanner):
                     # done tokenizing the var ref
                 else:
                     # another part of the literal string we're building
-                    token += vchar
+                    vchar_scanner.take(token)
 
             elif c=='$':
                 # nested expression!  :-O
                 # if lone $$ token, preserve the $$ in the current token scanner
                 # otherwise, recurse into parsing a $() expression
-                if vchar_scanner.lookahead().char=='$':
-                    token += vchar
+                if vchar_scanner.lookahead_char()=='$':
+                    vchar_scanner.take(token)
                     # skip the extra $
-                    c = next(vchar_scanner)
+                    vchar_scanner.idx += 1
                 else:
                     # save token so far (if any)
                     if len(token):
@@ -621,7 +654,7 @@ def tokenize_variable_ref(vchar_scanner):
                     # recurse into this scanner again
                     token_list.append( tokenize_variable_ref(vchar_scanner) )
 
-            elif c == open_vchar.char:
+            elif c == open_char:
                 # we have an embedded open char.
                 # e.g., $(info ())
                 # so we have carefully track the open/close matching just as
@@ -629,19 +662,19 @@ def tokenize_variable_ref(vchar_scanner):
                 # Note we don't have to track the opposite open/close char; ie,
                 # if open is paren then we can safely ignore all open/close
                 # curly.
-#                print( "v found open vchar={} at pos={}".format(
-#                    vchar.char, vchar.get_pos()))
-                open_vchar_stack.append(vchar)
-                token += vchar
+                open_count += 1
+                vchar_scanner.take(token)
 
             else:
-                token += vchar
+                vchar_scanner.take(token)
+                if _bulk_scan:
+                    _scan_run(vchar_scanner, token, _var_ref_run[open_char])
 
         else:
                 # should not get here
             assert 0, state
 
-    raise ParseError(pos=vchar.get_pos(), msg="VarRef not closed")
+    raise ParseError(pos=vchar_scanner.vchar().get_pos(), msg="VarRef not closed")
 
 def tokenize_recipe(vchar_scanner):
     # Collect characters together into a token. 
@@ -661,12 +694,11 @@ def tokenize_recipe(vchar_scanner):
     state = state_start
     token = vline.VCharString()
     token_list = []
-    vchar_stack = []
 
-    for vchar in vchar_scanner :
-        c = vchar.char
-        logger.debug("r c={} state={} idx={} token=\"{}\" pos={}".format(
-            printable_char(c), state, vchar_scanner.idx, printable_string(str(token)), vchar.pos))
+    for c in vchar_scanner.chars():
+        if _trace.on:
+            _trace("recipe", c=printable_char(c), state=state, idx=vchar_scanner.idx,
+                    token=printable_string(str(token)), pos=vchar_scanner.vchar().pos)
 
         if state==state_start : 
             # Must arrive here right after the end of the prerequisite list.
@@ -699,16 +731,17 @@ def tokenize_recipe(vchar_scanner):
             elif c=='$':
                 state = state_dollar
             elif c==backslash:
-                vchar_stack.append(vchar)
                 state = state_backslash
             else:
-                token += vchar 
+                vchar_scanner.take(token)
+                if _bulk_scan:
+                    _scan_run(vchar_scanner, token, _recipe_run)
 
         elif state==state_dollar : 
             if c=='$':
                 # a $$ in a rule expression needs to be preserved as a double $$
-                token += prev_vchar # capture the previous '$'
-                token += vchar
+                vchar_scanner.take(token, 2) # capture the previous '$'
+                vchar_scanner.take(token)
                 state = state_recipe
             else:
                 # definitely a variable ref of some sort
@@ -729,17 +762,14 @@ def tokenize_recipe(vchar_scanner):
 
         elif state==state_backslash : 
             # literal \ followed by some char
-            token += vchar_stack.pop()
-            token += vchar
+            vchar_scanner.take(token, 2)
+            vchar_scanner.take(token)
             state = state_recipe
 
         else:
             # should not get here
             assert 0, state
 
-        # save the vchar in case we need it in the next go round
-        prev_vchar = vchar
-
     # bottom of loop
 
     logger.debug("end of scanner state=%d", state)
@@ -793,17 +823,17 @@ def tokenize_assignment_expression(vchar_scanner, define=False):
                     ]
         return AssignmentExpression(statement)
 
-    for vchar in vchar_scanner:
-        c = vchar.char
+    for c in vchar_scanner.chars():
 
-        logger.debug("a c={} state={} idx={} token=\"{}\" pos={} src={}".format(
-            printable_char(c), state, vchar_scanner.idx, str(token), vchar.pos, vchar.filename))
+        if _trace.on:
+            _trace("assignment", c=printable_char(c), state=state, idx=vchar_scanner.idx,
+                    token=str(token), pos=vchar_scanner.vchar().pos, src=vchar_scanner.filename)
 
         if state==state_start:
             # eat whitespace while in the starting state
             if c in whitespace: 
                 # save whitespace as its own Literal
-                token += vchar
+                vchar_scanner.take(token)
             else :
                 # whatever it is, push it back so can tokenize it
                 vchar_scanner.pushback()
@@ -816,7 +846,7 @@ def tokenize_assignment_expression(vchar_scanner, define=False):
                 # FIXME I'm doing backslashes wrong
                 # (need to convert \n to 0x0d not 'n')
                 state = state_backslash
-                token += vchar
+                vchar_scanner.take(token)
 
             elif c in whitespace:
                 # end of word
@@ -842,17 +872,17 @@ def tokenize_assignment_expression(vchar_scanner, define=False):
                 # start new token
                 token = savetoken(token)
                 # keep scanning until we know what colon token we've seen
-                token += vchar
+                vchar_scanner.take(token)
                 state = state_colon
 
             elif c in set("?+!"):
                 # maybe assignment ?= += !=
                 # cheat and peekahead
-                if vchar_scanner.lookahead().char == '=':
+                if vchar_scanner.lookahead_char() == '=':
                     token = savetoken(token)
                     # consume the character
-                    eq = vchar_scanner.next()
-                    operator = AssignOp(vline.VCharString([vchar, eq]))
+                    vchar_scanner.idx += 1
+                    operator = AssignOp(vchar_scanner.data[vchar_scanner.idx-2:vchar_scanner.idx])
 
                     statement = [ Expression(token_list), 
                                   operator, 
@@ -861,12 +891,12 @@ def tokenize_assignment_expression(vchar_scanner, define=False):
                     return AssignmentExpression(statement)
 
                 else:
-                    token += vchar
+                    vchar_scanner.take(token)
 
             elif c=='=':
                 # definitely an assignment 
                 token = savetoken(token)
-                operator = AssignOp(vline.VCharString([vchar]))
+                operator = AssignOp(vchar_scanner.data[vchar_scanner.idx-1:vchar_scanner.idx])
 
                 statement = [ Expression(token_list), 
                               operator, 
@@ -884,14 +914,15 @@ def tokenize_assignment_expression(vchar_scanner, define=False):
 
             else :
                 assert isinstance(token, vline.VCharString), type(token)
-                assert isinstance(vchar, vline.VChar), type(vchar)
 
-                token += vchar
+                vchar_scanner.take(token)
+                if _bulk_scan:
+                    _scan_run(vchar_scanner, token, _assign_word_run)
 
         elif state==state_dollar :
             if c=='$':
                 # literal $
-                token += vchar 
+                vchar_scanner.take(token)
             else:
                 # save token so far (if any)
                 # also starts new token
@@ -911,7 +942,7 @@ def tokenize_assignment_expression(vchar_scanner, define=False):
             # literal '\' + somechar
             # FIXME I'm probably doing this wrong. Need to lookup the \x to see
             # if it's a valid char. What does GNU Make do?
-            token += vchar
+            vchar_scanner.take(token)
             state = state_in_word
 
         elif state==state_colon :
@@ -920,11 +951,11 @@ def tokenize_assignment_expression(vchar_scanner, define=False):
             if c==':':
                 # double colon
                 state = state_colon_colon
-                token += vchar
+                vchar_scanner.take(token)
             elif c=='=':
                 # :=
                 # end of LHS
-                token += vchar
+                vchar_scanner.take(token)
                 statement = [ Expression(token_list), 
                               AssignOp(token), 
                               Expression(tokenize_line(vchar_scanner))
@@ -939,7 +970,7 @@ def tokenize_assignment_expression(vchar_scanner, define=False):
             # preceeding chars are "::"
             if c=='=':
                 # ::= 
-                token += vchar
+                vchar_scanner.take(token)
                 statement = [ Expression(token_list), 
                               AssignOp(token), 
                               Expression(tokenize_line(vchar_scanner))
@@ -958,21 +989,22 @@ def tokenize_assignment_expression(vchar_scanner, define=False):
 
             if c in whitespace: 
                 # save whitespace as its own Literal
-                token += vchar
+                vchar_scanner.take(token)
 
             elif c == ':':
                 # end of current token
                 token = savetoken(token)
-                token += vchar
+                vchar_scanner.take(token)
 
                 # allow := ::= :::=
                 while len(token) <= 3:
-                    peek = vchar_scanner.lookahead().char
+                    peek = vchar_scanner.lookahead_char()
 
                     if peek == '=':
                         # found :=
                         # consume the '='
-                        token += vchar_scanner.next()
+                        vchar_scanner.idx += 1
+                        vchar_scanner.take(token)
                         assign = AssignOp(token)
                         statement = [ Expression(token_list), 
                                       assign,
@@ -982,7 +1014,8 @@ def tokenize_assignment_expression(vchar_scanner, define=False):
                     elif peek == ':':
                         # consume the ':'
                         # go back for more
-                        token += vchar_scanner.next()
+                        vchar_scanner.idx += 1
+                        vchar_scanner.take(token)
                     else:
                         return None
 
@@ -991,7 +1024,7 @@ def tokenize_assignment_expression(vchar_scanner, define=False):
             elif c == '=':
                 token = savetoken(token)
                 # definitely an assignment!
-                operator = AssignOp(vline.VCharString([vchar]))
+                operator = AssignOp(vchar_scanner.data[vchar_scanner.idx-1:vchar_scanner.idx])
 
                 statement = [ Expression(token_list), 
                               operator, 
@@ -1000,9 +1033,9 @@ def tokenize_assignment_expression(vchar_scanner, define=False):
                 return AssignmentExpression(statement)
 
             elif c in set("?+!"):
-                if vchar_scanner.lookahead().char == '=':
-                    eq = vchar_scanner.next()
-                    assign = AssignOp(vline.VCharString([vchar, eq]))
+                if vchar_scanner.lookahead_char() == '=':
+                    vchar_scanner.idx += 1
+                    assign = AssignOp(vchar_scanner.data[vchar_scanner.idx-2:vchar_scanner.idx])
 
                     statement = [ Expression(token_list), 
                                   assign,
@@ -1012,7 +1045,7 @@ def tokenize_assignment_expression(vchar_scanner, define=False):
 
                 else:
                     # TODO
-                    raise ParseError(pos=vchar.pos)
+                    raise ParseError(pos=vchar_scanner.vchar().pos)
 
             elif c in eol : 
                 # Found end of line without finding assignment operator.
@@ -1028,7 +1061,7 @@ def tokenize_assignment_expression(vchar_scanner, define=False):
                 if not define:
                     return None
                 token = savetoken(token)
-                warning_message(vchar.get_pos(), "extraneous text after 'define' directive")
+                warning_message(vchar_scanner.vchar().get_pos(), "extraneous text after 'define' directive")
                 return make_define_expression(token_list)
 
             # endif state == state_seek_assign
@@ -1078,25 +1111,24 @@ def seek_word(viter, seek):
     token = vline.VCharString()
 
     # look at first char first
-    vchar = next(viter)
+    c = viter.lookahead_char()
+    viter.idx += 1
 
     state_whitespace = 1  # ignore leading whitespace
     state_char = 2
     state_trailing_whitespace = 3
 
-    if vchar.char in whitespace:
+    if c in whitespace:
         state = state_whitespace
     else:
         state = state_char
-        token += vchar
-
-#    print("seek_word c={0} state={1}".format(printable_char(vchar.char), state))
+        viter.take(token)
 
-    for vchar in viter:
-        c = vchar.char
+#    print("seek_word c={0} state={1}".format(printable_char(c), state))
 
+    for c in viter.chars():
         # continue to ignore leading whitespace
-#        print("seek_word c={0} state={1} pos={2}".format(printable_char(vchar.char), state, vchar.get_pos()))
+#        print("seek_word c={0} state={1} pos={2}".format(printable_char(c), state, viter.vchar().get_pos()))
         if state == state_whitespace:
             if not c in whitespace:
                 state = state_char
@@ -1114,7 +1146,7 @@ def seek_word(viter, seek):
                 viter.pushback()
                 break
             else:
-                token += vchar
+                viter.take(token)
 
         elif state == state_trailing_whitespace:
             if c == '#':
@@ -1130,7 +1162,8 @@ def seek_word(viter, seek):
     s = str(token)
     if s in seek:
         # yay! we found a "reserved word"!
-        logger.debug("seek_word found \"%s\" at %r", s, token.get_pos())
+        if _trace.on:
+            _trace("seek_word found", s=s, pos=token.get_pos())
         viter.clear_state()
         return token
 
@@ -1144,11 +1177,11 @@ def seek_directive(viter, seek):
     # GNU Make allows <tab><directive> so we have to carefully see if there's a
     # directive in what originally is a recipe line.
     # (This mimics what GNU Make does)
-    logger.debug("seek_directive at %r", viter.get_pos())
-    vchar = viter.lookahead()
+    if _trace.on:
+        _trace("seek_directive", pos=viter.get_pos())
     warn_on_recipe_prefix = None
-    if vchar and vchar.char == recipe_prefix:
-        warn_on_recipe_prefix = vchar.get_pos()
+    if viter.lookahead_char() == recipe_prefix:
+        warn_on_recipe_prefix = viter.lookahead().get_pos()
         warn_msg = "recipe prefix means directive %r might be confused as a recipe"
 
     vstr = seek_word(viter, seek)
@@ -1163,8 +1196,8 @@ def tokenize_assignment_statement(vchar_scanner, target_var=False):
     # can have multiple modifiers e.g.,
     # export private override CC=gcc
     
-    pos = vchar_scanner.get_pos()
-    logger.debug("tokenize_assignment_statement at %r", pos)
+    if _trace.on:
+        _trace("tokenize_assignment_statement", pos=vchar_scanner.get_pos())
 
     modifier_list = []
 
@@ -1178,7 +1211,7 @@ def tokenize_assignment_statement(vchar_scanner, target_var=False):
 
         e = tokenize_assignment_expression(vchar_scanner)
         if isinstance(e, AssignmentExpression):
-            assert vchar_scanner.is_empty(), "".join([v.char for v in vchar_scanner.remain()])
+            assert vchar_scanner.is_empty(), vchar_scanner.text()[vchar_scanner.idx:]
 
             # clear the pushed state at top of the loop
             vchar_scanner.clear_state()
@@ -1196,9 +1229,10 @@ def tokenize_assignment_statement(vchar_scanner, target_var=False):
 
         m = str(token)
         if m not in assignment_modifier:
-            logger.debug("not an assignment statement at %r", pos)
             # restore scanner to state it was at start of function
             vchar_scanner.pop_state()
+            if _trace.on:
+                _trace("not an assignment statement", pos=vchar_scanner.get_pos())
             return None
 
         # 'define'|'undefine' will terminate a list of modifiers.  
@@ -1242,8 +1276,7 @@ def seek_comment(vchar_scanner):
     #
     # (if we have a recipe prefix line, sometimes we need to ignore it)
 
-    for vchar in vchar_scanner :
-        c = vchar.char
+    for c in vchar_scanner.chars():
         if c == '#':
             return True
 
@@ -0,0 +1,71 @@
+# SPDX-License-Identifier: GPL-2.0
+# Copyright (C) 2014-2024 David Poole davep@mbuf.com david.poole@ericsson.com
+#
+# Tracing for the hot loops (tokenizer, Symbol eval, symbol table).
+#
+# A logger.debug("...".format(...)) in a per-character loop pays for the
+# formatting on every character even when debug logging is off.  A trace point
+# is guarded by a test of the shared Tracer's 'on' so a disabled trace point
+# costs one level check (cached by the logging module) and nothing else:
+#
+#   _trace = trace.get_tracer("tokenize")
+#   ...
+#   if _trace.on:
+#       _trace("char", c=c, state=state, idx=vchar_scanner.idx)
+#
+# An enabled trace point is sent to the category's logger
+# ("pymake.tokenize", etc) as a debug record. The fields are attached to the
+# record as record.trace (a dict) so a handler can pick them apart. The
+# record's message is only formatted if a handler actually prints it.
+#
+# Categories are the same names as the --debug flags (see pargs.py).
+
+import logging
+
+__all__ = [
+    "get_tracer",
+    "enable",
+]
+
+# key: category
+# value: Tracer instance
+_tracers = {}
+
+class _Fields:
+    # format the fields only when the log record is formatted
+    def __init__(self, fields):
+        self.fields = fields
+
+    def __str__(self):
+        return " ".join(["%s=%r" % (k, v) for k, v in self.fields.items()])
+
+class Tracer:
+    def __init__(self, category):
+        self.category = category
+        self.logger = logging.getLogger("pymake." + category)
+
+    @property
+    def on(self):
+        # callers must test this before calling the tracer
+        # (asked every time so a level set after import, by enable() or by
+        # the logging config, is seen at once)
+        return self.logger.isEnabledFor(logging.DEBUG)
+
+    def __call__(self, event, **fields):
+        record = {"category": self.category, "event": event}
+        record.update(fields)
+        self.logger.debug("%s %s", event, _Fields(fields), extra={"trace": record})
+
+def get_tracer(category):
+    try:
+        return _tracers[category]
+    except KeyError:
+        pass
+    tracer = Tracer(category)
+    _tracers[category] = tracer
+    return tracer
+
+def enable(category):
+    # turn on tracing for a single category (e.g., --debug tokenize)
+    logging.getLogger("pymake." + category).setLevel(level=logging.DEBUG)
+
@@ -12,6 +12,8 @@
 import sys
 import itertools
 import logging
+import array
+import bisect
 
 logger = logging.getLogger("pymake.vline")
 
@@ -22,6 +24,9 @@ import pymake.hexdump as hexdump
 from pymake.scanner import ScannerIterator
 from pymake.printable import printable_char, printable_string
 from pymake.constants import eol, backslash, whitespace, recipe_prefix
+import pymake.trace as trace
+
+_trace = trace.get_tracer("vline")
 
 # indices into VirtualLine's characters' position.
 VCHAR_ROW = 0
@@ -107,40 +112,117 @@ def validate_vchars(vchar_list):
 #                breakpoint()
 #            assert vchar.hide, (printable_char(vchar.char),vchar.pos)
 
+class VCharStore(object):
+    # Backing storage for a VirtualLine's characters.
+    #
+    # Originally every character of every makefile line was its own VChar
+    # instance with its own position tuple, filename and hide flag. On
+    # Kbuild-sized trees those objects dominated both parse time and memory.
+    #
+    # Now the characters of a VirtualLine live in one Python string with a
+    # parallel bytearray of hide flags. Positions are not stored per
+    # character; they are calculated from the starting position plus a table
+    # of where each physical line starts in the string. A VChar is a
+    # lightweight view (store + index) into this storage.
+    __slots__ = ("text", "hidden", "filename", "starting_pos", "row_offsets")
+
+    def __init__(self, text, starting_pos, filename, row_offsets=None):
+        self.text = text
+
+        # show/hide each char (e.g., hide if in a comment or backslash with
+        # weird whitespace)
+        self.hidden = bytearray(len(text))
+
+        self.filename = filename
+
+        # (row,col) of self.text[0] in the original file
+        self.starting_pos = starting_pos
+
+        # index into self.text of the first char of each physical line
+        self.row_offsets = array.array('l', row_offsets if row_offsets else (0,))
+
+    def pos(self, idx):
+        # (row,col) of the char at self.text[idx] in the original file
+        row = bisect.bisect_right(self.row_offsets, idx) - 1
+        if row == 0:
+            # only the first line can start somewhere other than column zero
+            return (self.starting_pos[VCHAR_ROW],
+                    self.starting_pos[VCHAR_COL] + idx)
+        return (self.starting_pos[VCHAR_ROW] + row, idx - self.row_offsets[row])
+
+    def row_range(self, row):
+        # start,end indices into self.text of a physical line
+        start = self.row_offsets[row]
+        if row+1 < len(self.row_offsets):
+            return start, self.row_offsets[row+1]
+        return start, len(self.text)
+
+    def set_char(self, idx, char):
+        # see VChar.set_backslash()
+        self.text = self.text[:idx] + char + self.text[idx+1:]
+
+    def visible(self):
+        # indices of all the chars not hidden
+        if not any(self.hidden):
+            return range(len(self.text))
+        return array.array('l', [idx for idx,hide in enumerate(self.hidden) if not hide])
+
+    def visible_str(self, start=0, end=None):
+        if end is None:
+            end = len(self.text)
+        text = self.text
+        hidden = self.hidden
+        if not any(hidden[start:end]):
+            return text[start:end]
+        return "".join([text[idx] for idx in range(start,end) if not hidden[idx]])
+
+
 # using a class for the virtual char so can interchange string with VirtualLine
 # in ScannerIterator
 class VChar(object):
+    # A VChar is a view of one character in a VCharStore. The char, its
+    # position, filename and hide flag all live in the store.
+    __slots__ = ("_store", "_idx")
+
     def __init__(self, char, pos, filename):
         # ha ha python type checking
         assert len(char)==1, len(char)
         assert isinstance((pos), type(())), type(pos)
         assert len(pos) == 2, pos
 
-        self._char = char
-        # VCHAR_ROW, VCHAR_COL index into pos
-        self._pos = pos
-
-        # show/hide this char (e.g., hide if in a comment or backslash with
-        # weird whitespace)
-        self._hide = False
+        # a VChar created on its own (not from a VirtualLine) gets its own tiny
+        # store
+        self._store = VCharStore(char, pos, filename)
+        self._idx = 0
 
-        self.filename = filename
+    @classmethod
+    def view(cls, store, idx):
+        # create a VChar looking into an existing VCharStore
+        vchar = cls.__new__(cls)
+        vchar._store = store
+        vchar._idx = idx
+        return vchar
 
     @property
-    def pos(self): 
-        return self._pos
+    def pos(self):
+        # VCHAR_ROW, VCHAR_COL index into pos
+        return self._store.pos(self._idx)
 
     @property
     def char(self):
-        return self._char
+        return self._store.text[self._idx]
+
+    @property
+    def filename(self):
+        return self._store.filename
 
     @property
     def row(self):
-        return self._pos[VCHAR_ROW]
+        return self.pos[VCHAR_ROW]
 
     @property
     def col(self):
-        return self._pos[VCHAR_COL]
+        return self.pos[VCHAR_COL]
 
     @property
     def linenumber(self):
@@ -148,7 +230,7 @@ class VChar(object):
         return self.pos[VCHAR_ROW]+1
 
     def get_pos(self):
-        return self.filename, self._pos
+        return self._store.filename, self._store.pos(self._idx)
 
     def __str__(self):
         return self.char
@@ -161,9 +243,9 @@ class VChar(object):
         # together with a '\' are treated as a single line (the VirtualLine).
         # The VirutalLine is given as a single unbroken line, terminated with a
         # single '\n', to the scanner and parser. In GNU Make, the separate
-        # lines are joined by a space (0x20). 
+        # lines are joined by a space (0x20).
         #
-        # Section 3.1.1  Splitting Long Lines.  
+        # Section 3.1.1  Splitting Long Lines.
         # "Outside of recipe lines, backslash/newlines are converted into a single space character.
         # Once that is done, all whitespace around the backslash/newline is condensed into a single
         # space: this includes all whitespace preceding the backslash, all whitespace at the beginning
@@ -176,82 +258,185 @@ class VChar(object):
         # The upper level code must see a space, not the backslash. But the
         # sanity validation code needs to see a '\' in order to match the
         # source file.
-        self._char = ' '
+        self._store.set_char(self._idx, ' ')
 
     @property
     def hide(self):
-        return self._hide
+        return bool(self._store.hidden[self._idx])
 
     @hide.setter
     def hide(self, flag):
-        self._hide = bool(flag)
+        self._store.hidden[self._idx] = 1 if flag else 0
 
 
 class VCharString(object):
-    # davep 24-Apr-2016 ;  
+    # davep 24-Apr-2016 ;
     # container of VChar; quack like a Python string
     # Symbols contain a VCharString contains VChar contains filename, position, real char
+    #
+    # A VCharString doesn't hold VChar instances. It holds a reference to a
+    # VCharStore and an array of indices into that store. VChar instances are
+    # created on demand. If VChars from different stores are mixed together
+    # (only seen in test code) we fall back to a plain list of VChar.
+    __slots__ = ("_store", "_idx", "_loose")
+
     def __init__(self, arg=None):
         if _testing and arg and isinstance(arg,str):
             arg = VCharString.from_string(arg)
-            
-        self.vchars = list(arg) if arg else []
+
+        self._store = None
+        self._idx = array.array('l')
+        self._loose = None
+
+        if arg:
+            self.extend(arg)
+
+    @classmethod
+    def from_store(cls, store, indices):
+        # create a VCharString directly from a store and an array (or range)
+        # of indices into that store
+        vstr = cls.__new__(cls)
+        vstr._store = store
+        vstr._idx = indices
+        vstr._loose = None
+        return vstr
+
+    def extend(self, arg):
+        if isinstance(arg, VCharString) and arg._loose is None and \
+            (self._store is None or self._store is arg._store) and self._loose is None:
+            if arg._store is not None:
+                self._store = arg._store
+                self._idx.extend(arg._idx)
+            return
+
+        for vchar in arg:
+            self.append(vchar)
+
+    def append(self, vchar):
         # ha ha type checking; verify we have VChar
-        assert all( (vchar.pos for vchar in self.vchars) )
+        store = vchar._store
+
+        if self._loose is not None:
+            self._loose.append(vchar)
+            return
+
+        if self._store is None:
+            self._store = store
+        elif self._store is not store:
+            # switch to the slow path
+            self._loose = list(self)
+            self._loose.append(vchar)
+            return
+
+        self._idx.append(vchar._idx)
+
+    def append_from(self, vstr, idx):
+        # same as self.append(vstr[idx]) without making a VChar
+        if vstr._loose is None and self._loose is None and \
+            (self._store is None or self._store is vstr._store):
+            self._store = vstr._store
+            self._idx.append(vstr._idx[idx])
+            return
+        self.append(vstr[idx])
+
+    @property
+    def vchars(self):
+        return list(self)
 
     def __str__(self):
-        return "".join([str(c) for c in self.vchars if not c.hide])
+        if self._loose is not None:
+            return "".join([str(c) for c in self._loose if not c.hide])
+        if self._store is None:
+            return ""
+        text = self._store.text
+        hidden = self._store.hidden
+        return "".join([text[idx] for idx in self._idx if not hidden[idx]])
+
+    def chars(self):
+        # all the chars (visible and hidden) as a python string
+        if self._loose is not None:
+            return "".join([c.char for c in self._loose])
+        if self._store is None:
+            return ""
+        text = self._store.text
+        if isinstance(self._idx, range) and self._idx.step == 1:
+            return text[self._idx.start:self._idx.stop]
+        return "".join([text[idx] for idx in self._idx])
 
     def __add__(self, vchar):
         assert vchar.pos
         assert vchar.filename
-        self.vchars.append(vchar)
+        self.append(vchar)
         return self
 
     def __len__(self):
-        return len(self.vchars)
+        if self._loose is not None:
+            return len(self._loose)
+        return len(self._idx)
+
+    def __iter__(self):
+        if self._loose is not None:
+            return iter(self._loose)
+        store = self._store
+        view = VChar.view
+        return (view(store, idx) for idx in self._idx)
 
     def __getitem__(self, idx):
-        return self.vchars[idx]
+        if self._loose is not None:
+            if isinstance(idx, slice):
+                return VCharString(self._loose[idx])
+            return self._loose[idx]
+
+        if isinstance(idx, slice):
+            return VCharString.from_store(self._store, self._idx[idx])
+        return VChar.view(self._store, self._idx[idx])
 
     @classmethod
-    def from_string(cls, python_string):
+    def from_string(cls, python_string, filename="/dev/null"):
         # make a VCharString from a regular python string (mostly used with
         # testing so the positions and filename will be nonsense)
-        cnt = itertools.count(0)
-        return cls([VChar(c, (0,next(cnt)), "/dev/null") for c in python_string])
+        store = VCharStore(python_string, (0,0), filename)
+        return cls.from_store(store, array.array('l', range(len(python_string))))
 
     def validate(self):
-        validate_vchars(self.vchars)
+        validate_vchars(self)
 
     def printable_str(self):
         # build string from the visible characters.
         # see also printable_str() in VirtualLine
-        s = "".join([printable_char(vchar.char) for vchar in self.vchars if not vchar.hide]) 
+        s = "".join([printable_char(vchar.char) for vchar in self if not vchar.hide])
         return s
 
     def get_pos(self):
         # XXX what about empty VCharString ?
-        return self.vchars[0].filename, self.vchars[0].pos
+        return self[0].get_pos()
 
     def clear(self):
-        self.vchars = []
+        self._store = None
+        self._idx = array.array('l')
+        self._loose = None
 
     def python(self):
         # note: normally I'm using __str__() for this functionality but the VCharString and VirtualLine
-        # use __str__() to return the contents as a pure python string. 
+        # use __str__() to return the contents as a pure python string.
         return "VCharString(\"{}\")".format(self)
 
     def hide(self):
         # hide this entire string
-        for v in self.vchars:
-            v.hide = True
-    
+        if self._loose is not None:
+            for v in self._loose:
+                v.hide = True
+            return
+
+        hidden = self._store.hidden if self._store else None
+        for idx in self._idx:
+            hidden[idx] = 1
+
 
 class VirtualLine(object):
     def __init__(self, phys_lines_list, starting_pos, filename):
-        logger.debug("VirtualLine pos=%r filename=%s", starting_pos, filename)
-        logger.debug("lines=%s", phys_lines_list)
+        if _trace.on:
+            _trace("VirtualLine", pos=starting_pos, filename=filename, lines=phys_lines_list)
 
         # ha ha type checking
         int(starting_pos[0]), int(starting_pos[1])
@@ -278,9 +463,9 @@ class VirtualLine(object):
         # this is where this line blob started in the original source file
         self.starting_pos = starting_pos
 
-        # create a 2-d array of all the characters with their position in
+        # create the storage of all the characters with their position in
         # the file
-        self.virt_chars = []
+        self.store = None
         self._make_virtual_line()
 
         # Based on the \ line continuation rules, collapse 2-D array into a new
@@ -288,29 +473,21 @@ class VirtualLine(object):
         self._collapse_virtual_line()
 
     def _make_virtual_line(self):
-        # Create a 2-D array of VChar from our 2-D array (array of strings).
+        # Create a VCharStore from our 2-D array (array of strings).
         #
-        # The new 2-D array will be the characters with their row, col in the
-        # 2-D array.
-        starting_row = self.starting_pos[VCHAR_ROW]
-        starting_col = self.starting_pos[VCHAR_COL]
-        for row_idx, line in enumerate(self.phys_lines):
-            vchar_list = []
-            for col_idx, char in enumerate(line):
-                # char is the original character
-                # pos is the (row, col) of the char in the file
-                pos = (row_idx+starting_row, 
-                       col_idx+starting_col)
-                vchar = VChar(char, pos, self.filename)
-#                if _debug:
-#                    print("vchar=%r at %r" % (vchar.char, vchar.get_pos()))
-                vchar_list.append(vchar)
-            # reset the column back to zero since we're on a new line
-            starting_col = 0
-            self.virt_chars.append(vchar_list)
+        # The store is all the physical lines joined into one string plus the
+        # offset of each line in that string so the row, col of every char
+        # can be recovered.
+        row_offsets = []
+        offset = 0
+        for line in self.phys_lines:
+            row_offsets.append(offset)
+            offset += len(line)
+        self.store = VCharStore("".join(self.phys_lines), self.starting_pos,
+                            self.filename, row_offsets)
 
     def _collapse_virtual_line(self):
-        # Section 3.1.1  Splitting Long Lines.  
+        # Section 3.1.1  Splitting Long Lines.
         # "Outside of recipe lines, backslash/newlines are converted into a single space character.
         # Once that is done, all whitespace around the backslash/newline is condensed into a single
         # space: this includes all whitespace preceding the backslash, all whitespace at the beginning
@@ -345,40 +522,45 @@ class VirtualLine(object):
         #    vv---- leading spaces preserved
         # """  this\
         #   is     a     \
-        #   test  
+        #   test
         # """   ^^-- trailing spaces preserved
         # becomes "   this is     a test  "
 
-        def clean_front(row):
-            for vchar in row:
-                if not vchar.char in whitespace:
+        text = self.store.text
+        hidden = self.store.hidden
+
+        # backslashes to be replaced with a space (see VChar.set_backslash())
+        backslash_list = []
+
+        def clean_front(start, end):
+            for idx in range(start, end):
+                if not text[idx] in whitespace:
                     break
-                vchar.hide = True
+                hidden[idx] = 1
 
-        def clean_back(row):
-            assert row[-1].char in eol
-            assert row[-2].char == backslash
+        def clean_back(start, end):
+            assert text[end-1] in eol
+            assert text[end-2] == backslash
 
-#            print("hide c=%r at %r" % (row[-1].char, row[-1].get_pos()))
-            row[-1].hide = True
+            hidden[end-1] = 1
 
             # we will decide what to do with the backslash after we've checked
             # for an empty line
 
             # -1 to convert from length to index
             # -2 to skip the trailing backslash+eol
-            idx = len(row)-1-2
+            idx = end-1-2
 
-            if idx < 0:
+            if idx < start:
                 # we have a very corner case of a line of just backslash+eol
                 # for example:
                 # \\\n
-                row[-2].hide = True
+                hidden[end-2] = 1
                 return
 
             # In this loop, we check for entirely hidden lines (all whitespace
-            # or an empty line, (but still joined by backslashes)). 
-            # For example: 
+            # or an empty line, (but still joined by backslashes)).
+            # For example:
             #
             # foo=\\\n
             #    \\\n
@@ -392,54 +574,57 @@ class VirtualLine(object):
             # bar\n
             # also becomes "foo= bar\n"
 
-            while idx >= 0 and row[idx].char in whitespace:
-                if row[idx].hide:
+            while idx >= start and text[idx] in whitespace:
+                if hidden[idx]:
                     # we've bumped into a whitespace already hidden by clean_front()
                     # so this entire line must be hidden
-                    row[-2].hide = True
+                    hidden[end-2] = 1
                     return
-                    
-                row[idx].hide = True
+
+                hidden[idx] = 1
                 idx -= 1
 
-#            print("backslash c=%r at %r" % (row[-2].char, row[-2].get_pos()))
-            row[-2].set_backslash()
+            backslash_list.append(end-2)
         # end of clean_back()
 
+        num_rows = len(self.phys_lines)
+
         # leading spaces on first line are preserved
-        clean_back(self.virt_chars[0])
+        clean_back(*self.store.row_range(0))
 
         rowidx = 1
-        while rowidx < len(self.virt_chars)-1:
-            clean_front(self.virt_chars[rowidx])
-            clean_back(self.virt_chars[rowidx])
+        while rowidx < num_rows-1:
+            row = self.store.row_range(rowidx)
+            clean_front(*row)
+            clean_back(*row)
             rowidx += 1
 
         # trailing spaces on last line are preserved
-        clean_front(self.virt_chars[rowidx])
+        clean_front(*self.store.row_range(rowidx))
+
+        # The upper level code must see a space, not the backslash.
+        if backslash_list:
+            chars = list(text)
+            for idx in backslash_list:
+                chars[idx] = ' '
+            self.store.text = "".join(chars)
 
     def __str__(self):
         # build string from the visible characters
-        lines = []
-        for row in self.virt_chars:
-            s = "".join([vchar.char for vchar in row if not vchar.hide]) 
-            lines.append(s)
-
-        return "".join(lines)
+        return self.store.visible_str()
 
     def __iter__(self):
         # This iterator we will feed the characters that are still visible to
-        # the tokenizer. Using ScannerIterator so we have pushback. The
-        # itertools.chain() joins all the virt_lines together into one
-        # contiguous array
-        virt_iterator = ScannerIterator([vchar for vchar in itertools.chain(*self.virt_chars) if not vchar.hide], self.filename)
+        # the tokenizer. Using ScannerIterator so we have pushback.
+        vstr = VCharString.from_store(self.store, self.store.visible())
+        virt_iterator = ScannerIterator(vstr, self.filename)
         return virt_iterator
 
     def get_pos(self):
         return (self.filename,
             # position of this line (in a file) is the position of the first char
             # of the first line
-            self.virt_chars[0][0].pos)
+            self.store.pos(0))
 
     def get_phys_line(self):
         # rebuild a single physical line (needed when tokenizing recipes)
@@ -460,8 +645,7 @@ class VirtualLine(object):
                  "": self.starting_pos}
 
     def validate(self):
-        for row in self.virt_chars:
-            validate_vchars(row)
+        validate_vchars(VCharString.from_store(self.store, range(len(self.store.text))))
 
 class RecipeVirtualLine(VirtualLine):
     # This is a block containing recipe(s). Don't collapse around backslashes.
@@ -482,27 +666,30 @@ class RecipeVirtualLine(VirtualLine):
     # just need to peek/poke the first and last chars of those arrays.
     #
     def _collapse_virtual_line(self):
-        # reminder: self.virt_chars is an array of arrays of vchars
-        # outer array contains lines
-        # inner array contains the characters in the line
+        # reminder: self.store.text is all the lines joined together;
+        # self.store.row_range() gives the start/end of each line
 
-        # don't modifiy first row 
-        row_iter = iter(self.virt_chars)
-        row = next(row_iter)
+        text = self.store.text
+        num_rows = len(self.phys_lines)
+
+        # don't modifiy first row
+        rowidx = 0
+        start, end = self.store.row_range(rowidx)
 
         # check the end of the line for backslash/newline
-        while len(row) >= 2 and row[-1].char in eol and row[-2].char == backslash:
-#            print("r pos=%r is backslash/eol" % (row[-1].get_pos(),))
-            # move to next row (allow StopIteration to propagate which
-            # would indicate a trailing backslash with no further recipe
-            # which would indicate a parse failure)
-            row = next(row_iter)
+        while end-start >= 2 and text[end-1] in eol and text[end-2] == backslash:
+            # move to next row (a trailing backslash with no further recipe
+            # would indicate a parse failure)
+            rowidx += 1
+            if rowidx >= num_rows:
+                raise StopIteration
+            start, end = self.store.row_range(rowidx)
 
             # if first char of the next row is a tab (aka recipe_prefix)
             # then hide it
-            if row[0].char == recipe_prefix:
-#                print("r pos=%r hidden" % (row[0].get_pos(),))
-                row[0].hide = True
+            if text[start] == recipe_prefix:
+                self.store.hidden[start] = 1
+
 
 def get_vline(filename, line_iter): 
     # GENERATOR
@@ -532,7 +719,8 @@ def get_vline(filename, line_iter):
     # Also can't use enumerate() because the line_iter will also be used inside
     # parse_recipes() and the idx can change with push_back
     for line in line_iter :
-        logger.debug("get_vline line_num=%d state=%d", line_iter.idx, state)
+        if _trace.on:
+            _trace("get_vline", line_num=line_iter.idx, state=state)
 
         if state==state_start : 
             # line_iter.idx is the *next* line number counting from zero 
@@ -1,3 +1,4 @@
+import re
 
 def split_percent(s):
     assert isinstance(s,str), type(s)
@@ -29,47 +30,22 @@ def split_percent(s):
         return s[:idx], s[idx+1:]
 
 def wildcard_match_list(pattern_list, target_list, negate=False):
-    # first arg must be a list, not an iterable, because we use it twice
-    assert isinstance(pattern_list,list), type(pattern_list)
-#    print(f"pattern_list={pattern_list} target_list={target_list} negate={negate}")
-
-    # pre-calculate all the patterns
-    p_list = [split_percent(p) for p in pattern_list]
-
-    for t in target_list:
-        for p,pattern in zip(p_list,pattern_list):
-#            print(t,p,pattern)
-            if p is None:
-                # no '%' so just a string compare
-                flag = t == pattern
-            else:
-                flag = t.startswith(p[0]) and t.endswith(p[1])
-
-#            print(flag,negate,flag^negate)
-            # flag==True    => match
-            # flag==False   => no-match
-            # negate==False => filter
-            # negate==True  => filter-out
-            #
-            #     flag  negate    desired result
-            #   +------------------------------
-            #   | true   true     false  (match + filter-out)
-            #   | true   false    true   (no match + filter-out)
-            #   | false  true     true   (match + filter)
-            #   | false  false    false  (no match + filter)
-
-            if flag:
-                # quit searching on first match (only one match per target)
-                if not negate:
-                    # if we're filter then we return this target
-                    # if we're filter-out then we skip this target
-                    yield t
-                break
-
-        else:
-            # at this point, none of the patterns matched
-            if negate:
-                yield t
+    # $(filter) and $(filter-out); the targets are yielded in order (including
+    # duplicates)
+    if len(pattern_list) > _index_min:
+        match = PatternIndex(pattern_list).match
+    else:
+        # pre-calculate all the patterns
+        p_list = [compile_pattern(p) for p in pattern_list]
+        def match(t):
+            for p in p_list:
+                if p.match(t):
+                    return True
+            return False
+
+    if negate:
+        return (t for t in target_list if not match(t))
+    return (t for t in target_list if match(t))
 
 def wildcard_match(pattern, strlist):
     # backwards compatible layer for some older test code
@@ -79,28 +55,183 @@ def wildcard_replace(search, replace, strlist):
     #
     # Must carefully preserve whitespace!!
     #
+    return compile_pattern(search).replace(strlist, compile_pattern(replace))
+
+# Compiled '%' patterns used by $(patsubst), $(filter), $(filter-out) and
+# substitution references $(SRC:.c=.o). The same few patterns are used over
+# and over so a pattern is only parsed once.
+#
+# key: pattern string
+# value: Pattern
+_pattern_cache = {}
+# thrown away when it gets this big (a makefile with more distinct patterns
+# than this is probably building them from data)
+_pattern_cache_max = 4096
+
+def _unquote_percent(s):
+    # Find the first unquoted '%' the same as GNU Make's find_percent(). A
+    # backslash quotes a '%' and a backslash quotes a backslash but only in
+    # front of a '%'. Backslashes after the first unquoted '%' are left alone.
+    # Returns (prefix, suffix) with the quoting removed or (text, None) if no
+    # unquoted '%'.
+    if '\\' not in s:
+        idx = s.find('%')
+        if idx < 0:
+            return s, None
+        return s[:idx], s[idx+1:]
 
-    s = split_percent(search)
-
-    if s is None:
-        # no wildcards so just a simple string replace
-        assert 0 # do I still hit this case?  $(patsubst) decaying to $(subst) handled elsewhere
-        return [replace if search==str_ else str_ for str_ in strlist]
-
-    r = split_percent(replace)
-
-    new_list = []
-    for str_ in strlist:
-        if str_.startswith(s[0]) and str_.endswith(s[1]):
-            if r is None:
-                new_list.append(replace)
-            else:
-                mid = str_[len(s[0]) : len(str_)-len(s[1])]
-                new = r[0] + mid + r[1]
-                new_list.append(new)
+    out = []
+    start = 0
+    while 1:
+        idx = s.find('%', start)
+        if idx < 0:
+            out.append(s[start:])
+            return "".join(out), None
+
+        # count the backslashes in front of the %
+        n = 0
+        while idx-n-1 >= start and s[idx-n-1] == '\\':
+            n += 1
+
+        # keep half of them (each pair is one literal backslash)
+        out.append(s[start:idx-n] + '\\' * (n//2))
+        if n % 2 == 0:
+            return "".join(out), s[idx+1:]
+
+        # an odd backslash makes a literal %
+        out.append('%')
+        start = idx + 1
+
+class Pattern:
+    # A pattern split at its '%' (the "stem"). Without a '%', a pattern only
+    # matches the exact text.
+    __slots__ = ("prefix", "suffix", "text", "wild", "min_len", "_word_re")
+
+    def __init__(self, s):
+        self.prefix, self.suffix = _unquote_percent(s)
+        self.wild = self.suffix is not None
+        if self.wild:
+            self.text = None
+            # the prefix and suffix can't overlap
+            self.min_len = len(self.prefix) + len(self.suffix)
         else:
-            new_list.append(str_)
-
-    return new_list
-
-
+            self.text = self.prefix
+            self.min_len = len(self.text)
+        self._word_re = None
+
+    @property
+    def unquoted(self):
+        # the pattern with the quoting removed
+        if self.wild:
+            return self.prefix + "%" + self.suffix
+        return self.text
+
+    def match(self, word):
+        if not self.wild:
+            return word == self.text
+        return len(word) >= self.min_len and word.startswith(self.prefix) and word.endswith(self.suffix)
+
+    def stem(self, word):
+        # the part of word matching the '%' or None if no match
+        if self.wild and self.match(word):
+            return word[len(self.prefix):len(word)-len(self.suffix)]
+        return None
+
+    def replace(self, words, replacement):
+        # $(patsubst) on a list of words; replacement is a Pattern. Returns a
+        # list of words.
+        if not self.wild:
+            to = replacement.unquoted
+            text = self.text
+            return [to if w == text else w for w in words]
+
+        prefix, suffix, min_len = self.prefix, self.suffix, self.min_len
+        start = len(prefix)
+        if not replacement.wild:
+            to = replacement.text
+            return [to if len(w) >= min_len and w.startswith(prefix) and w.endswith(suffix) else w
+                        for w in words]
+
+        r_prefix, r_suffix = replacement.prefix, replacement.suffix
+        if not suffix:
+            # e.g., $(SRC:=.o)
+            return [r_prefix + w[start:] + r_suffix if w.startswith(prefix) else w for w in words]
+        end = -len(suffix)
+        return [r_prefix + w[start:end] + r_suffix
+                    if len(w) >= min_len and w.startswith(prefix) and w.endswith(suffix) else w
+                        for w in words]
+
+    def subst_words(self, to, text):
+        # Replace every whitespace delimited word exactly matching the text of
+        # a pattern without a '%', leaving the whitespace alone. (What
+        # $(patsubst) does when there is no '%'.)
+        rex = self._word_re
+        if rex is None:
+            rex = self._word_re = re.compile(r"(?<!\S)" + re.escape(self.text) + r"(?!\S)")
+        return rex.sub(lambda m: to, text)
+
+def compile_pattern(s):
+    try:
+        return _pattern_cache[s]
+    except KeyError:
+        pass
+
+    if len(_pattern_cache) >= _pattern_cache_max:
+        _pattern_cache.clear()
+    pattern = _pattern_cache[s] = Pattern(s)
+    return pattern
+
+# with more patterns than this, $(filter) builds a PatternIndex
+_index_min = 4
+
+class PatternIndex:
+    # Is a word matched by any of a (big) list of patterns? For
+    # $(filter-out $(A),$(B)) with thousands of words in A and B.
+    #
+    # Patterns without a '%' are in a set. A pattern with a '%' is found by
+    # the end of the word: the patterns are grouped by the length of their
+    # suffix then by the suffix itself. Patterns with no suffix (e.g., "src/%")
+    # are grouped by their prefix the same way. So a word is only checked
+    # against the patterns that could match it.
+    def __init__(self, pattern_list):
+        self.exact = set()
+
+        # key: length of suffix
+        # value: dict of suffix -> list of Pattern
+        self.by_suffix = {}
+        # same for patterns with no suffix
+        # key: length of prefix
+        # value: dict of prefix -> list of Pattern
+        self.by_prefix = {}
+
+        for s in pattern_list:
+            p = compile_pattern(s)
+            if not p.wild:
+                self.exact.add(p.text)
+            elif p.suffix:
+                self.by_suffix.setdefault(len(p.suffix), {}).setdefault(p.suffix, []).append(p)
+            else:
+                self.by_prefix.setdefault(len(p.prefix), {}).setdefault(p.prefix, []).append(p)
+
+        self.by_suffix = list(self.by_suffix.items())
+        self.by_prefix = list(self.by_prefix.items())
+
+    def match(self, word):
+        if word in self.exact:
+            return True
+
+        wlen = len(word)
+        for n, patterns in self.by_suffix:
+            if n <= wlen:
+                p_list = patterns.get(word[wlen-n:])
+                if p_list:
+                    for p in p_list:
+                        if p.match(word):
+                            return True
+
+        for n, patterns in self.by_prefix:
+            # (a prefix pattern matches every word starting with the prefix)
+            if n <= wlen and word[:n] in patterns:
+                return True
+
+        return False
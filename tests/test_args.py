@@ -116,3 +116,47 @@ def test_debug_flags_foo():
     with pytest.raises(ValueError):
         args = pargs.parse_args(('--debug=foo',),)
 
+
+def test_parse_args_parse_cache():
+    args = pargs.parse_args(('--parse-cache', '/tmp/cache', '-f', '/dev/null'))
+    assert args.parse_cache == "/tmp/cache"
+
+def test_parse_args_jobs():
+    args = pargs.parse_args(('-f', '/dev/null'))
+    assert args.jobs == 1
+
+    args = pargs.parse_args(('-j', '8', '-f', '/dev/null'))
+    assert args.jobs == 8
+
+    args = pargs.parse_args(('--jobs=8', '-f', '/dev/null'))
+    assert args.jobs == 8
+
+    with pytest.raises(ValueError):
+        pargs.parse_args(('-j', 'foo', '-f', '/dev/null'))
+
+    with pytest.raises(ValueError):
+        pargs.parse_args(('-j', '0', '-f', '/dev/null'))
+
+def test_parse_args_keep_going():
+    args = pargs.parse_args(('-k', '-f', '/dev/null'))
+    assert args.keep_going
+
+    args = pargs.parse_args(('--keep-going', '-f', '/dev/null'))
+    assert args.keep_going
+
+def test_parse_args_jobserver_style():
+    args = pargs.parse_args(('-j', '4', '-f', '/dev/null'))
+    assert args.jobserver_style == "fifo"
+
+    args = pargs.parse_args(('-j', '4', '--jobserver-style=pipe', '-f', '/dev/null'))
+    assert args.jobserver_style == "pipe"
+
+    with pytest.raises(ValueError):
+        pargs.parse_args(('--jobserver-style=sem', '-f', '/dev/null'))
+
+def test_parse_args_shell_coprocess():
+    args = pargs.parse_args(('-f', '/dev/null'))
+    assert not args.shell_coprocess
+
+    args = pargs.parse_args(('--shell-coprocess', '-f', '/dev/null'))
+    assert args.shell_coprocess
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: GPL-2.0
+
+# Differential test of the tokenizer's bulk scanning fast path. Every makefile
+# in tests/ must parse to the identical Symbol tree (including the position
+# of every token) with and without tokenizer._bulk_scan.
+
+import os
+import glob
+
+import pytest
+
+import pymake.pymake as pymake
+import pymake.tokenizer as tokenizer
+from pymake.symbol import Symbol
+from pymake.vline import VCharString, VirtualLine
+from pymake.error import ParseError
+
+import run
+
+# Find files relative to tests location
+test_dir = os.path.dirname(os.path.abspath(__file__))
+makefiles = sorted(glob.glob(os.path.join(test_dir, "*.mk")))
+
+def _walk(obj, out, seen):
+    # flatten a Symbol tree into a list of (class, string, position)
+    # (a function's args share Symbols with its token_list so only walk each
+    # Symbol once)
+    if isinstance(obj, VCharString):
+        out.append(("VCharString", obj.chars(), str(obj),
+                    [vchar.get_pos() for vchar in obj]))
+    elif isinstance(obj, VirtualLine):
+        out.append(("VirtualLine", str(obj), obj.get_pos()))
+    elif isinstance(obj, (list, tuple)):
+        for o in obj:
+            _walk(o, out, seen)
+    elif isinstance(obj, Symbol):
+        if id(obj) in seen:
+            out.append(("seen", obj.__class__.__name__))
+            return
+        seen.add(id(obj))
+        out.append((obj.__class__.__name__,))
+        for key in sorted(vars(obj)):
+            _walk(vars(obj)[key], out, seen)
+
+def parse(infilename, bulk_scan):
+    save = tokenizer._bulk_scan
+    tokenizer._bulk_scan = bulk_scan
+    try:
+        makefile = pymake.parse_makefile(infilename)
+    except (ParseError, NotImplementedError) as err:
+        return str(err)
+    finally:
+        tokenizer._bulk_scan = save
+
+    out = [makefile.makefile(), str(makefile)]
+    _walk(makefile.token_list, out, set())
+    return out
+
+def test_found_makefiles():
+    assert makefiles
+
+@pytest.mark.parametrize("infilename", makefiles)
+def test_makefiles(infilename):
+    assert parse(infilename, False) == parse(infilename, True)
+
+def test_option():
+    makefile = """
+FOO:=$(subst a,b,banana) # comment
+all: ; @echo $(FOO)
+"""
+    assert run.pymake_string(makefile, extra_args=("--no-bulk-scan",)) == "bbnbnb"
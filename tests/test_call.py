@@ -0,0 +1,94 @@
+# SPDX-License-Identifier: GPL-2.0
+# Copyright (C) 2014-2024 David Poole davep@mbuf.com david.poole@ericsson.com
+#
+# Test the $(call) function's arguments.
+
+import run
+
+def test_args():
+    makefile="""
+f=$(0):$(1):$2:$(3)
+$(info $(call f,a,b))
+$(info $(call f,a,b,c))
+@:;@:
+"""
+    s = run.pymake_string(makefile)
+    assert s == "f:a:b:\nf:a:b:c"
+
+def test_nested():
+    # an inner $(call) must not see the outer's extra arguments
+    makefile="""
+inner=[$0 $1 $2 $3]
+outer=$(call inner,x) $1 $2 $3
+$(info $(call outer,a,b,c))
+@:;@:
+"""
+    s = run.pymake_string(makefile)
+    assert s == "[inner x  ] a b c"
+
+def test_args_expanded_by_caller():
+    makefile="""
+swap=$(call pair,$2,$1)
+pair=$1,$2
+$(info $(call swap,a,b))
+@:;@:
+"""
+    s = run.pymake_string(makefile)
+    assert s == "b,a"
+
+def test_recursive():
+    # a variable can $(call) itself
+    makefile="""
+mkseq=$(if $(word $1,$2),$2,$(call mkseq,$1,$(firstword $2) $2))
+$(info $(words $(call mkseq,5,x)))
+@:;@:
+"""
+    s = run.pymake_string(makefile)
+    assert s == "5"
+
+def test_arg_functions():
+    makefile="""
+f=$(origin 1) $(flavor 1) $(value 1) $(origin 2)
+$(info $(call f,a))
+@:;@:
+"""
+    s = run.pymake_string(makefile)
+    assert s == "automatic simple a undefined"
+
+def test_memoize():
+    # memoized values that read the arguments must not leak between calls
+    makefile="""
+arg=<$1>
+f=$(arg)
+g=$(call f,$1)$(call f,$1$1)
+$(info $(call f,a) $(call f,b) $(call g,c) $(call g,d))
+$(info [$(arg)])
+@:;@:
+"""
+    s = run.pymake_string(makefile)
+    assert s == "<a> <b> <c><cc> <d><dd>\n[<>]"
+
+def test_eval_in_call():
+    # a variable made by $(eval) inside a $(call) is still there afterwards
+    makefile="""
+define-var=$(eval $1:=$2)
+$(call define-var,FOO,foo)
+$(info $(FOO))
+@:;@:
+"""
+    s = run.pymake_string(makefile)
+    assert s == "foo"
+
+def test_inner_scope_hides_arg():
+    # a variable defined inside the $(call) hides the argument
+    makefile="""
+f = $(foreach 1,x y,[$(1)])
+$(info $(call f,A))
+g = $1
+h = $(g) $(foreach 1,x,$(g)) $(g)
+$(info $(call h,A))
+$(foreach 1,B,$(info $(call g,A) $1))
+@:;@:
+"""
+    s = run.pymake_string(makefile)
+    assert s == "[x] [y]\nA x A\nA B"
@@ -0,0 +1,117 @@
+# SPDX-License-Identifier: GPL-2.0
+# Copyright (C) 2014-2024 David Poole davep@mbuf.com david.poole@ericsson.com
+#
+# Test Expression/VarRef compiled into closures.
+
+import pickle
+
+import pytest
+
+from pymake.symbol import *
+import pymake.symtable as symtable
+from pymake.error import InternalError
+
+# turn on internal behaviors that allow us to create literals without VCharString
+import pymake.symbol as symbol
+symbol._testing = True
+
+import run
+
+def _tree_walk(expr, symbol_table):
+    save = symbol._compile
+    symbol._compile = False
+    try:
+        return expr.eval(symbol_table)
+    finally:
+        symbol._compile = save
+
+def test_literals_folded():
+    symbol_table = symtable.SymbolTable()
+    expr = Expression([Literal("a"), Literal("b"), Literal("c")])
+    assert expr.folded == "abc"
+    assert expr.eval(symbol_table) == "abc"
+
+    # folded into the parent
+    expr = Expression([Literal("a"), Expression([Literal("b")]), VarRef([Literal("c")])])
+    assert expr.folded is None
+    assert expr.eval(symbol_table) == "ab"
+
+def test_fold_after_change():
+    # folding waits for the first use so a Literal changed before then is
+    # seen; changing it after is an error
+    symbol_table = symtable.SymbolTable()
+    space = Literal(" ")
+    expr = Expression([space, Literal("gcc")])
+    space.hide()
+    assert expr.eval(symbol_table) == "gcc"
+
+    with pytest.raises(InternalError):
+        space.hide()
+
+def test_static_name():
+    symbol_table = symtable.SymbolTable()
+    symbol_table.add("SRC", "a.c b.c")
+
+    ref = VarRef([Literal("SRC")])
+    assert ref.static_name == "SRC"
+    assert ref.static_lookup
+    assert ref.eval(symbol_table) == "a.c b.c"
+    assert _tree_walk(ref, symbol_table) == "a.c b.c"
+
+    # might be an abbreviated patsubst
+    ref = VarRef([Literal("SRC:.c=.o")])
+    assert not ref.static_lookup
+    assert ref.eval(symbol_table) == "a.o b.o"
+    assert _tree_walk(ref, symbol_table) == "a.o b.o"
+
+    ref = VarRef([VarRef([Literal("SRC")])])
+    assert ref.static_name is None
+    assert not ref.static_lookup
+
+def test_varref():
+    symbol_table = symtable.SymbolTable()
+    symbol_table.add("CC", "gcc")
+    symbol_table.add("N", "C")
+    expr = Expression([Literal("cc="), VarRef([Literal("CC")]), Literal(" "),
+                        VarRef([VarRef([Literal("N")]), Literal("C")]), Literal(";")])
+    assert expr.eval(symbol_table) == "cc=gcc gcc;"
+    assert _tree_walk(expr, symbol_table) == "cc=gcc gcc;"
+
+    # the closure isn't a snapshot of the variables
+    symbol_table.add("CC", "clang")
+    assert expr.eval(symbol_table) == "cc=clang clang;"
+
+def test_empty():
+    symbol_table = symtable.SymbolTable()
+    expr = Expression([])
+    assert expr.eval(symbol_table) == ""
+
+def test_pickle():
+    symbol_table = symtable.SymbolTable()
+    symbol_table.add("CC", "gcc")
+    expr = Expression([VarRef([Literal("CC")]), Literal(" -c")])
+    assert expr.eval(symbol_table) == "gcc -c"
+
+    expr2 = pickle.loads(pickle.dumps(expr))
+    assert expr2._fn is None
+    assert expr2.eval(symbol_table) == "gcc -c"
+
+def test_functions():
+    makefile="""
+SRC=a.c b.c
+OBJ=$(patsubst %.c,%.o,$(SRC))
+$(info $(OBJ) $(words $(OBJ)) $(SRC:.c=.h) $(foreach x,1 2,[$x]))
+@:;@:
+"""
+    s = run.pymake_string(makefile)
+    assert s == "a.o b.o 2 a.h b.h [1] [2]"
+
+def test_assign_leading_whitespace():
+    # the folded string must not keep the whitespace after the operator
+    makefile="""
+CC =    gcc -g 
+$(info >$(CC)<)
+@:;@:
+"""
+    s = run.pymake_string(makefile)
+    assert s == ">gcc -g <"
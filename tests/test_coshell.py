@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: GPL-2.0
+
+# test running commands with a long-lived shell (--shell-coprocess)
+
+import os
+import sys
+import subprocess
+
+import pytest
+
+import pymake.coshell as coshell
+import pymake.constants as constants
+
+import run
+
+@pytest.fixture
+def co():
+    co = coshell.Coprocess(dict(os.environ), ())
+    yield co
+    co.close()
+
+def test_exit_status(co):
+    assert co.run("true", co.env, False) == (0, None)
+    assert co.run("exit 3", co.env, False) == (3, None)
+    assert co.run("false", co.env, False) == (1, None)
+    # exit only leaves the subshell
+    assert co.run("true", co.env, False) == (0, None)
+
+def test_capture(co):
+    assert co.run("echo hello ; echo 'world'", co.env, True) == (0, "hello\nworld\n")
+    assert co.run("printf \"it's\"", co.env, True) == (0, "it's")
+
+def test_isolation(co):
+    co.run("FOO=bar ; set -e ; cd / ; trap 'echo trapped' EXIT", co.env, True)
+    assert co.run("echo ${FOO:-empty} $-", co.env, True)[1].split()[0] == "empty"
+    assert co.run("set -o | grep errexit", co.env, True)[1].split() == ["errexit", "off"]
+    assert co.run("pwd", co.env, True)[1].strip() == os.getcwd()
+
+def test_env(co):
+    env = dict(co.env)
+    env["PYMAKE_TEST"] = "it's a $test"
+    assert co.run("echo \"$PYMAKE_TEST\"", env, True)[1] == "it's a $test\n"
+
+    # and gone again
+    assert co.run("echo ${PYMAKE_TEST-unset}", co.env, True)[1] == "unset\n"
+
+    # remove something from the environment
+    env = dict(co.env)
+    env.pop("PATH")
+    assert co.run("echo ${PATH-unset}", env, True)[1] == "unset\n"
+
+def test_env_fallback(co):
+    # the shell can't export these names
+    env = dict(co.env)
+    env["foo-bar"] = "1"
+    assert co.run("true", env, False) is None
+
+def spawn(cmd_str, **kwargs):
+    # the same command run the usual way
+    return subprocess.run([constants.DEFAULT_SHELL, constants.DEFAULT_SHELLFLAGS, cmd_str],
+                universal_newlines=True, stdout=subprocess.PIPE, stderr=subprocess.PIPE, **kwargs)
+
+@pytest.mark.parametrize("cmd_str", (
+    "pymake_no_such_command",
+    "echo $0 ; pymake_no_such_command",
+    "cd /pymake/no/such/dir",
+    "echo hello >&2 ; exit 2",
+    "set -u ; echo $pymake_undefined",
+))
+def test_same_as_sh_c(capfd, cmd_str):
+    # what the user sees (stdout, stderr, $0, exit status) is the same as
+    # with "sh -c"
+    p = spawn(cmd_str)
+
+    co = coshell.Coprocess(dict(os.environ), ())
+    try:
+        exit_code, stdout = co.run(cmd_str, co.env, True)
+    finally:
+        co.close()
+    assert (exit_code, stdout) == (p.returncode, p.stdout)
+    assert capfd.readouterr().err == p.stderr
+
+@pytest.mark.parametrize("cmd_str", (
+    # doesn't parse
+    "echo 'unterminated",
+    "if true ; then echo x",
+    # would end the function early or behave differently in a function
+    "true ; } ; echo x",
+    "return 3",
+    "local x=1",
+    "echo $LINENO",
+))
+def test_fallback(capfd, cmd_str):
+    # given to a spawned shell
+    cmd = [constants.DEFAULT_SHELL, constants.DEFAULT_SHELLFLAGS, cmd_str]
+    if coshell.can_run(cmd, cmd_str):
+        co = coshell.Coprocess(dict(os.environ), ())
+        try:
+            assert co.run(cmd_str, co.env, True) is None
+        finally:
+            co.close()
+    assert capfd.readouterr() == ("", "")
+
+def test_stdin(tmp_path):
+    # the commands read our stdin
+    infile = tmp_path / "in"
+    infile.write_text("line1\nline2\n")
+    script = (
+        "import os, pymake.coshell as coshell\n"
+        "co = coshell.Coprocess(dict(os.environ), ())\n"
+        "print(co.run('read x ; echo $x', co.env, True))\n"
+        "print(co.run('read x ; echo $x', co.env, True))\n"
+        "co.close()\n"
+    )
+    with open(infile) as f:
+        p = subprocess.run([sys.executable, "-c", script], stdin=f, stdout=subprocess.PIPE,
+                universal_newlines=True, check=True, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    assert p.stdout.split("\n")[:2] == ["(0, 'line1\\n')", "(0, 'line2\\n')"]
+
+makefile = """
+FOO:=bar
+export FOO
+X:=$(shell echo $$FOO)
+all: a b
+	@echo $(X) $$FOO
+	@cd / ; pwd
+	@FOO=qq ; echo $$FOO
+	@echo $$FOO
+	@echo $$MAKEFLAGS | wc -w
+a b:
+	@echo $@
+	-@exit 3
+"""
+
+@pytest.mark.parametrize("extra_args", ((), ("-j", "2")))
+def test_makefile(extra_args):
+    expect = run.pymake_string(makefile, extra_args=extra_args)
+    p = run.pymake_string(makefile, extra_args=("--shell-coprocess",) + extra_args)
+    assert p == expect
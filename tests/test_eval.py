@@ -47,3 +47,36 @@ endif
 @:;@:
 """
     run.simple_test(makefile)
+
+def test_eval_template():
+    # the same text eval'd again (from the $(eval) parse cache)
+    makefile="""
+all: a b c
+rule=$(1): ; @echo $$@ $(2)
+$(foreach t,a b a b,$(eval $(call rule,$t,x)))
+$(foreach t,c c,$(eval $(call rule,$t,y)))
+"""
+    s = run.pymake_string(makefile)
+    assert s == "a x\nb x\nc y"
+
+def test_eval_parse_cache():
+    import pymake.pymake
+    import pymake.functions as functions
+
+    save = functions._eval_cache_max
+    functions._eval_cache_max = 2
+    functions._eval_cache.clear()
+    try:
+        hits, misses = functions.eval_cache_stats()
+        stmts = functions._eval_parse("FOO:=1\n")
+        assert functions._eval_parse("FOO:=1\n") is stmts
+        assert functions.eval_cache_stats() == (hits+1, misses+1)
+
+        # least recently used is thrown away
+        functions._eval_parse("BAR:=1\n")
+        functions._eval_parse("FOO:=1\n")
+        functions._eval_parse("BAZ:=1\n")
+        assert list(functions._eval_cache.keys()) == ["FOO:=1\n", "BAZ:=1\n"]
+    finally:
+        functions._eval_cache_max = save
+        functions._eval_cache.clear()
@@ -0,0 +1,43 @@
+# SPDX-License-Identifier: GPL-2.0
+# Copyright (C) 2014-2024 David Poole davep@mbuf.com david.poole@ericsson.com
+#
+# Test $(foreach)'s loop variable.
+
+import run
+
+def test_simple_text():
+    # text that only uses the loop variable
+    makefile="""
+L:=a b c
+$(info [$(foreach x,$(L),$x)])
+$(info [$(foreach x,$(L),obj/$(x).o)])
+$(info [$(foreach x,$(L),$x-$x)])
+$(info [$(foreach x,$(L),lit)])
+$(info [$(foreach x,,$x)])
+@:;@:
+"""
+    s = run.pymake_string(makefile)
+    assert s == "[a b c]\n[obj/a.o obj/b.o obj/c.o]\n[a-a b-b c-c]\n[lit lit lit]\n[]"
+
+def test_loop_var():
+    # the loop variable is visible to other variables and is undefined after
+    makefile="""
+y=$x!
+$(info [$(foreach x,a b c,$y)])
+$(info [$(foreach x,a b,$(foreach y,1 2,$x$y))])
+$(info [$(origin x)] [$y])
+@:;@:
+"""
+    s = run.pymake_string(makefile)
+    assert s == "[a! b! c!]\n[a1 a2 b1 b2]\n[undefined] [!]"
+
+def test_loop_var_restored():
+    # "If var was undefined before the foreach function call, it is undefined
+    # after the call." and a defined var gets its old value back
+    makefile="""
+x:=old
+$(info [$(foreach x,a b,$(eval z:=$$x)$z)] $x)
+@:;@:
+"""
+    s = run.pymake_string(makefile)
+    assert s == "[a b] old"
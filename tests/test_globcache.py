@@ -0,0 +1,79 @@
+# SPDX-License-Identifier: GPL-2.0
+# Copyright (C) 2014-2024 David Poole davep@mbuf.com david.poole@ericsson.com
+#
+# test the $(wildcard) directory listing cache
+
+import os
+import glob
+
+import pytest
+
+import pymake.globcache as globcache
+import pymake.statcache as statcache
+
+import run
+
+@pytest.fixture
+def tree(tmp_path):
+    for d in ("a/b", "c", ".hidden"):
+        (tmp_path / d).mkdir(parents=True)
+    for f in ("x.c", "y.c", ".z.c", "a/1.c", "a/b/2.c", "c/3.h", ".hidden/4.c"):
+        (tmp_path / f).write_text("")
+    os.symlink("nowhere", tmp_path / "dangling")
+    os.symlink("a", tmp_path / "link")
+
+    cwd = os.getcwd()
+    os.chdir(tmp_path)
+    yield tmp_path
+    os.chdir(cwd)
+
+def test_same_as_glob(tree):
+    patterns = ("*.c", "*", "*/", "*/*.c", "*/*/*.c", ".*", "x.c", "nope.c",
+        "a/", "a", "dangling", "link/*.c", "./*.c", "a/../*.c", "[xy].c",
+        "?.c", "nodir/*.c", "a//b/*", str(tree)+"/*.c", "*/b", ".hidden/*",
+        "x.c/", "x.c/*")
+    for p in patterns:
+        assert globcache.glob(p) == glob.glob(p), p
+
+def test_cached(tree):
+    assert globcache.glob("c/*") == ["c/3.h"]
+
+    # changes are not seen until invalidated
+    (tree / "c" / "4.h").write_text("")
+    assert globcache.glob("c/*") == ["c/3.h"]
+
+    # a recipe for c/4.h has run
+    statcache.StatCache().invalidate("c/4.h")
+    assert sorted(globcache.glob("c/*")) == ["c/3.h", "c/4.h"]
+
+    (tree / "c" / "5.h").write_text("")
+    globcache.invalidate_all()
+    assert len(globcache.glob("c/*")) == 3
+
+def test_new_dir(tree):
+    assert globcache.glob("d/*") == []
+    (tree / "d").mkdir()
+    (tree / "d" / "foo").write_text("")
+    globcache.invalidate("d")
+    assert globcache.glob("d/*") == ["d/foo"]
+
+def test_disabled(tree):
+    assert globcache.glob("c/*") == ["c/3.h"]
+    globcache.enable(False)
+    try:
+        (tree / "c" / "4.h").write_text("")
+        assert sorted(globcache.glob("c/*")) == ["c/3.h", "c/4.h"]
+    finally:
+        globcache.enable()
+
+def test_shell_invalidates():
+    makefile="""
+$(shell rm -rf globcache.tmp)
+$(info 1 [$(wildcard globcache.tmp/*)])
+$(shell mkdir globcache.tmp && touch globcache.tmp/a)
+$(info 2 [$(wildcard globcache.tmp/*)])
+$(shell rm -rf globcache.tmp)
+@:;@:
+"""
+    s = run.pymake_string(makefile)
+    assert s == "1 []\n2 [globcache.tmp/a]"
@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: GPL-2.0
+
+# test running trivial commands without a shell
+
+import os
+import subprocess
+
+import pytest
+
+import pymake.inproc as inproc
+import pymake.constants as constants
+
+import run
+
+env = dict(os.environ)
+
+def argv(s):
+    return [constants.DEFAULT_SHELL, constants.DEFAULT_SHELLFLAGS, s]
+
+def sh(s):
+    p = subprocess.run(argv(s), stdout=subprocess.PIPE, universal_newlines=True)
+    return p.returncode, p.stdout
+
+@pytest.mark.parametrize("s", (
+    "echo", "echo hello world", "echo   lots   of   spaces", "echo -n foo bar",
+    "echo -n", ":", ": ignored args", "true", "false", "true foo",
+))
+def test_same_as_shell(s):
+    assert inproc.run(argv(s), s, env, True) == sh(s)
+
+@pytest.mark.parametrize("s", (
+    "echo $HOME", "echo 'quoted'", "echo \"quoted\"", "echo foo > bar",
+    "echo foo | cat", "echo foo ; echo bar", "echo foo && echo bar",
+    "echo *", "echo ~", "echo a\\\\nb", "echo -e foo", "echo `date`",
+    "FOO=bar echo", "mkdir foo", "mkdir -m 755 -p foo", "rm foo", "rm -rf foo",
+    "touch -d yesterday foo", "ls", "", "   ", "echo foo\necho bar",
+))
+def test_not_simple(s):
+    assert inproc.run(argv(s), s, env, True) is None
+
+def test_other_shell():
+    s = "echo foo"
+    assert inproc.run(["/bin/bash", "-c", s], s, env, True) is None
+    assert inproc.run([constants.DEFAULT_SHELL, "-e", "-c", s], s, env, True) is None
+
+def test_files(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+
+    assert inproc.run(argv("mkdir -p a/b/c d"), "mkdir -p a/b/c d", env, False) == (0, None)
+    assert os.path.isdir("a/b/c") and os.path.isdir("d")
+    # already exists
+    assert inproc.run(argv("mkdir -p a/b/c d"), "mkdir -p a/b/c d", env, False) == (0, None)
+
+    assert inproc.run(argv("touch a/foo bar"), "touch a/foo bar", env, False) == (0, None)
+    assert os.path.isfile("a/foo") and os.path.isfile("bar")
+
+    os.utime("bar", (1000, 1000))
+    assert inproc.run(argv("touch bar d"), "touch bar d", env, False) == (0, None)
+    assert os.path.getmtime("bar") > 1000
+
+    assert inproc.run(argv("rm -f a/foo bar nope"), "rm -f a/foo bar nope", env, False) == (0, None)
+    assert not os.path.exists("a/foo") and not os.path.exists("bar")
+
+def test_errors_go_to_shell(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    os.mkdir("dir")
+    open("file", "w").close()
+
+    # the shell's commands print the error messages
+    assert inproc.run(argv("rm -f dir"), "rm -f dir", env, False) is None
+    assert inproc.run(argv("mkdir -p file/foo"), "mkdir -p file/foo", env, False) is None
+    assert inproc.run(argv("touch nope/foo"), "touch nope/foo", env, False) is None
+
+def test_count():
+    n = inproc.forks_avoided()
+    inproc.run(argv("true"), "true", env, False)
+    inproc.run(argv("ls"), "ls", env, False)
+    assert inproc.forks_avoided() == n + 1
+
+def test_makefile(tmp_path):
+    makefile = """
+X:=$(shell echo hello world)
+all: out/foo
+	@echo $(X)
+	@echo -n no newline
+	@echo
+	-@rm -f out
+	@rm -f out/foo
+	@:
+out/foo:
+	@mkdir -p out
+	@touch $@
+	@echo made $@
+"""
+    stdout, stderr = run.pymake_string(makefile, extra_args=("-C", str(tmp_path)),
+                        flags=run.FLAG_OUTPUT_STDOUT|run.FLAG_OUTPUT_STDERR)
+    assert stdout == "made out/foo\nhello world\nno newline"
+    # the shell's rm complained
+    assert "rm: cannot remove 'out'" in stderr
+    assert not os.path.exists(tmp_path / "out" / "foo")
+
+def test_path_wrapper(tmp_path):
+    # a makefile's own mkdir (ahead of the system's in PATH) is run
+    bindir = tmp_path / "bin"
+    bindir.mkdir()
+    for name in ("mkdir", "touch", "rm", "echo"):
+        wrapper = bindir / name
+        wrapper.write_text("#!/bin/sh\necho wrapped %s \"$@\"\n" % name)
+        wrapper.chmod(0o755)
+
+    makefile = """
+export PATH:=%s:$(PATH)
+all:
+	@mkdir -p foo
+	@touch foo
+	@rm -f foo
+	@echo builtin
+""" % bindir
+    p = run.pymake_string(makefile, extra_args=("-C", str(tmp_path)))
+    # echo is built into the shell; PATH doesn't matter
+    assert p.split("\n") == ["wrapped mkdir -p foo", "wrapped touch foo", "wrapped rm -f foo", "builtin"]
+    assert not os.path.exists(tmp_path / "foo")
+
+    # relative directory in PATH
+    wrapped = dict(env, PATH="bin:" + env["PATH"])
+    assert inproc.run(argv("mkdir -p foo"), "mkdir -p foo", wrapped, False) is None
+
+@pytest.mark.parametrize("s", (
+    "echo a\u00a0b", "echo a\u2003b", "echo a\x0bb", "echo a\x0cb", "echo \ta\t b",
+))
+def test_words(s):
+    # only space and tab separate words
+    assert inproc.run(argv(s), s, env, True) == sh(s)
+
+def test_disabled(monkeypatch):
+    monkeypatch.setattr(inproc, "_enabled", True)
+    inproc.enable(False)
+    assert inproc.run(argv("true"), "true", env, False) is None
+
+    makefile = """
+all:
+	@echo hello
+"""
+    assert run.pymake_string(makefile, extra_args=("--no-inproc-commands",)) == "hello"
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: GPL-2.0
+
+# test running recipes in parallel (-j N) and -k
+
+import time
+
+import pytest
+
+import run
+
+makefile = """
+all: a b c
+	@echo all
+a: d
+	@sleep 1 ; echo a
+b: d
+	@sleep 1 ; echo b
+c:
+	@sleep 1 ; echo c
+d:
+	@echo $@
+"""
+
+def test_parallel():
+    start = time.monotonic()
+    p = run.pymake_string(makefile, extra_args=('-j', '4'))
+    elapsed = time.monotonic() - start
+
+    lines = p.split("\n")
+    # shared prereq 'd' is built exactly once, before everything else
+    assert lines[0] == "d"
+    assert sorted(lines[1:4]) == ["a", "b", "c"]
+    assert lines[4] == "all"
+    assert len(lines) == 5
+
+    # serial would take at least 3 seconds
+    assert elapsed < 2.5, elapsed
+
+def test_jobs_one():
+    # -j1 through the scheduler is the same as serial
+    p = run.pymake_string(makefile, extra_args=('-j', '1', '-k'))
+    assert p.split("\n") == ["d", "a", "b", "c", "all"]
+
+def test_target_specific():
+    makefile = """
+FOO:=foo
+all: a b
+	@echo all $(FOO)
+a: FOO:=bar
+a:
+	@echo $@ $(FOO)
+b:
+	@echo $@ $(FOO)
+"""
+    p = run.pymake_string(makefile, extra_args=('-j', '2'))
+    lines = p.split("\n")
+    assert sorted(lines[0:2]) == ["a bar", "b foo"]
+    assert lines[2] == "all foo"
+
+def test_error_stops():
+    makefile = """
+all: a b
+	@echo all
+a:
+	@exit 1
+b: a
+	@echo b
+"""
+    err = run.pymake_should_fail(makefile, extra_args=('-j', '4'))
+    assert "Error 1" in err
+
+def test_keep_going():
+    makefile = """
+all: a b
+	@echo all
+a:
+	@exit 1
+b:
+	@echo b is built >&2
+"""
+    err = run.pymake_should_fail(makefile, extra_args=('-k',))
+    # 'b' doesn't depend on 'a' so is still built; 'all' is not
+    assert "b is built" in err
+    assert "Target 'all' not remade because of errors." in err
+
+def test_echo_lines_whole():
+    # the command echo of parallel Jobs comes out as whole lines
+    targets = ["t%d" % i for i in range(40)]
+    makefile = "all: %s\n" % " ".join(targets)
+    makefile += "%s:\n\ttrue %s\n" % (" ".join(targets), "x" * 200)
+    p = run.pymake_string(makefile, extra_args=('-j', '8'))
+    assert p.split("\n") == ["true " + "x" * 200] * 40
+
+@pytest.mark.parametrize("jobs", ("1", "2"))
+def test_expand_before_run(tmp_path, jobs):
+    # every line of a recipe is expanded before the first one runs (with or
+    # without -j)
+    makefile = """
+all:
+	@echo one > %s
+	@echo [$(shell cat %s 2>/dev/null)]
+""" % (tmp_path / "out", tmp_path / "out")
+    for fn in (run.gnumake_string, run.pymake_string):
+        (tmp_path / "out").unlink(missing_ok=True)
+        args = ('-j', jobs) if jobs != "1" else ()
+        assert fn(makefile, extra_args=args) == "[]"
+
+def test_submake_ignored():
+    # '-' ignores a failed sub-make (with or without -j)
+    makefile = """
+all:
+	-@$(MAKE) -f $(firstword $(MAKEFILE_LIST)) fail
+	@echo after
+fail:
+	@exit 3
+"""
+    for args in ((), ('-j', '2')):
+        out, err = run.pymake_string(makefile, extra_args=args,
+                        flags=run.FLAG_OUTPUT_STDOUT|run.FLAG_OUTPUT_STDERR)
+        assert out == "after"
+        assert "(ignored)" in err
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: GPL-2.0
+
+# test the GNU Make jobserver
+
+import sys
+import os
+import time
+import shutil
+import subprocess
+
+import pytest
+
+import pymake.jobserver as jobserver
+
+import run
+
+@pytest.mark.parametrize("style", ("fifo", "pipe"))
+def test_tokens(style):
+    server = jobserver.create(3, style)
+    try:
+        # -j3 means 2 tokens (plus our implicit job slot)
+        t1 = server.try_acquire()
+        t2 = server.try_acquire()
+        assert t1 == b'+' and t2 == b'+'
+        assert server.try_acquire() is None
+        assert server.held == 2
+
+        server.release(t1)
+        assert server.held == 1
+        t1 = server.try_acquire()
+        assert t1 == b'+'
+        server.release(t1)
+        server.release(t2)
+        assert server.held == 0
+    finally:
+        server.close()
+
+    if style == "fifo":
+        assert not os.path.exists(server.fifo_path)
+
+def test_makeflags_fifo():
+    server = jobserver.create(2, "fifo")
+    try:
+        client, jobs = jobserver.from_makeflags("ks -j2 --jobserver-auth=" + server.auth)
+        assert jobs == 2
+        assert client.auth == server.auth
+
+        # tokens are shared
+        t = client.try_acquire()
+        assert t == b'+'
+        assert server.try_acquire() is None
+        client.release(t)
+        assert server.try_acquire() == b'+'
+        client.close()
+    finally:
+        server.close()
+
+def test_makeflags_pipe():
+    read_fd, write_fd = os.pipe()
+    try:
+        os.write(write_fd, b'+')
+        for flag in ("--jobserver-auth", "--jobserver-fds"):
+            client, jobs = jobserver.from_makeflags(" -j4 %s=%d,%d" % (flag, read_fd, write_fd))
+            assert jobs == 4
+            t = client.try_acquire()
+            assert t == b'+'
+            client.release(t)
+    finally:
+        os.close(read_fd)
+        os.close(write_fd)
+
+def test_makeflags_no_jobserver():
+    client, jobs = jobserver.from_makeflags("ks")
+    assert client is None
+    assert jobs is None
+
+def test_makeflags_closed_fds():
+    # the parent make didn't pass us the pipe
+    read_fd, write_fd = os.pipe()
+    os.close(read_fd)
+    os.close(write_fd)
+    client, jobs = jobserver.from_makeflags("-j4 --jobserver-auth=%d,%d" % (read_fd, write_fd))
+    assert client is None
+    assert jobs == 1
+
+makefile = """
+all: a b c d
+a b c d:
+	@sleep 1 ; echo $@
+"""
+
+@pytest.mark.parametrize("style", ("fifo", "pipe"))
+def test_advertise(style):
+    p = run.pymake_string("""
+all:
+	@echo $$MAKEFLAGS
+""", extra_args=('-j', '3', '--jobserver-style=' + style))
+    assert "-j3" in p.split()
+    auth = [w for w in p.split() if w.startswith("--jobserver-auth=")]
+    assert len(auth) == 1
+    if style == "fifo":
+        assert auth[0].startswith("--jobserver-auth=fifo:")
+
+@pytest.mark.skipif(shutil.which("make") is None, reason="needs GNU Make")
+def test_gnu_make_parent(tmp_path):
+    # pymake is a jobserver client beneath GNU Make -j2
+    infilename = tmp_path / "sub.mk"
+    infilename.write_text(makefile)
+
+    topfile = tmp_path / "top.mk"
+    topfile.write_text("all:\n\t+@%s -m pymake -f %s\n" % (sys.executable, infilename))
+
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.path.dirname(os.path.dirname(jobserver.__file__))
+    env.pop("MAKEFLAGS", None)
+
+    start = time.monotonic()
+    p = subprocess.run(("make", "-j2", "-f", str(topfile)), env=env, check=True,
+            stdout=subprocess.PIPE, stderr=subprocess.PIPE, universal_newlines=True)
+    elapsed = time.monotonic() - start
+
+    assert sorted(p.stdout.split()) == ["a", "b", "c", "d"]
+    # 4 jobs, 2 at a time
+    assert 1.9 < elapsed < 3.5, elapsed
+
+@pytest.mark.skipif(shutil.which("make") is None, reason="needs GNU Make")
+def test_gnu_make_child(tmp_path):
+    # GNU Make is a jobserver client beneath pymake -j2
+    # (older GNU Make only understands the pipe style)
+    infilename = tmp_path / "sub.mk"
+    infilename.write_text(makefile)
+
+    start = time.monotonic()
+    p = run.pymake_string("all:\n\t+@make -f %s\n" % infilename,
+            extra_args=('-j', '2', '--jobserver-style=pipe'))
+    elapsed = time.monotonic() - start
+
+    assert sorted(p.split()) == ["a", "b", "c", "d"]
+    assert 1.9 < elapsed < 3.5, elapsed
+
+def test_submake_shares_jobserver(tmp_path):
+    # a pymake sub-make (run in the same process) uses the top make's -j
+    infilename = tmp_path / "sub.mk"
+    infilename.write_text(makefile)
+
+    start = time.monotonic()
+    p = run.pymake_string("all:\n\t+@$(MAKE) -f %s\n" % infilename, extra_args=('-j', '4'))
+    elapsed = time.monotonic() - start
+
+    assert sorted(p.split()) == ["a", "b", "c", "d"]
+    assert elapsed < 2.5, elapsed
+
+def test_pipe_recursive_only():
+    # a pipe style jobserver is only given to '+' commands (same as GNU Make)
+    check = r"""r=$${MAKEFLAGS##*--jobserver-auth=}; r=$${r%%,*}; if [ -e /proc/self/fd/$$r ]; then echo open; else echo closed; fi"""
+    makefile = "all: a b\na:\n\t@%s\nb:\n\t+@%s\n" % (check, check)
+    p = run.pymake_string(makefile, extra_args=('-j', '2', '--jobserver-style=pipe'))
+    assert sorted(p.split()) == ["closed", "open"]
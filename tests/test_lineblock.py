@@ -0,0 +1,74 @@
+# SPDX-License-Identifier: GPL-2.0
+# Copyright (C) 2014-2024 David Poole davep@mbuf.com david.poole@ericsson.com
+#
+# Test the parsed statements of a conditional's LineBlock are cached.
+
+import pymake.pymake as pymake
+import pymake.source as source
+import pymake.rules as rules
+from pymake.symbol import *
+from pymake.symtable import SymbolTable
+
+import run
+
+def _parse(s):
+    src = source.SourceString(s)
+    return pymake.parse_makefile_from_src(src)
+
+def test_cached():
+    makefile = _parse("""
+ifdef FOO
+BAR:=1
+  ifeq ($(FOO),1)
+    BAZ:=1
+  endif
+endif
+""")
+    cond = makefile.token_list[0]
+    assert isinstance(cond, ConditionalBlock)
+    block = cond.cond_blocks[0][0]
+    assert isinstance(block, LineBlock)
+
+    symtable = SymbolTable()
+    statement_list = block.eval(symtable)
+    assert isinstance(statement_list[0], AssignmentExpression)
+    assert block.eval(symtable) is statement_list
+
+    # nested conditional's expression is parsed (once) when it's eval'd
+    nested = cond.cond_blocks[0][1]
+    assert isinstance(nested, ConditionalBlock)
+    symtable.add("FOO", "1")
+    blocks = nested.eval(symtable)
+    assert nested.cond_exprs[0].expr1 is not None
+    assert blocks[0].eval(symtable) is blocks[0].eval(symtable)
+
+def test_rule_reexecuted():
+    # executing the same statements again must not pile more recipes onto
+    # the RuleExpression
+    makefile = _parse("""
+all: ; @echo one
+	@echo two
+""")
+    rule_expr = makefile.token_list[0]
+    assert len(rule_expr.recipe_list) == 1
+
+    for _ in range(2):
+        symtable = SymbolTable()
+        rulesdb = rules.RuleDB()
+        pymake.execute_statement_list(makefile.token_list, [], rulesdb, symtable)
+        assert len(rulesdb.get("all").recipe_list) == 2
+        assert len(rule_expr.recipe_list) == 1
+
+def test_recipe_in_conditional():
+    makefile = """
+FOO:=1
+all:
+ifdef FOO
+	@echo foo
+else
+	@echo no foo
+endif
+	@echo done
+"""
+    s = run.pymake_string(makefile)
+    assert s == "foo\ndone"
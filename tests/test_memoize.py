@@ -0,0 +1,113 @@
+# SPDX-License-Identifier: GPL-2.0
+# Copyright (C) 2014-2024 David Poole davep@mbuf.com david.poole@ericsson.com
+#
+# Test memoized recursively expanded variables.
+
+from pymake.symbol import *
+import pymake.symtable as symtable
+
+# turn on internal behaviors that allow us to create literals without VCharString
+import pymake.symbol as symbol
+symbol._testing = True
+
+import run
+
+def test_memo_hit():
+    symbol_table = symtable.SymbolTable()
+    symbol_table.add("CC", "gcc")
+    symbol_table.add("CFLAGS", Expression([VarRef([Literal("CC")]), Literal(" -g")]))
+
+    assert symbol_table.fetch("CFLAGS") == "gcc -g"
+    entry = symbol_table.find("CFLAGS")
+    assert entry._memo is not None
+    assert entry._memo[1] == {"CC", "CFLAGS"}
+    assert symbol_table.fetch("CFLAGS") == "gcc -g"
+
+def test_memo_invalidate():
+    symbol_table = symtable.SymbolTable()
+    symbol_table.add("CC", "gcc")
+    symbol_table.add("CC_CMD", Expression([VarRef([Literal("CC")])]))
+    symbol_table.add("CFLAGS", Expression([VarRef([Literal("CC_CMD")]), Literal(" -g")]))
+    assert symbol_table.fetch("CFLAGS") == "gcc -g"
+
+    # indirect dependency
+    symbol_table.add("CC", "clang")
+    assert symbol_table.find("CFLAGS")._memo is None
+    assert symbol_table.fetch("CFLAGS") == "clang -g"
+
+    symbol_table.append("CC", "-m32")
+    assert symbol_table.fetch("CFLAGS") == "clang -m32 -g"
+
+    symbol_table.append("CFLAGS", Expression([Literal("-O2")]))
+    assert symbol_table.fetch("CFLAGS") == "clang -m32 -g -O2"
+
+    # hide then unhide
+    symbol_table.push_layer()
+    symbol_table.add("CC", "tcc")
+    assert symbol_table.fetch("CFLAGS") == "tcc -g -O2"
+    symbol_table.pop_layer()
+    assert symbol_table.fetch("CFLAGS") == "clang -m32 -g -O2"
+
+    symbol_table.undefine("CC")
+    assert symbol_table.fetch("CFLAGS") == " -g -O2"
+
+    # defining a previously undefined variable
+    symbol_table.add("CC", "cc")
+    assert symbol_table.fetch("CFLAGS") == "cc -g -O2"
+
+def test_memo_disabled():
+    symbol_table = symtable.SymbolTable()
+    symbol_table.add("FOO", Expression([Literal("foo")]))
+    save = symtable._memoize
+    symtable._memoize = False
+    try:
+        assert symbol_table.fetch("FOO") == "foo"
+        assert symbol_table.find("FOO")._memo is None
+    finally:
+        symtable._memoize = save
+
+def test_automatic():
+    makefile="""
+OUT=-o $@
+all: a b
+a b: ; @echo $(OUT)
+"""
+    s = run.pymake_string(makefile)
+    assert s == "-o a\n-o b"
+
+def test_foreach_call():
+    makefile="""
+item=<$x>
+items=$(foreach x,1 2 3,$(item))
+fn=[$1$(item)]
+$(info $(items) $(items))
+$(info $(call fn,a) $(call fn,b))
+x=4
+$(info $(item))
+@:;@:
+"""
+    s = run.pymake_string(makefile)
+    assert s == "<1> <2> <3> <1> <2> <3>\n[a<>] [b<>]\n<4>"
+
+def test_side_effects():
+    # anything with a side effect must run every time
+    makefile="""
+msg=$(info hello)
+count=$(shell echo x >> count.txt)$(shell wc -l < count.txt)
+$(msg)$(msg)
+$(info $(count) $(count))
+$(shell rm count.txt)
+@:;@:
+"""
+    s = run.pymake_string(makefile)
+    assert s == "hello\nhello\n1 2"
+
+def test_target_specific():
+    makefile="""
+FLAGS=-g $(EXTRA)
+all: a b
+a: EXTRA=-O2
+a b: ; @echo $@ $(FLAGS)
+"""
+    s = run.pymake_string(makefile)
+    assert s == "a -g -O2\nb -g"
@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: GPL-2.0
+
+# test the --parse-cache on-disk cache of parsed makefiles
+
+import os
+import pickle
+
+import pytest
+
+import pymake.pymake as pymake
+import pymake.parsecache as parsecache
+import pymake.source as source
+
+makefile = """\
+FOO:=foo
+BAR=$(FOO) bar
+ifdef FOO
+all: ; @echo $(BAR)
+endif
+"""
+
+@pytest.fixture
+def cache_dir(tmp_path):
+    parsecache.set_cache_dir(str(tmp_path / "cache"))
+    yield parsecache.get_cache_dir()
+    parsecache.set_cache_dir(None)
+
+def write_makefile(tmp_path, s):
+    infilename = str(tmp_path / "Makefile")
+    with open(infilename, "w") as outfile:
+        outfile.write(s)
+    return infilename
+
+def test_disabled(tmp_path):
+    assert parsecache.get_cache_dir() is None
+    infilename = write_makefile(tmp_path, makefile)
+    src = source.SourceFile(infilename)
+    src.load()
+    assert parsecache.load(src) is None
+
+def test_hit(tmp_path, cache_dir):
+    infilename = write_makefile(tmp_path, makefile)
+
+    m1 = pymake.parse_makefile(infilename)
+    assert len(os.listdir(cache_dir)) == 1
+
+    src = source.SourceFile(infilename)
+    src.load()
+    cached = parsecache.load(src)
+    assert cached is not None
+
+    m2 = pymake.parse_makefile(infilename)
+    assert m2.makefile() == m1.makefile()
+    assert str(m2) == str(m1)
+    assert m2.get_pos() == m1.get_pos()
+
+def test_changed_file(tmp_path, cache_dir):
+    infilename = write_makefile(tmp_path, makefile)
+    pymake.parse_makefile(infilename)
+
+    infilename = write_makefile(tmp_path, makefile + "BAZ=baz\n")
+    m = pymake.parse_makefile(infilename)
+    assert "BAZ" in m.makefile()
+    assert len(os.listdir(cache_dir)) == 2
+
+def test_corrupt_cache(tmp_path, cache_dir):
+    infilename = write_makefile(tmp_path, makefile)
+    m1 = pymake.parse_makefile(infilename)
+
+    for name in os.listdir(cache_dir):
+        with open(os.path.join(cache_dir, name), "wb") as outfile:
+            outfile.write(b"this is not a pickle")
+
+    # unreadable cache file is ignored and replaced
+    m2 = pymake.parse_makefile(infilename)
+    assert m2.makefile() == m1.makefile()
+
+    for name in os.listdir(cache_dir):
+        with open(os.path.join(cache_dir, name), "rb") as infile:
+            statement_list, warnings = pickle.load(infile)
+            assert isinstance(statement_list, list)
+
+def test_no_eval_strings(cache_dir):
+    # $(eval) text is not cached
+    src = source.SourceString("FOO=bar\n")
+    pymake.parse_makefile_from_src(src)
+    assert not os.listdir(cache_dir)
+
+def test_parse_error(tmp_path, cache_dir):
+    # a failed parse stops collecting warnings for the cache
+    import pymake.error as error
+
+    infilename = write_makefile(tmp_path, "endif\n")
+    with pytest.raises(error.ParseError):
+        pymake.parse_makefile(infilename)
+    assert error._warning_log is None
+    assert not os.listdir(cache_dir)
+
+    # the next makefile's cache entry has only its own warnings
+    error.warning_message(("x", (0,0)), "not from a makefile")
+    infilename = write_makefile(tmp_path, makefile)
+    pymake.parse_makefile(infilename)
+    for name in os.listdir(cache_dir):
+        with open(os.path.join(cache_dir, name), "rb") as infile:
+            statement_list, warnings = pickle.load(infile)
+            assert warnings == []
@@ -0,0 +1,185 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: GPL-2.0
+
+# test the implicit rule search with pattern rules
+
+import os
+
+import pytest
+
+import pymake.rules as rules
+import pymake.symbol as symbol
+
+import run
+
+# the tests run pymake in a temporary directory
+env = {"PYTHONPATH": os.path.dirname(os.path.dirname(os.path.abspath(__file__)))}
+
+def make_index(graph):
+    # graph is a list of (target pattern, [prereq patterns])
+    rule_list = [rules.Rule(target, prereq_list, symbol.RecipeList([]), None, ("test",(0,0)))
+                    for target, prereq_list in graph]
+    return rules._PatternRuleIndex(rule_list)
+
+def candidates(index, target):
+    return [(rule.target, stem, prereq_list) for rule, stem, prereq_list in index.candidates(target)]
+
+def test_index_suffix():
+    index = make_index( (("%.o", ["%.c"]), ("%.a", ["%.o"]), ("%.o", ["%.s", "hdr.h"])) )
+    assert candidates(index, "foo.o") == [("%.o", "foo", ["foo.c"]), ("%.o", "foo", ["foo.s", "hdr.h"])]
+    assert candidates(index, "foo.a") == [("%.a", "foo", ["foo.o"])]
+    assert candidates(index, "foo.h") == []
+    assert candidates(index, ".o") == []
+
+def test_index_directory():
+    index = make_index( (("%.o", ["%.c"]), ("lib%.o", ["lib%.c", "lib.h"]), ("obj/%.o", ["src/%.c"])) )
+
+    # target pattern without a slash matches the file name; the directory is
+    # put back on the prereqs (with a '%') and the stem
+    assert candidates(index, "sub/libd.o") == [
+        ("lib%.o", "sub/d", ["sub/libd.c", "lib.h"]),
+        ("%.o", "sub/libd", ["sub/libd.c"]),
+    ]
+    # shortest stem first
+    assert candidates(index, "obj/foo.o") == [
+        ("%.o", "obj/foo", ["obj/foo.c"]),
+        ("obj/%.o", "foo", ["src/foo.c"]),
+    ]
+    assert candidates(index, "libx.o")[0] == ("lib%.o", "x", ["libx.c", "lib.h"])
+
+def test_index_prefix():
+    index = make_index( (("lib%", ["%.c"]), ("src/%", ["%.in"]), ("%", ["%.sh"])) )
+    assert candidates(index, "libfoo") == [("lib%", "foo", ["foo.c"]), ("%", "libfoo", ["libfoo.sh"])]
+    assert candidates(index, "src/libfoo") == [
+        ("lib%", "src/foo", ["src/foo.c"]),
+        ("src/%", "libfoo", ["libfoo.in"]),
+        ("%", "src/libfoo", ["src/libfoo.sh"]),
+    ]
+    assert candidates(index, "foo") == [("%", "foo", ["foo.sh"])]
+
+def test_pattern_rule(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "sub").mkdir()
+    for f in ("a.c", "b.c", "sub/c.c", "sub/libd.c", "e.s"):
+        (tmp_path / f).write_text("")
+
+    makefile = """
+all: a.o b.o sub/c.o sub/libd.o e.o x.y
+x.y: ; @echo $@
+b.o: b.h
+b.h: ; @echo $@
+%.o: %.s
+	@echo as $@ $< $*
+%.o: %.c
+	@echo cc $@ $< $* [$^]
+lib%.o: lib%.c
+	@echo lib $@ $< $*
+"""
+    expect = [
+        "cc a.o a.c a [a.c]",
+        "b.h",
+        "cc b.o b.c b [b.c b.h]",
+        "cc sub/c.o sub/c.c sub/c [sub/c.c]",
+        "lib sub/libd.o sub/libd.c sub/d",
+        "as e.o e.s e",
+        "x.y",
+    ]
+    assert run.pymake_string(makefile, extra_env=env).split("\n") == expect
+    p = run.pymake_string(makefile, extra_args=("-j","4"), extra_env=env)
+    assert sorted(p.split("\n")) == sorted(expect)
+
+def test_prereq_is_target():
+    # a prereq that doesn't exist but is a target "ought to exist"
+    makefile = """
+foo.o:
+foo.c: ; @echo $@
+%.o: %.c
+	@echo $@ from $<
+"""
+    assert run.pymake_string(makefile).split("\n") == ["foo.c", "foo.o from foo.c"]
+
+def test_goal():
+    makefile = """
+%.o: %.x
+	@echo $@ from $<
+%.x:
+	@echo $@
+"""
+    # a pattern rule is never the default target
+    err = run.pymake_should_fail(makefile)
+    assert "No targets" in err
+
+def test_no_rule():
+    makefile = """
+all: foo.o
+%.o: %.c
+	@echo $@
+"""
+    err = run.pymake_should_fail(makefile)
+    assert "No rule to make target 'foo.o', needed by 'all'" in err
+
+def test_cancel(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "foo.c").write_text("")
+    (tmp_path / "foo.s").write_text("")
+
+    makefile = """
+all: foo.o
+%.o: %.c
+	@echo cc $@
+%.o: %.s
+	@echo as $@
+%.o: %.c
+"""
+    assert run.pymake_string(makefile, extra_env=env) == "as foo.o"
+
+    # a new recipe replaces the old
+    makefile = """
+all: foo.o
+%.o: %.c
+	@echo cc $@
+%.o: %.s
+	@echo as $@
+%.o: %.c
+	@echo new cc $@
+"""
+    assert run.pymake_string(makefile, extra_env=env) == "as foo.o"
+
+@pytest.mark.parametrize("jobs", ("1", "2"))
+def test_pattern_specific_variables(jobs):
+    # longer stems first, then the target specific variables; a '+=' doesn't
+    # change the global value
+    makefile = """
+%.o: CFLAGS+=-g
+CFLAGS:=-O2
+R=-r
+all: foo.o sub/bar.o lib.a
+	@echo $@ $(CFLAGS) $R
+foo.o sub/bar.o lib.a:
+	@echo $@ $(CFLAGS) $R
+sub/%.o: CFLAGS+=-sub
+foo.o: CFLAGS+=-foo
+%.o: R+=$(CFLAGS)
+"""
+    expect = [
+        "foo.o -O2 -g -foo -r -O2 -g -foo",
+        "sub/bar.o -O2 -g -sub -r -O2 -g -sub",
+        "lib.a -O2 -r",
+        "all -O2 -r",
+    ]
+    for fn in (run.gnumake_string, run.pymake_string):
+        p = fn(makefile, extra_args=("-j", jobs))
+        assert sorted(p.split("\n")) == sorted(expect)
+
+def test_pattern_specific_implicit(tmp_path, monkeypatch):
+    # a target made by a pattern rule gets the pattern specific variables
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "a.c").write_text("")
+
+    makefile = """
+all: a.o
+%.o: %.c
+	@echo cc $(CFLAGS) $@
+%.o: CFLAGS=-g
+"""
+    assert run.pymake_string(makefile, extra_env=env) == "cc -g a.o"
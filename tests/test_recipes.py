@@ -11,6 +11,8 @@ import pymake.symtable as symtable
 from pymake.constants import backslash
 import pymake.vline as vline
 
+import run
+
 def parse_string(s):
     src = source.SourceString(s)
     src.load()
@@ -131,3 +133,21 @@ endif # FOO
     assert isinstance(statement_list[2], symbol.Recipe)
 
     # TODO add eval of the ifdef block to peek at the Recipe within
+
+def test_check_prefixes():
+    assert pymake._check_prefixes("echo foo") == ("echo foo", False, False, False)
+    assert pymake._check_prefixes("@-echo foo") == ("echo foo", True, True, False)
+    assert pymake._check_prefixes("+ @echo foo") == ("echo foo", False, True, True)
+
+def test_dry_run_force():
+    # -n prints every command once and only runs the '+' commands
+    makefile = """
+all:
+	echo one
+	@echo two
+	+echo three
+	+@echo four
+"""
+    expect = "echo one\necho two\necho three\nthree\necho four\nfour"
+    assert run.gnumake_string(makefile, extra_args=("-n",)) == expect
+    assert run.pymake_string(makefile, extra_args=("-n",)) == expect
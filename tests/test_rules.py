@@ -4,15 +4,21 @@
 #
 # XXX work in progress!
 
+import os
+
 import pytest
 
 from pymake.pymake import parse_vline
+from pymake.error import InternalError
 from pymake.scanner import ScannerIterator
+import pymake.rules as rules
 import pymake.source as source
 import pymake.symbol as symbol
 import pymake.symtable as symtable
 import pymake.vline as vline
 
+import run
+
 def parse_rule_string(s):
     src = source.SourceString(s)
     src.load()
@@ -213,12 +219,35 @@ subdirs:
 
     run_rule(s, expect, symbol_table)
 
-@pytest.mark.skip(reason="TODO circular dependencies")
 def test_circular_dependency():
     s = """\
 foo: foo
 	@echo foo
 """
-    # TODO check for:
-    # warning: Circular foo <- foo dependency dropped
-
+    # the loop is dropped with a warning and the recipe still runs
+    for fn in (run.gnumake_string, run.pymake_string):
+        out, err = fn(s, flags=run.FLAG_OUTPUT_STDOUT|run.FLAG_OUTPUT_STDERR)
+        assert out == "foo"
+        assert "Circular foo <- foo dependency dropped." in err
+
+def test_circular_dependency_pair(tmp_path):
+    # a dropped edge doesn't make the target out of date either
+    s = """\
+a: b
+	@echo a
+b: a
+	@echo b
+"""
+    (tmp_path / "b").touch()
+    (tmp_path / "a").touch()
+    os.utime(tmp_path / "b", (1, 1))
+    for fn in (run.gnumake_string, run.pymake_string):
+        out, err = fn(s, extra_args=("-C", str(tmp_path)),
+                        flags=run.FLAG_OUTPUT_STDOUT|run.FLAG_OUTPUT_STDERR)
+        assert "Circular b <- a dependency dropped." in err
+        assert "a" not in out.split("\n")
+        assert "b" not in out.split("\n")
+
+def test_empty_target():
+    with pytest.raises(InternalError):
+        rules.RuleDB().add("", [], symbol.RecipeList([]), None, ("test",(0,0)))
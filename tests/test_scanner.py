@@ -5,7 +5,8 @@
 # davep 16-Nov-2014
 
 from pymake.scanner import ScannerIterator
-from pymake.vline import VChar, VirtualLine
+from pymake.vline import VChar, VCharString, VirtualLine
+import pymake.tokenizer as tokenizer
 
 def test1() : 
     input_str = "hello, world"
@@ -48,6 +49,35 @@ def test_lookahead():
     assert s.lookahead() == 'e'
     assert s.remain() == "ello, world"
 
+def test_chars():
+    s = ScannerIterator(VCharString.from_string("hello, world"), "/dev/null")
+    token = VCharString()
+    for c in s.chars():
+        if c == ',':
+            break
+        s.take(token)
+    assert str(token) == "hello"
+    assert s.vchar().char == ','
+    assert s.lookahead_char() == ' '
+    s.pushback()
+    assert s.vchar().char == 'o'
+    assert s.remain().chars() == ", world"
+
+def test_no_vchar(monkeypatch):
+    # tokenizing doesn't make a VChar for each char (only a few, for
+    # positions)
+    views = []
+    view = VChar.view.__func__
+    def counting_view(cls, store, idx):
+        views.append(idx)
+        return view(cls, store, idx)
+    monkeypatch.setattr(VChar, "view", classmethod(counting_view))
+
+    v = VirtualLine(["CFLAGS := -O2 $(addprefix -I,$(INCLUDES)) -g $$HOME\n"], (0,0), "/dev/null")
+    stmt = tokenizer.tokenize_assignment_statement(iter(v))
+    assert stmt.makefile() == "CFLAGS :=-O2 $(addprefix -I,$(INCLUDES)) -g $HOME"
+    assert len(views) <= 3
+
 # 20230101 I don't know if I need peek_back() anymore
 #def test_peek_back():
 #    s = ScannerIterator("hello, world", "/dev/null" )
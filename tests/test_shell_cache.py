@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: GPL-2.0
+
+# test remembering $(shell) results (--shell-cache)
+
+import run
+
+makefile = """
+COUNT = $(shell echo x >> $(LOG) ; wc -l < $(LOG))
+$(info $(COUNT) $(COUNT) $(COUNT))
+@:;@:
+"""
+
+def test_shell_cache(tmp_path):
+    log = tmp_path / "log"
+
+    p = run.pymake_string(makefile, extra_args=("LOG=%s" % log,))
+    assert p == "1 2 3"
+
+    log.unlink()
+    p = run.pymake_string(makefile, extra_args=("LOG=%s" % log, "--shell-cache"))
+    assert p == "1 1 1"
+
+def test_shellstatus():
+    makefile = """
+A = $(shell exit 3)
+B = $(shell true)
+$(info $(A) $(.SHELLSTATUS))
+$(info $(B) $(.SHELLSTATUS))
+$(info $(A) $(.SHELLSTATUS))
+@:;@:
+"""
+    p = run.pymake_string(makefile, extra_args=("--shell-cache",), flags=run.FLAG_OUTPUT_STDOUT)
+    assert p.split("\n") == [" 3", " 0", " 3", ""]
+
+def test_environment():
+    # a different environment means a different result
+    makefile = """
+X = $(shell echo $$FOO)
+export FOO:=1
+$(info $(X))
+FOO:=2
+$(info $(X))
+FOO:=1
+$(info $(X))
+@:;@:
+"""
+    p = run.pymake_string(makefile, extra_args=("--shell-cache",))
+    assert p.split("\n") == ["1", "2", "1"]
+
+def test_nocache(tmp_path):
+    log = tmp_path / "log"
+    makefile = """
+.SHELL_NOCACHE := COUNT
+COUNT = $(shell echo x >> $(LOG) ; wc -l < $(LOG))
+COUNT2 = $(COUNT)
+$(info $(COUNT) $(COUNT) $(COUNT2))
+@:;@:
+"""
+    p = run.pymake_string(makefile, extra_args=("LOG=%s" % log, "--shell-cache"))
+    assert p == "1 2 3"
+
+def test_hit_keeps_wildcard_cache(tmp_path, monkeypatch):
+    # a memo hit runs nothing so the $(wildcard) directory cache is kept
+    import pymake.shell as shell
+    import pymake.globcache as globcache
+    import pymake.symtable as symtable
+
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(shell, "_memo", {})
+    symbol_table = symtable.SymbolTable()
+
+    shell._execute_memo("true", symbol_table)
+    assert globcache.glob("*") == []
+    assert globcache._dirs
+
+    shell._execute_memo("true", symbol_table)
+    assert globcache._dirs
+
+    shell._execute_memo("false", symbol_table)
+    assert not globcache._dirs
+
+def test_nocache_immediate(tmp_path):
+    # the opt-out also covers the value of := and != assignments
+    log = tmp_path / "log"
+    makefile = """
+.SHELL_NOCACHE := A B
+A := $(shell echo x >> $(LOG) ; wc -l < $(LOG))
+A := $(shell echo x >> $(LOG) ; wc -l < $(LOG))
+B != echo x >> $(LOG) ; wc -l < $(LOG)
+B != echo x >> $(LOG) ; wc -l < $(LOG)
+C := $(shell echo x >> $(LOG) ; wc -l < $(LOG))
+C := $(shell echo x >> $(LOG) ; wc -l < $(LOG))
+$(info $(A) $(B) $(C))
+@:;@:
+"""
+    p = run.pymake_string(makefile, extra_args=("LOG=%s" % log, "--shell-cache"))
+    assert p == "2 4 5"
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: GPL-2.0
+
+# test the file timestamp cache and out of date checks
+
+import os
+
+import pytest
+
+import pymake.statcache as statcache
+import pymake.globcache as globcache
+
+import run
+
+def test_mtime(tmp_path):
+    foo = tmp_path / "foo"
+    foo.write_text("foo")
+    os.utime(foo, (1000, 1000))
+
+    cache = statcache.StatCache()
+    assert cache.mtime(str(foo)) == 1000
+    assert not cache.exists(str(tmp_path / "bar"))
+
+    # directory read once
+    assert list(globcache.listdir(str(tmp_path))) == ["foo"]
+
+def test_cached(tmp_path):
+    foo = tmp_path / "foo"
+    foo.write_text("foo")
+    os.utime(foo, (1000, 1000))
+
+    cache = statcache.StatCache()
+    assert cache.mtime(str(foo)) == 1000
+    assert not cache.exists(str(tmp_path / "bar"))
+
+    # changes are not seen until invalidated
+    os.utime(foo, (2000, 2000))
+    (tmp_path / "bar").write_text("bar")
+    assert cache.mtime(str(foo)) == 1000
+    assert not cache.exists(str(tmp_path / "bar"))
+
+    cache.invalidate(str(foo))
+    cache.invalidate(str(tmp_path / "bar"))
+    assert cache.mtime(str(foo)) == 2000
+    assert cache.exists(str(tmp_path / "bar"))
+
+def test_no_such_dir(tmp_path):
+    cache = statcache.StatCache()
+    assert not cache.exists(str(tmp_path / "nope" / "foo"))
+    assert globcache.listdir(str(tmp_path / "nope")) is None
+
+@pytest.mark.parametrize("batch", (True, False))
+def test_relative(tmp_path, monkeypatch, batch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(statcache, "_batch", batch)
+    (tmp_path / "foo").write_text("foo")
+
+    cache = statcache.StatCache()
+    assert cache.exists("foo")
+    assert cache.exists("./foo")
+    assert not cache.exists("bar")
+
+makefile = """
+all: foo
+foo: bar
+	@echo build $@
+	@touch $@
+"""
+
+@pytest.mark.parametrize("jobs", ("1", "2"))
+def test_up_to_date(tmp_path, jobs):
+    bar = tmp_path / "bar"
+    foo = tmp_path / "foo"
+    extra_args = ("-C", str(tmp_path), "-j", jobs)
+
+    # foo missing
+    bar.write_text("")
+    p = run.pymake_string(makefile, extra_args=extra_args)
+    assert p == "build foo"
+
+    # foo newer than bar
+    os.utime(bar, (1000, 1000))
+    os.utime(foo, (2000, 2000))
+    p = run.pymake_string(makefile, extra_args=extra_args)
+    assert p == ""
+
+    # bar newer than foo
+    os.utime(bar, (3000, 3000))
+    p = run.pymake_string(makefile, extra_args=extra_args)
+    assert p == "build foo"
+
+chain = """
+a: b
+	@echo build $@
+b: c
+	@echo build $@
+"""
+
+@pytest.mark.parametrize("jobs", ("1", "2"))
+def test_remade_prereq(tmp_path, jobs):
+    # b doesn't exist so b is always remade so a is always remade
+    a = tmp_path / "a"
+    c = tmp_path / "c"
+    a.write_text("")
+    c.write_text("")
+    os.utime(c, (1000, 1000))
+    os.utime(a, (2000, 2000))
+
+    p = run.pymake_string(chain, extra_args=("-C", str(tmp_path), "-j", jobs))
+    assert p.split("\n") == ["build b", "build a"]
+
+def test_side_effect(tmp_path):
+    # a file made by another target's recipe is seen (the directory was read
+    # before the recipe ran)
+    makefile = """
+all: gen use
+gen:
+	@touch side.h
+use: side.h
+	@echo use
+"""
+    p = run.pymake_string(makefile, extra_args=("-C", str(tmp_path)))
+    assert p == "use"
+
+def test_recipe_keeps_listing(tmp_path):
+    import pymake.shell as shell
+
+    cache = statcache.StatCache()
+    foo = tmp_path / "foo"
+    assert not cache.exists(str(foo))
+
+    # a recipe line doesn't drop the listings...
+    shell.run("touch foo", ["/bin/sh", "-c", "cd %s && touch foo" % tmp_path], dict(os.environ))
+    assert not cache.exists(str(foo))
+
+    # ...its rule does, once done
+    cache.invalidate(str(foo))
+    assert cache.exists(str(foo))
+
+@pytest.mark.parametrize("jobs", ("1", "2"))
+def test_no_rescan(tmp_path, jobs):
+    # src/ is read once; the recipes only drop the listing of obj/
+    (tmp_path / "src").mkdir()
+    (tmp_path / "obj").mkdir()
+    for f in ("a.c", "b.c", "c.c"):
+        (tmp_path / "src" / f).write_text("")
+
+    makefile = """
+all: obj/a.o obj/b.o obj/c.o
+obj/%.o: src/%.c
+	@touch $@
+	@echo $@
+"""
+    out, err = run.pymake_string(makefile, extra_args=("-C", str(tmp_path), "-j", jobs, "--debug=globcache"),
+                    flags=run.FLAG_OUTPUT_STDOUT|run.FLAG_OUTPUT_STDERR)
+    assert sorted(out.split("\n")) == ["obj/a.o", "obj/b.o", "obj/c.o"]
+    assert err.count("scan dirname='src'") == 1
+    assert err.count("invalidate dirname='obj'") == 3
+
+def test_shell_invalidates(tmp_path):
+    # a $(shell) can write anywhere
+    makefile = """
+$(info [$(wildcard foo)])
+$(shell touch foo)
+$(info [$(wildcard foo)])
+all: foo ; @:
+"""
+    p = run.pymake_string(makefile, extra_args=("-C", str(tmp_path)))
+    assert p == "[]\n[foo]"
@@ -343,3 +343,90 @@ all:
 """
     run.simple_test(makefile)
 
+
+def _uncached_exports(symbol_table):
+    entries = symbol_table._get_entries(lambda e:e.export)
+    return { name:entry.eval(symbol_table) for name,entry in entries.items() }
+
+def test_exports_cache():
+    # the cached exports must always match a search of the whole table
+    symbol_table = symtable.SymbolTable()
+    def check():
+        exports = symbol_table.get_exports()
+        assert exports == _uncached_exports(symbol_table)
+        return exports
+
+    check()
+    symbol_table.add("FOO", "foo")
+    assert "FOO" not in check()
+
+    symbol_table.export("FOO")
+    assert check()["FOO"] == "foo"
+
+    symbol_table.add("FOO", "bar")
+    assert check()["FOO"] == "bar"
+
+    symbol_table.append("FOO", "baz")
+    assert check()["FOO"] == "bar baz"
+
+    # recursive variables are eval'd every time
+    symbol_table.add("BAR", Expression([Literal("$(FOO)"), VarRef([Literal("FOO")])]))
+    symbol_table.export("BAR")
+    check()
+    symbol_table.add("FOO", "qux")
+    assert check()["BAR"].endswith("qux")
+
+    # target specific variables
+    symbol_table.push_layer()
+    symbol_table.add("FOO", "layer")
+    check()
+    symbol_table.pop_layer()
+    assert check()["FOO"] == "qux"
+
+    symbol_table.unexport("FOO")
+    assert "FOO" not in check()
+
+    symbol_table.export()
+    symbol_table.add("NEW", "new")
+    assert check()["NEW"] == "new"
+    symbol_table.unexport()
+    assert "NEW" not in check()
+
+    symbol_table.export("BAR")
+    symbol_table.undefine("BAR")
+    assert "BAR" not in check()
+
+def test_deep_layers():
+    symbol_table = symtable.SymbolTable()
+    symbol_table.add("FOO", "0")
+    symbol_table.add("BAR", "bar")
+
+    depth = 1000
+    for i in range(1, depth):
+        symbol_table.push_layer()
+        symbol_table.add("FOO", str(i))
+        if i % 2:
+            symbol_table.add("ODD", str(i))
+        assert symbol_table.fetch("FOO") == str(i)
+        assert symbol_table.fetch("BAR") == "bar"
+
+    for i in range(depth-1, 0, -1):
+        assert symbol_table.fetch("FOO") == str(i)
+        assert symbol_table.fetch("ODD") == str(i if i % 2 else i-1)
+        symbol_table.pop_layer()
+
+    assert symbol_table.fetch("FOO") == "0"
+    assert not symbol_table.is_defined("ODD")
+    assert len(symbol_table.layers) == 1
+
+def test_layers_replace_undefine():
+    symbol_table = symtable.SymbolTable()
+    symbol_table.add("FOO", "foo")
+    symbol_table.push_layer()
+    symbol_table.add("FOO", "bar")
+    symbol_table.add("FOO", "baz")
+    assert symbol_table.fetch("FOO") == "baz"
+    symbol_table.undefine("FOO")
+    assert not symbol_table.is_defined("FOO")
+    symbol_table.pop_layer()
+    assert not symbol_table.is_defined("FOO")
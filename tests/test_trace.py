@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: GPL-2.0
+
+# test the trace points used in the tokenizer, symbol table, etc.
+
+import logging
+
+import pytest
+
+import pymake.trace as trace
+from pymake.vline import VirtualLine
+import pymake.tokenizer as tokenizer
+
+@pytest.fixture
+def tokenize_logger():
+    logr = logging.getLogger("pymake.tokenize")
+    level = logr.level
+    yield logr
+    logr.setLevel(level)
+
+class Boom:
+    # fails if anyone tries to format it
+    def __repr__(self):
+        assert 0
+
+def test_get_tracer():
+    t = trace.get_tracer("tokenize")
+    assert t is trace.get_tracer("tokenize")
+    assert t.category == "tokenize"
+    assert t.logger is logging.getLogger("pymake.tokenize")
+
+def test_disabled(tokenize_logger, caplog):
+    tokenize_logger.setLevel(logging.INFO)
+    t = trace.get_tracer("tokenize")
+    assert not t.on
+
+    v = VirtualLine(["foo:=bar\n"], (0,0), "/dev/null")
+    with caplog.at_level(logging.INFO, logger="pymake.tokenize"):
+        tokenizer.tokenize_assignment_statement(iter(v))
+    assert not caplog.records
+
+def test_enabled(tokenize_logger, caplog):
+    trace.enable("tokenize")
+    t = trace.get_tracer("tokenize")
+    assert t.on
+
+    v = VirtualLine(["foo:=bar\n"], (0,0), "/dev/null")
+    with caplog.at_level(logging.DEBUG, logger="pymake.tokenize"):
+        tokenizer.tokenize_assignment_statement(iter(v))
+
+    records = [r.trace for r in caplog.records if hasattr(r, "trace")]
+    assert records
+    assert all(r["category"] == "tokenize" for r in records)
+    assert records[0]["event"] == "tokenize_assignment_statement"
+    assert records[0]["pos"] == ("/dev/null", (0,0))
+    assert any(r["event"] == "assignment" and r["c"] == "f" for r in records)
+
+def test_lazy_format(tokenize_logger):
+    # a record that's never printed is never formatted
+    tokenize_logger.setLevel(logging.DEBUG)
+    tokenize_logger.propagate = False
+    try:
+        trace.get_tracer("tokenize")("boom", boom=Boom())
+    finally:
+        tokenize_logger.propagate = True
+
+
+def test_enabled_after_import(tokenize_logger, caplog):
+    # the tokenizer got its tracer at import; turning on debug logging later
+    # (without going through trace.enable()) still turns on its trace points
+    tokenize_logger.setLevel(logging.INFO)
+    assert not tokenizer._trace.on
+
+    tokenize_logger.setLevel(logging.DEBUG)
+    assert tokenizer._trace.on
+
+    v = VirtualLine(["foo:=bar\n"], (0,0), "/dev/null")
+    with caplog.at_level(logging.DEBUG, logger="pymake.tokenize"):
+        tokenizer.tokenize_assignment_statement(iter(v))
+    assert any(hasattr(r, "trace") for r in caplog.records)
@@ -40,11 +40,47 @@ def test3():
         vs += vline.VChar(char, (0, col), infilename)
         logger.debug("char=%s col=%d len=%d vs=%s", char, col, len(vs), str(vs))
     
+def test_store_positions():
+    # chars of a VirtualLine share one store; positions are calculated
+    lines = ["foo=\\\n", "  bar\n"]
+    vl = vline.VirtualLine(lines, (10,0), "/dev/null")
+    assert str(vl) == "foo= bar\n"
+
+    vchars = list(vl)
+    assert [vc.pos for vc in vchars] == [(10,0), (10,1), (10,2), (10,3), (10,4),
+                                        (11,2), (11,3), (11,4), (11,5)]
+    assert vchars[0].linenumber == 11
+    assert all(vc.filename == "/dev/null" for vc in vchars)
+
+def test_hide_shared():
+    # hiding a char in a VCharString hides it in the VirtualLine, too
+    vl = vline.VirtualLine(["foo bar\n"], (0,0), "/dev/null")
+    vs = vline.VCharString(list(vl)[0:4])
+    assert str(vs) == "foo "
+    vs[3].hide = True
+    assert str(vs) == "foo"
+    assert str(vl) == "foobar\n"
+
+def test_slice():
+    vs = vline.VCharString.from_string("hello, world")
+    s = vs[7:]
+    assert isinstance(s, vline.VCharString)
+    assert str(s) == "world"
+    assert s.get_pos() == ("/dev/null", (0,7))
+
+    s = vline.VCharString()
+    s += vs[0]
+    s += vline.VChar("!", (1,0), "/dev/null")
+    assert str(s) == "h!"
+    assert len(s) == 2
 
 def main():
     test1()
     test2()
     test3()
+    test_store_positions()
+    test_hide_shared()
+    test_slice()
 
 if __name__=='__main__':
     logging.basicConfig(level=logging.DEBUG)
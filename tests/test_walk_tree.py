@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# SPDX-License-Identifier: GPL-2.0
+
+# test walking the rules' dependency graph
+
+import sys
+
+import pytest
+
+import pymake.rules as rules
+import pymake.symbol as symbol
+from pymake.error import NoRuleToMakeTarget
+
+import run
+
+def make_db(graph):
+    # graph is a list of (target, [prereqs])
+    db = rules.RuleDB()
+    for target, prereq_list in graph:
+        db.add(target, prereq_list, symbol.RecipeList([]), None, ("test",(0,0)))
+    return db
+
+def walk(db, target, visited=None):
+    return [rule.target for rule in db.walk_tree(target, visited)]
+
+def test_simple():
+    db = make_db( (("all", ["a", "b"]), ("a", ["c"]), ("b", []), ("c", [])) )
+    assert walk(db, "all") == ["c", "a", "b", "all"]
+
+def test_diamond():
+    # each level doubles the number of paths to the bottom
+    graph = []
+    for i in range(40):
+        graph.append(("L%d" % i, ["A%d" % i, "B%d" % i]))
+        graph.append(("A%d" % i, ["L%d" % (i+1)]))
+        graph.append(("B%d" % i, ["L%d" % (i+1)]))
+    graph.append(("L40", []))
+    db = make_db(graph)
+
+    targets = walk(db, "L0")
+    assert len(targets) == len(set(targets)) == len(graph)
+    assert targets[0] == "L40"
+    assert targets[-1] == "L0"
+
+def test_shared_prereq():
+    graph = [("all", ["o%d" % i for i in range(100)])]
+    graph.extend(("o%d" % i, ["header"]) for i in range(100))
+    graph.append(("header", []))
+    db = make_db(graph)
+
+    targets = walk(db, "all")
+    assert targets.count("header") == 1
+    assert targets[0] == "header"
+
+def test_long_chain():
+    depth = sys.getrecursionlimit() * 2
+    graph = [("t%d" % i, ["t%d" % (i+1)]) for i in range(depth)]
+    graph.append(("t%d" % depth, []))
+    db = make_db(graph)
+
+    targets = walk(db, "t0")
+    assert len(targets) == depth + 1
+    assert targets[-1] == "t0"
+
+def test_circular(capsys):
+    db = make_db( (("a", ["b"]), ("b", ["a"])) )
+    assert walk(db, "a") == ["b", "a"]
+    assert "Circular b <- a dependency dropped." in capsys.readouterr().err
+
+def test_self_circular(capsys):
+    db = make_db( (("foo", ["foo"]),) )
+    assert walk(db, "foo") == ["foo"]
+    assert "Circular foo <- foo dependency dropped." in capsys.readouterr().err
+
+def test_visited():
+    # several goals share the work
+    db = make_db( (("a", ["c"]), ("b", ["c"]), ("c", [])) )
+    visited = {}
+    assert walk(db, "a", visited) == ["c", "a"]
+    assert walk(db, "b", visited) == ["b"]
+    assert walk(db, "a", visited) == []
+
+def test_no_rule():
+    db = make_db( (("a", ["nope"]),) )
+    with pytest.raises(NoRuleToMakeTarget) as err:
+        walk(db, "a")
+    assert err.value.msg == "No rule to make target 'nope', needed by 'a'"
+
+def test_shared_prereq_run():
+    makefile = """
+all: a b
+a: c
+	@echo a
+b: c
+	@echo b
+c:
+	@echo c
+"""
+    p = run.pymake_string(makefile)
+    assert p.split("\n") == ["c", "a", "b"]
+
+def test_no_rule_run():
+    makefile = """
+all: a
+a: nope
+	@echo a
+"""
+    err = run.pymake_should_fail(makefile)
+    assert "No rule to make target 'nope', needed by 'a'" in err
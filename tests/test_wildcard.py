@@ -1,4 +1,5 @@
-from pymake.wildcard import split_percent, wildcard_match, wildcard_replace
+from pymake.wildcard import split_percent, wildcard_match, wildcard_replace, compile_pattern, wildcard_match_list
+import run
 
 def test_split():
     p = split_percent("hello.c")
@@ -125,6 +126,117 @@ def test_replace():
 #    print(new)
 #    assert new == ["bar", "bar", "bar"]
 
+def test_compile_pattern():
+    p = compile_pattern("%.c")
+    assert p.wild and p.prefix=='' and p.suffix=='.c'
+    assert compile_pattern("%.c") is p
+    assert p.stem("foo.c") == "foo"
+    assert p.stem("foo.h") is None
+
+    p = compile_pattern("foo.c")
+    assert not p.wild and p.text=="foo.c"
+    assert p.match("foo.c") and not p.match("foo.cc")
+
+def test_pattern_overlap():
+    # the prefix and suffix of a match can't overlap
+    p = compile_pattern("ab%ba")
+    assert not p.match("aba")
+    assert p.match("abba")
+    assert p.stem("aba") is None
+    assert p.stem("abba") == ""
+    assert wildcard_replace("a%a", "x", ["a", "aa", "aba"]) == ["a", "x", "x"]
+
+    makefile="""
+$(info [$(patsubst a%a,x,a aa aba)] [$(filter ab%ba,aba abba)] [$(filter-out ab%ba,aba abba)])
+@:;@:
+"""
+    s = run.pymake_string(makefile)
+    assert s == "[a x x] [abba] [aba]"
+
+def test_pattern_quoting():
+    # same as GNU Make's find_percent()
+    p = compile_pattern("a\\%b")
+    assert not p.wild and p.text=="a%b"
+
+    p = compile_pattern("a\\\\%b")
+    assert p.wild and p.prefix=="a\\" and p.suffix=="b"
+
+    p = compile_pattern("a\\%%\\%")
+    assert p.wild and p.prefix=="a%" and p.suffix=="\\%"
+
+    # backslashes not in front of a % are left alone
+    p = compile_pattern("a\\b%")
+    assert p.wild and p.prefix=="a\\b" and p.suffix==""
+
+    makefile=r"""
+$(info [$(patsubst a\%%,<%>,a%b a\b ab)])
+$(info [$(patsubst a\%,X,a% a)])
+$(info [$(patsubst %.c,a\%,x.c)] [$(patsubst a,b\%,a x)])
+$(info [$(filter a\%b %.h,a%b a\%b x.h)])
+@:;@:
+"""
+    s = run.pymake_string(makefile)
+    assert s.split("\n") == [
+        "[<b> a\\b ab]",
+        "[X a]",
+        "[a%] [b% x]",
+        "[a%b x.h]",
+    ]
+
+def test_patsubst_joined_text():
+    # the text is joined before it is split into words
+    makefile="""
+$(info [$(patsubst %.c,%.o,a$(E).c)] [$(patsubst a.c,x,a$(E).c b.c)] [$(patsubst a,x,a$(E)b)])
+@:;@:
+"""
+    s = run.pymake_string(makefile)
+    assert s == "[a.o] [x b.c] [ab]"
+
+def test_substitution_ref_pattern():
+    # a substitution reference with a '%' is a $(patsubst)
+    makefile="""
+SRC:=a.c  b.c   dir/c.c .c x.h
+$(info [$(SRC:%.c=obj/%.o)] [$(SRC:%=<%>)] [$(SRC:.c=%.o)])
+@:;@:
+"""
+    s = run.pymake_string(makefile)
+    assert s == "[obj/a.o obj/b.o obj/dir/c.o obj/.o x.h] [<a.c> <b.c> <dir/c.c> <.c> <x.h>] [a%.o b%.o dir/c%.o %.o x.h]"
+
+def test_patsubst_makefile():
+    makefile=r"""
+SRC:=a.c  b.c   dir/c.c .c x.h
+$(info [$(SRC:.c=.o)])
+$(info [$(SRC:=.x)])
+$(info [$(patsubst a.c,X%,  a.c   b.c  a.c )])
+@:;@:
+"""
+    s = run.pymake_string(makefile)
+    assert s.split("\n") == [
+        "[a.o b.o dir/c.o .o x.h]",
+        "[a.c.x b.c.x dir/c.c.x .c.x x.h.x]",
+        "[  X%   b.c  X% ]",
+    ]
+
+def test_match_list_index():
+    # enough patterns to use a PatternIndex; order and duplicates are kept
+    patterns = ["a.c", "b.c", "%.h", "src/%", "x%y", "lib%.a"]
+    targets = ["b.c", "a.c", "foo.h", "b.c", "src/a.c", "xy", "x", "libfoo.a",
+                "lib.a", "lib.o", "a.o", "xay", "c.c", "b.c"]
+
+    matches = list(wildcard_match_list(patterns, targets))
+    assert matches == ["b.c", "a.c", "foo.h", "b.c", "src/a.c", "xy", "libfoo.a",
+                        "lib.a", "xay", "b.c"]
+
+    matches = list(wildcard_match_list(patterns, targets, negate=True))
+    assert matches == ["x", "lib.o", "a.o", "c.c"]
+
+    # same as one pattern at a time
+    for negate in (False, True):
+        for p in patterns + ["%", "%.o"]:
+            big = [p] + ["nope%%%d" % i for i in range(10)] + ["nope%d" % i for i in range(10)]
+            assert list(wildcard_match_list(big, targets, negate)) == \
+                    list(wildcard_match_list([p], targets, negate))
+
 if __name__ == '__main__':
 #    test_split()
     test_match()
@@ -0,0 +1,65 @@
+# SPDX-License-Identifier: GPL-2.0
+# Copyright (C) 2014-2024 David Poole davep@mbuf.com david.poole@ericsson.com
+#
+# Test functions passing their list of words to other functions.
+
+import run
+
+from pymake.functions_base import WordString, split_words
+
+def test_word_string():
+    s = WordString(["a", "b", "c"])
+    assert s == "a b c"
+    assert isinstance(s, str)
+    assert s.split() == s.words
+
+def test_split_words():
+    s = WordString(["a", "b", "c"])
+
+    class Token:
+        # a Symbol-ish thing returning a WordString
+        def eval(self, symbol_table):
+            return s
+
+    assert split_words([Token()], None) is s.words
+    assert split_words([Token(), Token()], None) == ["a", "b", "ca", "b", "c"]
+
+def test_pipeline():
+    # results must be the same as split()'ing the string
+    makefile="""
+SRC:=b.c a.c  dir/c.c .c x.h a.c
+S:=$(sort $(SRC))
+$(info [$S] [$(words $S)] [$(word 2,$S)] [$(wordlist 2,3,$S)] [$(firstword $S)] [$(lastword $S)])
+$(info [$(words $(patsubst %.c,% x,$S))] [$(words $(patsubst %.c,%,$S))] [$(patsubst %.c,%,$S)])
+$(info [$(words $(addprefix a b/,$S))] [$(words $(addsuffix .o,$S))])
+$(info [$(words $(foreach f,$S,$f x))] [$(foreach f,$S,<$f>)])
+$(info [$(dir $S)] [$(suffix $S)])
+@:;@:
+"""
+    s = run.pymake_string(makefile)
+    assert s.split("\n") == [
+        "[.c a.c b.c dir/c.c x.h] [5] [a.c] [a.c b.c] [.c] [x.h]",
+        "[8] [4] [ a b dir/c x.h]",
+        "[10] [5]",
+        "[10] [<.c> <a.c> <b.c> <dir/c.c> <x.h>]",
+        "[./ ./ ./ dir/ ./] [.c .c .c .c .h]",
+    ]
+
+def test_wordlist_one_word():
+    # $(wordlist N,N,...) is word N (start and end can be the same word)
+    makefile="""
+S:=$(sort c a b)
+$(info [$(wordlist 2,2,a  b  c)] [$(wordlist 1,2,a  b  c)] [$(wordlist 3,3,a b c)] [$(wordlist 1,1,a)] [$(wordlist 2,2,$S)] [$(wordlist 3,2,a b c)])
+@:;@:
+"""
+    s = run.pymake_string(makefile)
+    assert s == "[b] [a  b] [c] [a] [b] []"
+
+def test_split_joined_args():
+    # an argument made of several pieces is joined before splitting
+    makefile="""
+$(info [$(strip a$(E)b  c )] [$(words a$(E)b)] [$(word 1,a$(E)b)])
+@:;@:
+"""
+    s = run.pymake_string(makefile)
+    assert s == "[ab c] [1] [ab]"
@@ -5,6 +5,10 @@ $(info 1 $(wordlist 1, 3, foo bar baz))
 # *** invalid first argument to 'wordlist' function: '0'.  Stop.
 #$(info 1 $(wordlist 0, 3, foo bar baz))
 
+# start == end is one word
+$(info 1 $(wordlist 2, 2, foo bar baz))
+$(info 1 $(wordlist 3, 3, foo bar baz))
+
 # start > end
 $(info 2 $(wordlist 3, 2, foo bar baz)) # empty
 